@@ -1,12 +1,61 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
+import logging
+import os
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from scipy.stats import norm
-from io import BytesIO
+
+from parrish.admision import (
+    BYTES_POR_FILA_ARCHIVO,
+    BYTES_POR_FILA_EXPORTACION,
+    admitir,
+    estado_admision,
+    intentar_admitir,
+    liberar,
+    memoria_estimada,
+    nuevo_control,
+)
+from parrish.cache import guardar, huella_datos, nueva_cache, obtener
+from parrish.datos import (
+    EXTENSIONES_ENTRADA,
+    columnas_faltantes,
+    concatenar_bloques,
+    contar_estudiantes,
+    huella_archivo,
+    leer_estudiantes_por_bloques,
+)
+from parrish.estadisticas import (
+    COLUMNAS_PRED,
+    histograma_agrupado,
+    metricas_generales,
+    nuevo_acumulador,
+    tabla_estadisticas,
+    tabla_genero,
+    tabla_riesgo,
+)
+from parrish.especulacion import cancelar, especular, esperar, nueva_especulacion
+from parrish.exportar import exportar, huella_exportacion, huella_hojas, tipo_exportacion
+from parrish.masivo import procesar_en_memoria
+from parrish.metricas import incrementar, iniciar_servidor_metricas, observar, registrar_cache
+from parrish.modelos import crear_gestor, registro_vigente
+from parrish.paralelo import procesar_en_paralelo, trabajadores_por_defecto
+from parrish.prediccion import contribuciones_materia, explicar_probit
+from parrish.progreso import con_progreso, describir_progreso, nuevo_progreso
+from parrish.trabajos import EN_COLA, ERROR, PROCESANDO, TERMINADO, crear_cola, enviar_trabajo, estado_trabajo, resultado_trabajo
+from parrish.tiempos import (
+    etapa,
+    memoria_actual_mb,
+    nueva_medicion,
+    nuevo_historial,
+    pico_memoria_mb,
+    resumen_corridas,
+    tabla_etapas,
+)
 
 # --------------------------------------------------
 # Configuración de colores y estilos
@@ -325,15 +374,13 @@ def configure_plotly_theme():
         )
     )
     pio.templates.default = "parrish"
+    # Serialización de las figuras con orjson (mucho más rápido que json) si está instalado
+    try:
+        import orjson  # noqa: F401
+        pio.json.config.default_engine = "orjson"
+    except ImportError:
+        pass
     
-def to_excel(df):
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Sheet1')
-    writer.close() # Or writer.save() for older pandas versions
-    processed_data = output.getvalue()
-    return processed_data
-
 def create_colored_header(text, color_key='primary', level=1):
     """Crea un header con colores personalizados"""
     colors = get_parrish_colors()
@@ -378,22 +425,223 @@ def create_info_box(text):
     </div>
     """
 
-def convert_df_to_excel(df, sheet_name='Data'):
-    """Convierte un DataFrame a formato Excel en bytes"""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
-    return output.getvalue()
-
-def convert_multiple_dfs_to_excel(dataframes_dict):
-    """Convierte múltiples DataFrames a un archivo Excel con varias hojas"""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        for sheet_name, df in dataframes_dict.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
-    return output.getvalue()
+@st.cache_data(max_entries=8, show_spinner=False)
+def generar_descarga(huella, formato, compresion, _hojas):
+    """
+    Contenido del archivo de descarga de `_hojas`. Se guarda en caché por `huella`
+    (hash del contenido, formato y compresión), así que repetir la descarga es inmediato.
+    La exportación se mide como una corrida propia (página "descarga") del historial de tiempos
+    y pasa por el control de admisión, como los análisis masivos.
+    """
+    filas = sum(len(df) for df in _hojas.values())
+    medicion = nueva_medicion(HISTORIAL_TIEMPOS, "descarga", formato=formato, compresion=compresion)
+    with admitir(ADMISION, filas, memoria_estimada(filas, BYTES_POR_FILA_EXPORTACION), pagina="descarga"):
+        with etapa(medicion, "exportar", filas=filas):
+            return exportar(_hojas, formato, compresion)[0]
+
+def boton_descarga(etiqueta, hojas, nombre, formato="xlsx", compresion=None, contenido=None):
+    """
+    Botón de descarga que genera el archivo solo cuando el usuario hace clic
+    (en otro hilo, sin bloquear la página) y sin volver a ejecutar el script.
+    `contenido` es la huella de las hojas ya calculada (ver huella_hojas).
+    """
+    huella = huella_exportacion(hojas, formato, compresion, contenido)
+    extension, mime = tipo_exportacion(hojas, formato, compresion)
+    st.download_button(
+        etiqueta,
+        data=lambda: generar_descarga(huella, formato, compresion, hojas),
+        file_name=f"{nombre}.{extension}",
+        mime=mime,
+        on_click="ignore",
+    )
+
+def figura_distribucion(bordes, conteos):
+    """
+    Distribución de predicciones por materia (2 × 3). Las barras vienen del histograma
+    acumulado, así que el tamaño del gráfico no depende del número de estudiantes.
+    """
+    fig_dist = make_subplots(
+        rows=2, cols=3,
+        subplot_titles=[mat.replace('pred_', '').upper() for mat in COLUMNAS_PRED],
+        specs=[[{"secondary_y": False}]*3]*2
+    )
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    for i, materia in enumerate(COLUMNAS_PRED):
+        row = (i // 3) + 1
+        col = (i % 3) + 1
+        
+        fig_dist.add_trace(
+            go.Bar(
+                x=centros,
+                y=conteos[i],
+                width=np.diff(bordes),
+                name=materia.replace('pred_', '').upper(),
+                showlegend=False,
+            ),
+            row=row, col=col
+        )
+    fig_dist.update_layout(
+        title="Distribución de Predicciones por Materia",
+        height=600,
+        showlegend=False,
+        bargap=0
+    )
+    return fig_dist
+
+def figura_genero(df_genero):
+    """Promedio de cada predicción por género (None si no hay datos de género)"""
+    if df_genero.empty:
+        return None
+    return px.bar(
+        df_genero, 
+        x='Materia', 
+        y='Promedio', 
+        color='Género',
+        title="Promedio de Predicciones por Género",
+        barmode='group',
+        range_y=(0,1.1)
+    )
+
+def figura_riesgo(df_riesgo):
+    """Porcentaje de estudiantes en riesgo por materia (None si la tabla está vacía)"""
+    if df_riesgo.empty:
+        return None
+    return px.bar(
+        df_riesgo,
+        x='Materia',
+        y='Porcentaje',
+        title="Porcentaje de Estudiantes en Riesgo por Materia",
+        color='Porcentaje',
+        color_continuous_scale="Reds",
+        range_y=(0, 101)
+    )
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def obtener_figuras(huella, _bordes, _conteos, _df_genero, _df_riesgo):
+    """
+    Figuras del análisis masivo, guardadas por `huella` (hash de los datos agregados que
+    las generan): dos análisis con los mismos agregados comparten las figuras.
+    Las tres figuras son independientes y se construyen en paralelo.
+    """
+    with ThreadPoolExecutor(max_workers=3) as ejecutor:
+        fig_dist = ejecutor.submit(figura_distribucion, _bordes, _conteos)
+        fig_genero = ejecutor.submit(figura_genero, _df_genero)
+        fig_riesgo = ejecutor.submit(figura_riesgo, _df_riesgo)
+        return {
+            "fig_dist": fig_dist.result(),
+            "fig_genero": fig_genero.result(),
+            "fig_riesgo": fig_riesgo.result(),
+        }
+
+def figuras_resultados(resultados):
+    """Figuras de `resultados` desde la caché de figuras (se construyen solo la primera vez)"""
+    return obtener_figuras(
+        resultados["huella_figuras"],
+        resultados["bordes"],
+        resultados["conteos"],
+        resultados["df_genero"],
+        resultados["df_riesgo"],
+    )
+
+def construir_resultados(df_completo, acumulador):
+    """
+    Tablas del análisis masivo y datos agregados de sus figuras, a partir de las predicciones
+    y del acumulador de estadísticas. El resultado se guarda en CACHE_RESULTADOS para reutilizarlo.
+    """
+    bordes, conteos = histograma_agrupado(acumulador)
+    df_genero = tabla_genero(acumulador)
+    df_riesgo = tabla_riesgo(acumulador)
+    resultados = {
+        "df_completo": df_completo,
+        "metricas": metricas_generales(acumulador),
+        # Tabla de estadísticas (acumulada bloque a bloque)
+        "df_stats": tabla_estadisticas(acumulador).round(3),
+        "df_genero": df_genero,
+        "df_riesgo": df_riesgo,
+        "bordes": bordes,
+        "conteos": conteos,
+        "huella_figuras": huella_datos(bordes, conteos, df_genero, df_riesgo),
+    }
+    # La huella de la descarga se calcula una sola vez y no en cada recarga de la página
+    resultados["huella_descarga"] = huella_hojas(hojas_descarga(resultados))
+    return resultados
+
+def hojas_descarga(resultados):
+    """Datos completos y tablas de resumen de un análisis masivo, una hoja por tabla"""
+    return {
+        "Datos": resultados["df_completo"],
+        "Estadisticas": resultados["df_stats"],
+        "Riesgo": resultados["df_riesgo"],
+        "Genero": resultados["df_genero"],
+    }
+
+def mostrar_resultados(resultados, figuras, formato_descarga, compresion_descarga):
+    """Muestra las métricas, tablas, gráficos (ver figuras_resultados) y la descarga de un análisis masivo"""
+    df_completo = resultados["df_completo"]
+    metricas = resultados["metricas"]
+    
+    st.success("✅ ¡Análisis masivo completado!")
+    
+    # --------------------------------------------------
+    # ESTADÍSTICAS Y VISUALIZACIONES
+    # --------------------------------------------------
+    
+    st.header(":material/bar_chart_4_bars: Estadísticas Generales")
+    
+    # Métricas principales
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Estudiantes", metricas["total"])
+    with col2:
+        mujeres = metricas["mujeres"]
+        st.metric("Mujeres", f"{mujeres:.0f} ({mujeres/metricas['total']*100:.1f}%)")
+    with col3:
+        st.metric("Edad Promedio", f"{metricas['edad_promedio']:.1f} años")
+    with col4:
+        st.metric("Faltas Promedio", f"{metricas['faltas_promedio']:.1f}")
+    
+    # Estadísticas de predicciones
+    st.subheader(":material/finance_mode: Estadísticas de Predicciones")
+    st.dataframe(resultados["df_stats"], use_container_width=True)
+    
+    # --------------------------------------------------
+    # VISUALIZACIONES
+    # --------------------------------------------------
+
+    st.subheader(":material/analytics: Visualizaciones")
+    st.plotly_chart(figuras["fig_dist"], use_container_width=True)
+    
+    # Gráfico de rendimiento por género
+    if 'estu_mujer' in df_completo.columns:
+        st.subheader(":material/groups_3: Análisis por Género")
+        if figuras["fig_genero"] is not None:
+            st.plotly_chart(figuras["fig_genero"], use_container_width=True)
+    
+    # Análisis de factores de riesgo
+    st.subheader(":material/crisis_alert: Análisis de Factores de Riesgo")
+    if not resultados["df_riesgo"].empty:
+        st.dataframe(resultados["df_riesgo"], use_container_width=True)
+        st.plotly_chart(figuras["fig_riesgo"], use_container_width=True)
+    
+    # --------------------------------------------------
+    # DESCARGA DE RESULTADOS
+    # --------------------------------------------------
+    
+    st.subheader("Descargar Resultados")
+    
+    # Datos completos y tablas de resumen en un solo archivo (se genera al hacer clic)
+    boton_descarga(
+        "Descargar Resultados",
+        hojas_descarga(resultados),
+        "analisis_masivo",
+        formato_descarga,
+        compresion_descarga,
+        resultados["huella_descarga"],
+    )
+
+    # Vista previa de resultados
+    with st.expander("Vista Previa de Resultados Completos"):
+        st.dataframe(df_completo, use_container_width=True)
 
 # 📂 Ruta del archivo de coeficientes
 MODELOS_XLSX = Path(__file__).with_name("Coeficientes_modelos.xlsx")
@@ -401,140 +649,285 @@ MODELOS_XLSX = Path(__file__).with_name("Coeficientes_modelos.xlsx")
 # --------------------------------------------------
 # Utilidades
 # --------------------------------------------------
-# @st.cache_data
-def cargar_modelos(path: Path) -> dict[str, pd.Series]:
+@st.cache_resource
+def obtener_gestor(path: Path) -> dict:
     """
-    Devuelve un diccionario:
-        clave   -> nombre de la hoja
-        valor   -> Series con coeficientes (index = variable, value = coef)
+    Gestor de modelos compartido por todas las sesiones y reruns del proceso
+    (ver parrish.modelos.crear_gestor).
     """
-    try:
-        xl = pd.ExcelFile(path)
-        modelos: dict[str, pd.Series] = {}
-        for sheet in xl.sheet_names:
-            df = xl.parse(sheet)
-            # Los coeficientes están en la fila 0
-            coefs = df.iloc[0]
-            # Convertir todos los valores a numéricos, forzando errores a NaN
-            coefs = pd.to_numeric(coefs, errors='coerce').fillna(0.0)
-            modelos[sheet] = coefs
-        return modelos
-    except Exception as e:
-        st.error(f"Error al cargar modelos: {e}")
-        return {}
-
-
-def predecir_con_detalles(modelo: pd.Series, datos: dict[str, float], nombre_materia: str) -> tuple[float, list]:
+    return crear_gestor(path)
+
+@st.cache_resource
+def obtener_cache_resultados(limite_mb: int) -> dict:
     """
-    Calcula Σ (coef_i * dato_i)  +  _cons y retorna detalles del cálculo
+    Caché de resultados del análisis masivo compartida por todas las sesiones
+    (ver parrish.cache). Las claves incluyen el hash del archivo subido.
     """
-    detalles = []
-    suma = 0.0
-    
-    # Obtener la constante
-    try:
-        constante = float(modelo.get("_cons", 0.0))
-        suma = constante
-        detalles.append(f"Constante: {constante:.6f}")
-    except (ValueError, TypeError):
-        constante = 0.0
-        suma = 0.0
-        detalles.append("Constante: 0.0 (error al leer)")
-    
-    # Sumar cada término
-    for var, coef in modelo.items():
-        if var == "_cons":
-            continue
-        
-        try:
-            # Convertir coeficiente a float
-            coef_num = float(coef)
-            # Obtener valor de la variable y convertir a float
-            var_val = float(datos.get(var, 0))
-            contribucion = coef_num * var_val
-            suma += contribucion
-            # Probit: probability = Φ(suma), where Φ is the standard normal CDF
-            probabilidad = norm.cdf(suma)
+    cache = nueva_cache(limite_mb * 1024 * 1024)
+    registrar_cache("resultados", cache)
+    return cache
 
-            
-            if abs(contribucion) > 0.001:  # Solo mostrar contribuciones significativas
-                detalles.append(f"{var}: {coef_num:.6f} × {var_val} = {contribucion:.6f}")
-            
-        except (ValueError, TypeError) as e:
-            detalles.append(f"{var}: Error - {e}")
-            continue
-    
-    return float(probabilidad), detalles
+@st.cache_resource
+def obtener_cache_cargas(limite_mb: int, ttl_segundos: int) -> dict:
+    """
+    Caché de archivos subidos ya leídos y validados, compartida por todas las sesiones.
+    Las entradas vencen a los `ttl_segundos` de haberse guardado.
+    """
+    cache = nueva_cache(limite_mb * 1024 * 1024, ttl_segundos)
+    registrar_cache("cargas", cache)
+    return cache
 
-def predecir_probit(modelo: pd.Series, datos: dict[str, float]) -> float:
+@st.cache_resource
+def obtener_historial_tiempos(limite: int):
+    """Tiempos por etapa de las últimas `limite` corridas de todas las sesiones (ver parrish.tiempos)"""
+    return nuevo_historial(limite)
+
+@st.cache_resource
+def obtener_control_admision(max_filas: int, max_memoria_mb: float):
+    """
+    Control de admisión de los trabajos pesados de todas las sesiones (ver parrish.admision).
+    Un límite en 0 significa sin límite.
+    """
+    return nuevo_control(max_filas or None, max_memoria_mb or None)
+
+@st.cache_resource
+def obtener_cola_trabajos(carpeta: Path, trabajadores: int, retencion_dias: float):
+    """Cola de análisis masivos en segundo plano compartida por todas las sesiones (ver parrish.trabajos)"""
+    return crear_cola(carpeta, trabajadores, retencion_dias * 24 * 3600, ADMISION)
+
+@st.cache_resource
+def obtener_especulacion(trabajadores: int):
+    """Hilos que adelantan el cálculo de los archivos recién subidos, compartidos por todas las sesiones (ver parrish.especulacion)"""
+    return nueva_especulacion(trabajadores)
+
+@st.cache_resource
+def obtener_servidor_metricas(puerto: int):
     """
-    modelos Probit
+    Listener HTTP de métricas en formato Prometheus (ver parrish.metricas), uno por proceso.
+    Si el puerto está ocupado se sigue sin métricas y se avisa en la consola.
     """
-    suma = 0.0
     try:
-        suma = float(modelo.get("_cons", 0.0))
-    except (ValueError, TypeError):
-        suma = 0.0
+        return iniciar_servidor_metricas(puerto)
+    except OSError as e:
+        logging.getLogger("parrish.metricas").warning("No se pudo abrir el puerto de métricas %s: %s", puerto, e)
+        return None
 
-    for var, coef in modelo.items():
-        if var == "_cons":
-            continue
-        try:
-            coef_num = float(coef)
-            var_val = float(datos.get(var, 0))
-            suma += coef_num * var_val
-        except (ValueError, TypeError):
-            continue
+def cargar_archivo(archivo) -> dict:
+    """
+    Archivo subido ya leído y validado, guardado en CACHE_CARGAS por el hash de sus bytes:
+        huella      -> hash del contenido (ver parrish.datos.huella_archivo)
+        muestra     -> primeras filas, para validar columnas y mostrar la vista previa
+        total       -> número de estudiantes (None si el formato no permite contarlos sin leerlo)
+        bytes       -> tamaño del archivo
+        faltantes   -> columnas requeridas que no trae el archivo
+        datos       -> DataFrame completo con sus tipos, o None hasta que se procesa (ver datos_completos)
+    Los reruns y otras sesiones con el mismo archivo no lo vuelven a leer.
+    """
+    huella = huella_archivo(archivo)
+    carga = obtener(CACHE_CARGAS, huella)
+    if carga is None:
+        observar("parrish_archivo_bytes", archivo.size)
+        # Leer solo el primer bloque: basta para validar columnas y mostrar la vista previa
+        muestra = next(leer_estudiantes_por_bloques(archivo, 10), pd.DataFrame())
+        carga = {
+            "huella": huella,
+            "muestra": muestra,
+            "total": contar_estudiantes(archivo),
+            "bytes": archivo.size,
+            "faltantes": columnas_faltantes(muestra),
+            "datos": None,
+        }
+        guardar(CACHE_CARGAS, huella, carga)
+    return carga
 
-    # Probit: probability = Φ(suma), where Φ is the standard normal CDF
-    probabilidad = norm.cdf(suma)
-    return float(probabilidad)
+def filas_estimadas(carga):
+    """Estudiantes del archivo de `carga`; si el formato no permite contarlos, una estimación por su tamaño"""
+    if carga["total"] is not None:
+        return carga["total"]
+    return carga["bytes"] // BYTES_POR_FILA_ARCHIVO
 
+def datos_completos(carga, archivo, progreso=None):
+    """
+    DataFrame completo del archivo de `carga`. La primera vez se lee por bloques (avanzando
+    `progreso`) y se guarda en CACHE_CARGAS, así que procesarlo de nuevo (por ejemplo, con otro
+    módulo) no relee el archivo. Los bloques se copian a columnas reservadas para el total de
+    filas (ver concatenar_bloques), así que no quedan dos copias de los datos a la vez.
+    """
+    if carga["datos"] is None:
+        bloques = con_progreso(leer_estudiantes_por_bloques(archivo), progreso)
+        carga = dict(carga, datos=concatenar_bloques(bloques, carga["total"]))
+        guardar(CACHE_CARGAS, carga["huella"], carga)
+    return carga["datos"]
 
-def predecir(modelo: pd.Series, datos: dict[str, float]) -> float:
+def calcular_especulativo(carga, archivo, compilado, clave_resultados):
     """
-    Calcula Σ (coef_i * dato_i)  +  _cons
-    Si falta alguna variable, asume 0.
+    Lee el archivo completo, calcula sus predicciones y guarda los resultados en
+    CACHE_RESULTADOS con `clave_resultados`, en un hilo de ESPECULACION y sin esperar el clic
+    en "Procesar". `archivo` es una copia del archivo subido: el original lo sigue usando la página.
+    Solo se adelanta si el control de admisión tiene lugar ahora: el trabajo especulativo no
+    hace cola ni le quita el turno a los análisis pedidos (en ese caso se calcula al procesar).
     """
-    suma = 0.0
-    
-    # Obtener la constante
+    filas = filas_estimadas(carga)
+    ticket = intentar_admitir(ADMISION, filas, memoria_estimada(filas))
+    if ticket is None:
+        return
     try:
-        suma = float(modelo.get("_cons", 0.0))
-    except (ValueError, TypeError):
-        suma = 0.0
-    
-    # Sumar cada término
-    for var, coef in modelo.items():
-        if var == "_cons":
-            continue
-        
-        try:
-            # Convertir coeficiente a float
-            coef_num = float(coef)
-            # Obtener valor de la variable y convertir a float
-            var_val = float(datos.get(var, 0))
-            suma += coef_num * var_val
-        except (ValueError, TypeError) as e:
-            # Si hay error, asumir que el coeficiente es 0
-            print(f"Warning: No se pudo convertir coeficiente para {var}: {coef} - Error: {e}")
-            continue
-    
-    return float(suma)
+        # La carga se busca de nuevo: si otra tarea (por ejemplo, la del grado anterior) ya leyó
+        # el archivo completo, sus datos están en CACHE_CARGAS y no se vuelve a leer
+        carga = obtener(CACHE_CARGAS, carga["huella"]) or carga
+        medicion = nueva_medicion(HISTORIAL_TIEMPOS, "especulativo", modulo=clave_resultados[1])
+        with etapa(medicion, "leer_datos", filas=carga["total"]):
+            df_entrada = datos_completos(carga, archivo)
+        with etapa(medicion, "calcular", filas=len(df_entrada)):
+            acumulador = nuevo_acumulador()
+            df_completo = procesar_en_memoria(df_entrada, compilado, acumulador)
+        incrementar("parrish_filas_calculadas_total", len(df_completo), pagina="especulativo")
+        with etapa(medicion, "estadisticas", filas=len(df_completo)):
+            guardar(CACHE_RESULTADOS, clave_resultados, construir_resultados(df_completo, acumulador))
+    finally:
+        liberar(ADMISION, ticket)
+
+def progreso_en_barra(barra, texto, total):
+    """Progreso (ver parrish.progreso) que actualiza `barra` de st.progress unas pocas veces por segundo"""
+    def notificar(estado):
+        barra.progress(estado["fraccion"] or 0.0, text=f"{texto}: {describir_progreso(estado)}")
+    return nuevo_progreso(total, notificar)
+
+@st.fragment(run_every=2)
+def seguir_trabajo(trabajo_id):
+    """Avance de un trabajo en segundo plano, consultado cada 2 segundos; al terminar recarga la página"""
+    estado = estado_trabajo(COLA_TRABAJOS, trabajo_id)
+    if estado is None or estado["estado"] not in (EN_COLA, PROCESANDO):
+        st.rerun()
+    if estado["estado"] == EN_COLA and estado.get("posicion"):
+        st.progress(0.0, text=f"En cola (posición {estado['posicion']}): esperando a que terminen otros análisis grandes...")
+    elif estado["estado"] == EN_COLA:
+        st.progress(0.0, text="En cola: esperando a que termine otro trabajo...")
+    elif estado["filas_por_segundo"] is None:
+        st.progress(0.0, text="Iniciando...")
+    else:
+        fraccion = min(1.0, estado["filas"] / estado["total"]) if estado["total"] else 0.0
+        st.progress(fraccion, text=f"Calculando predicciones: {describir_progreso(estado)}")
+
+def mostrar_trabajo(trabajo_id, formato_descarga, compresion_descarga):
+    """
+    Estado y resultados de un trabajo en segundo plano. Los resultados se leen de disco
+    (sin recalcular) y quedan en CACHE_RESULTADOS para los siguientes reruns.
+    """
+    st.header(":material/pending_actions: Análisis en Segundo Plano")
+    estado = estado_trabajo(COLA_TRABAJOS, trabajo_id)
+    if estado is None:
+        st.warning("No se encontró el trabajo. Puede que el enlace sea incorrecto o que sus resultados ya hayan vencido.")
+        return
+    st.caption(
+        f"Trabajo `{trabajo_id}` · {estado['nombre']} · módulo {estado['modulo']} · enviado {estado['creado']}. "
+        "Guarde el enlace de esta página para volver más tarde: el trabajo sigue aunque cierre la pestaña."
+    )
+    if estado["estado"] == ERROR:
+        st.error(f"❌ El trabajo falló: {estado['error']}")
+        return
+    if estado["estado"] != TERMINADO:
+        seguir_trabajo(trabajo_id)
+        return
+
+    medicion = nueva_medicion(HISTORIAL_TIEMPOS, "trabajo", modulo=estado["modulo"])
+    clave_resultados = ("trabajo", trabajo_id)
+    resultados = obtener(CACHE_RESULTADOS, clave_resultados)
+    if resultados is None:
+        with st.spinner("Cargando resultados..."), etapa(medicion, "cargar_resultados", filas=estado["filas"]):
+            df_completo, acumulador = resultado_trabajo(COLA_TRABAJOS, trabajo_id)
+            resultados = construir_resultados(df_completo, acumulador)
+            guardar(CACHE_RESULTADOS, clave_resultados, resultados)
+    with etapa(medicion, "graficos"):
+        figuras = figuras_resultados(resultados)
+    with etapa(medicion, "mostrar", filas=len(resultados["df_completo"])):
+        mostrar_resultados(resultados, figuras, formato_descarga, compresion_descarga)
+
+def mostrar_diagnostico(historial):
+    """
+    Panel oculto de diagnóstico: tiempo y memoria de cada etapa de las últimas corridas.
+    Se activa con ?diagnostico=1 en la URL o con PARRISH_DIAGNOSTICO=1.
+    """
+    with st.expander("🩺 Diagnóstico: tiempos por etapa"):
+        actual, pico = memoria_actual_mb(), pico_memoria_mb()
+        st.caption(
+            (f"Memoria del proceso: {actual:,.0f} MB ahora" if actual is not None else "Memoria actual no disponible en esta plataforma")
+            + (f" · pico desde que arrancó: {pico:,.0f} MB" if pico is not None else "")
+            + " · el pico de cada etapa y corrida está en las tablas"
+        )
+        admision = estado_admision(ADMISION)
+        st.caption(
+            f"Admisión: {admision['activos']} en curso ({admision['filas_activas']:,} filas, "
+            f"{admision['bytes_activos'] / (1024 * 1024):,.0f} MB estimados) · {admision['en_cola']} en cola "
+            f"({admision['filas_en_cola']:,} filas)"
+        )
+        corridas = resumen_corridas(historial)
+        if corridas.empty:
+            st.info("Todavía no hay corridas medidas en este proceso.")
+            return
+        st.subheader("Últimas corridas")
+        st.dataframe(corridas.round(3), use_container_width=True, hide_index=True)
+        etapas = tabla_etapas(historial)
+        st.subheader("Segundos por etapa")
+        st.dataframe(
+            etapas.pivot_table(index="corrida", columns="etapa", values="segundos", aggfunc="sum", sort=False).round(3),
+            use_container_width=True,
+        )
+        with st.expander("Detalle"):
+            st.dataframe(etapas.round(3), use_container_width=True, hide_index=True)
 
 
 # --------------------------------------------------
 # Cargar todos los modelos al iniciar la app
 # --------------------------------------------------
 try:
-    MODELOS = cargar_modelos(MODELOS_XLSX)
-    if not MODELOS:
-        st.error("❌ No se pudieron cargar los modelos. Verifique que el archivo 'Coeficientes_modelos.xlsx' existe.")
-        st.stop()
+    GESTOR_MODELOS = obtener_gestor(MODELOS_XLSX)
+    # Cada rerun usa una sola versión del registro de principio a fin
+    REGISTRO = registro_vigente(GESTOR_MODELOS)
+    MODELOS = REGISTRO["modelos"]
 except Exception as e:
     st.error(f"❌ Error al cargar modelos: {e}")
     st.stop()
 
+# Resultados del análisis masivo que sobreviven a los reruns (presupuesto de memoria en MB)
+CACHE_RESULTADOS = obtener_cache_resultados(int(os.environ.get("PARRISH_CACHE_RESULTADOS_MB", "512")))
+
+# Archivos subidos ya leídos: presupuesto de memoria en MB y vencimiento en segundos
+CACHE_CARGAS = obtener_cache_cargas(
+    int(os.environ.get("PARRISH_CACHE_CARGAS_MB", "256")),
+    int(os.environ.get("PARRISH_CACHE_CARGAS_TTL", "1800")),
+)
+
+# Tiempos por etapa: una línea JSON por etapa en el logger parrish.tiempos y las últimas corridas en memoria
+HISTORIAL_TIEMPOS = obtener_historial_tiempos(int(os.environ.get("PARRISH_TIEMPOS_CORRIDAS", "20")))
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("parrish.tiempos").setLevel(os.environ.get("PARRISH_TIEMPOS_LOG", "INFO"))
+
+# Control de admisión: filas y memoria estimada (MB) de los análisis y exportaciones que corren a la vez (0 = sin límite)
+ADMISION = obtener_control_admision(
+    int(os.environ.get("PARRISH_ADMISION_FILAS", "500000")),
+    float(os.environ.get("PARRISH_ADMISION_MB", "1024")),
+)
+
+# Análisis masivos en segundo plano: carpeta de trabajos, hilos de cálculo y días que se conservan los resultados
+COLA_TRABAJOS = obtener_cola_trabajos(
+    Path(os.environ.get("PARRISH_TRABAJOS_DIR", Path(__file__).with_name("trabajos"))),
+    int(os.environ.get("PARRISH_TRABAJOS_TRABAJADORES", "1")),
+    float(os.environ.get("PARRISH_TRABAJOS_DIAS", "7")),
+)
+
+# Desde cuántos estudiantes se propone procesar en segundo plano
+UMBRAL_SEGUNDO_PLANO = int(os.environ.get("PARRISH_TRABAJOS_UMBRAL", "100000"))
+
+# Cálculo adelantado al subir un archivo (0 hilos lo desactiva) y hasta cuántos estudiantes se adelanta
+TRABAJADORES_ESPECULACION = int(os.environ.get("PARRISH_ESPECULACION_TRABAJADORES", "1"))
+ESPECULACION = obtener_especulacion(TRABAJADORES_ESPECULACION) if TRABAJADORES_ESPECULACION > 0 else None
+UMBRAL_ESPECULACION = int(os.environ.get("PARRISH_ESPECULACION_UMBRAL", str(UMBRAL_SEGUNDO_PLANO)))
+
+# Métricas en formato Prometheus en http://<servidor>:PARRISH_METRICAS_PUERTO/metrics (desactivadas si no se define)
+if os.environ.get("PARRISH_METRICAS_PUERTO"):
+    obtener_servidor_metricas(int(os.environ["PARRISH_METRICAS_PUERTO"]))
+
 # --------------------------------------------------
 # Interfaz Principal
 # --------------------------------------------------
@@ -582,6 +975,11 @@ st.sidebar.markdown(" ")
 st.sidebar.markdown(" ")
 st.sidebar.markdown("---")
 st.sidebar.image("utils/img-footer.png", use_container_width=True)
+st.sidebar.caption(
+    f"Modelos v{REGISTRO['version']} · `{REGISTRO['hash'][:12]}` · {REGISTRO['fuente']} · cargados {REGISTRO['cargado']}"
+)
+if GESTOR_MODELOS["error"]:
+    st.sidebar.caption(f"⚠️ No se pudo recargar el archivo de coeficientes: {GESTOR_MODELOS['error']}")
 st.sidebar.markdown("""<div style="text-align: center; padding: 10px 0;">
     <p style="color: #00541f; font-size: 14px; margin: 0;">© 2025 Colegio Karl C. Parrish</p>
 </div>""", unsafe_allow_html=True)
@@ -744,6 +1142,7 @@ if pagina == ":material/person_search: Estudiante Individual":
 
     # ---------- Procesar ----------
     if submitted:
+        medicion = nueva_medicion(HISTORIAL_TIEMPOS, "individual", modulo=modulo)
         if not id_estudiante.strip():
             st.error("⚠️ Por favor ingrese un identificador del estudiante")
             st.stop()
@@ -770,7 +1169,6 @@ if pagina == ":material/person_search: Estudiante Individual":
         # 2️⃣ Calcular predicciones para todas las materias
         materias = ["global", "lectura", "math", "cnat", "soc", "ingles",]
         resultados = {}
-        detalles_calculo = {}
         errores = []
         
         nombres_materias = {
@@ -782,20 +1180,25 @@ if pagina == ":material/person_search: Estudiante Individual":
             "INGLES": "Inglés",
         }
         
-        for materia in materias:
+        with etapa(medicion, "calcular", materias=len(materias)):
+            # Todas las materias y la contribución de cada variable en un solo paso; el texto
+            # del detalle se arma recién en el expander "Ver Cálculos Paso a Paso"
             try:
+                explicacion = explicar_probit(REGISTRO["compilados"][modulo], datos)
+            except Exception as e:
+                explicacion = None
+                errores.append(f"Error al calcular las predicciones: {str(e)}")
+            for materia in materias:
                 hoja = f"s11_{materia}_mod{modulo}"
                 if hoja not in MODELOS:
                     errores.append(f"No se encontró el modelo para {materia} (hoja: {hoja})")
                     continue
-                
-                modelo = MODELOS[hoja]
-                prediccion, detalles = predecir_con_detalles(modelo, datos, materia)
-                resultados[materia.upper()] = prediccion
-                detalles_calculo[materia.upper()] = detalles
-                
-            except Exception as e:
-                errores.append(f"Error al predecir {materia}: {str(e)}")
+                if explicacion is not None:
+                    indice = explicacion["materias"].index(materia)
+                    resultados[materia.upper()] = float(explicacion["probabilidades"][indice])
+        if resultados:
+            incrementar("parrish_filas_calculadas_total", pagina="individual")
+            incrementar("parrish_predicciones_servidas_total", pagina="individual")
         
         # Mostrar errores si los hay
         if errores:
@@ -888,15 +1291,18 @@ if pagina == ":material/person_search: Estudiante Individual":
                 with st.container():
                     st.markdown(f"#### 📚 **{materia}** (Resultado: {resultados[materia]:.6f})")
                     
-                    detalles = detalles_calculo.get(materia, [])
-                    if detalles:
-                        for detalle in detalles[:10]:  # Mostrar solo las primeras 10 contribuciones
-                            st.code(detalle)
-                        
-                        if len(detalles) > 10:
-                            st.caption(f"... y {len(detalles) - 10} términos adicionales")
-                    else:
-                        st.error("No se pudieron obtener los detalles del cálculo")
+                    contribuciones = contribuciones_materia(explicacion, materia.lower())
+                    constante = explicacion["constantes"][explicacion["materias"].index(materia.lower())]
+                    # Mostrar solo la constante y las primeras 9 contribuciones
+                    detalles = [f"Constante: {constante:.6f}"] + [
+                        f"{fila.variable}: {fila.coeficiente:.6f} × {fila.valor} = {fila.contribucion:.6f}"
+                        for fila in contribuciones.head(9).itertuples()
+                    ]
+                    for detalle in detalles:
+                        st.code(detalle)
+
+                    if len(contribuciones) + 1 > len(detalles):
+                        st.caption(f"... y {len(contribuciones) + 1 - len(detalles)} términos adicionales")
                         
                     st.markdown("---")
         
@@ -935,30 +1341,31 @@ if pagina == ":material/person_search: Estudiante Individual":
                 
         # ---- Descargar datos + predicciones
         st.markdown("---")
-        out = {**datos, **{f"pred_{k.lower()}": v for k, v in resultados.items()}}
-        df_download = pd.DataFrame([out])
-        
+        with etapa(medicion, "preparar_descarga"):
+            out = {**datos, **{f"pred_{k.lower()}": v for k, v in resultados.items()}}
+            df_download = pd.DataFrame([out])
 
-        # Descargar como Excel
-        excel_data = convert_df_to_excel(df_download, 'Datos_Estudiante')
-        st.download_button(
-            "Descargar como Excel",
-            data=excel_data,
-            file_name=f"datos_estudiante_{id_estudiante}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+            # Descargar como Excel
+            boton_descarga(
+                "Descargar como Excel",
+                {'Datos_Estudiante': df_download},
+                f"datos_estudiante_{id_estudiante}",
+            )
 
 # --------------------------------------------------
 # Página 2: Análisis Masivo
 # --------------------------------------------------
 elif pagina == ":material/article_person: Análisis Masivo":
     st.title(":material/article_person: Análisis Masivo de Estudiantes")
-    st.markdown("Suba un archivo Excel con datos de múltiples estudiantes para análisis estadístico completo.")
+    st.markdown("Suba un archivo (Excel, CSV, Parquet o Arrow) con datos de múltiples estudiantes para análisis estadístico completo.")
     
     # Instrucciones del formato
-    with st.expander(":material/article: Formato del Archivo Excel"):
+    with st.expander(":material/article: Formato del Archivo"):
         st.markdown("""
-        ### **Formato Requerido del Excel:**
+        ### **Formato Requerido del Archivo:**
+        
+        Se aceptan archivos Excel (hoja `Data`), CSV, Parquet y Arrow IPC (`.arrow`, `.feather`).
+        Para archivos grandes exportados desde una bodega de datos, Parquet o Arrow cargan mucho más rápido.
         
         El archivo debe contener las siguientes columnas exactamente:
         
@@ -993,271 +1400,189 @@ elif pagina == ":material/article_person: Análisis Masivo":
     else:
         modulo_masivo = 24
 
+    # Opciones de procesamiento
+    with st.expander(":material/tune: Opciones de Procesamiento"):
+        paralelo_masivo = st.checkbox(
+            "Procesar en paralelo (varios núcleos)",
+            value=False,
+            help="Reparte los estudiantes en fragmentos entre varios procesos. "
+                 "Conviene para cohortes de cientos de miles de registros; para archivos pequeños es más lento.",
+        )
+        trabajadores_masivo = st.number_input(
+            "Número de procesos",
+            min_value=1,
+            max_value=64,
+            value=min(trabajadores_por_defecto(), 64),
+            step=1,
+            disabled=not paralelo_masivo,
+        )
+        col_formato, col_compresion = st.columns(2)
+        with col_formato:
+            formato_descarga = st.selectbox(
+                "Formato de descarga",
+                options=["xlsx", "csv", "parquet"],
+                format_func=lambda f: {"xlsx": "Excel", "csv": "CSV", "parquet": "Parquet"}[f],
+                help="Excel tiene un límite de 1.048.576 filas por hoja; CSV y Parquet no tienen límite.",
+            )
+        with col_compresion:
+            compresion_descarga = st.selectbox(
+                "Compresión",
+                options=[None, "gzip", "zip"],
+                format_func=lambda c: "Ninguna" if c is None else c,
+            )
     
     # Upload del archivo
     uploaded_file = st.file_uploader(
-        ":material/attachment: Seleccione el archivo Excel con los datos de estudiantes",
-        type=['xlsx', 'xls'],
+        ":material/attachment: Seleccione el archivo con los datos de estudiantes",
+        type=EXTENSIONES_ENTRADA,
         help="El archivo debe contener todas las columnas requeridas"
     )
     
     if uploaded_file is not None:
+        medicion = nueva_medicion(HISTORIAL_TIEMPOS, "masivo", modulo=modulo_masivo, paralelo=paralelo_masivo)
         try:
-            # Cargar el archivo
-            df_estudiantes = pd.read_excel(uploaded_file, sheet_name="Data")
+            # Lectura y validación guardadas por el hash del archivo: los reruns no lo vuelven a leer
+            with etapa(medicion, "cargar_archivo", bytes=uploaded_file.size) as registro:
+                carga = cargar_archivo(uploaded_file)
+                registro["filas"] = carga["total"]
+            df_muestra = carga["muestra"]
+            total_estimado = carga["total"]
             
-            st.success(f"Archivo cargado exitosamente: {len(df_estudiantes)} estudiantes encontrados")
+            if total_estimado is not None:
+                st.success(f"Archivo cargado exitosamente: {total_estimado} estudiantes encontrados")
+            else:
+                st.success("Archivo cargado exitosamente")
             
             # Verificar columnas requeridas
-            columnas_requeridas = [
-                'id', 'estu_mujer', 'edad_grado', 'educ_max_padremadre1',
-                'educ_max_padremadre2', 'educ_max_padremadre3', 'educ_max_padremadre4',
-                'educ_max_padremadre5', 'total_faltas_disc', 'human_langs_08',
-                'maths_08', 'nat_sc_08', 'soc_sc_08', 'nwea_math_perc', 'nwea_reading_perc'
-            ]
-            
-            columnas_faltantes = [col for col in columnas_requeridas if col not in df_estudiantes.columns]
+            faltantes = carga["faltantes"]
             
-            if columnas_faltantes:
-                st.error(f"❌ Faltan las siguientes columnas: {', '.join(columnas_faltantes)}")
+            if faltantes:
+                st.error(f"❌ Faltan las siguientes columnas: {', '.join(faltantes)}")
                 st.stop()
             
             # Mostrar vista previa
             with st.expander("👁️ Vista Previa de los Datos"):
-                st.dataframe(df_estudiantes.head(10), use_container_width=True)
+                st.dataframe(df_muestra, use_container_width=True)
             
-            # Botón para procesar
-            if st.button("🚀 Procesar Análisis Masivo", type="primary", use_container_width=True):
-                with st.spinner("Calculando predicciones para todos los estudiantes..."):
-                    
-                    # Calcular predicciones para todos los estudiantes
-                    materias = ["lectura", "math", "soc", "cnat", "ingles", "global"]
-                    resultados_masivos = []
-                    
-                    progress_bar = st.progress(0)
-                    total_estudiantes = len(df_estudiantes)
-                    
-                    for idx, row in df_estudiantes.iterrows():
-                        # Crear diccionario de datos del estudiante
-                        datos_estudiante = {
-                            "id": row['id'],
-                            "estu_mujer": row['estu_mujer'],
-                            "edad_grado": row['edad_grado'],
-                            "educ_max_padremadre1": row['educ_max_padremadre1'],
-                            "educ_max_padremadre2": row['educ_max_padremadre2'],
-                            "educ_max_padremadre3": row['educ_max_padremadre3'],
-                            "educ_max_padremadre4": row['educ_max_padremadre4'],
-                            "educ_max_padremadre5": row['educ_max_padremadre5'],
-                            "total_faltas_disc": row['total_faltas_disc'],
-                            "human_langs_08": row['human_langs_08'],
-                            "maths_08": row['maths_08'],
-                            "nat_sc_08": row['nat_sc_08'],
-                            "soc_sc_08": row['soc_sc_08'],
-                            "nwea_math_perc": row['nwea_math_perc'],
-                            "nwea_reading_perc": row['nwea_reading_perc'],
-                        }
-                        
-                        # Calcular predicciones
-                        predicciones_estudiante = {"id": row['id']}
-                        for mat in materias:
-                            try:
-                                hoja = f"s11_{mat}_mod{modulo_masivo}"
-                                if hoja in MODELOS:
-                                    modelo = MODELOS[hoja]
-                                    prediccion = predecir_probit(modelo, datos_estudiante)
-                                    predicciones_estudiante[f"pred_{mat}"] = prediccion
-                                else:
-                                    predicciones_estudiante[f"pred_{mat}"] = np.nan
-                            except:
-                                predicciones_estudiante[f"pred_{mat}"] = np.nan
-                        
-                        resultados_masivos.append(predicciones_estudiante)
-                        
-                        # Actualizar barra de progreso
-                        progress_bar.progress((idx + 1) / total_estudiantes)
-                    
-                    # Crear DataFrame con resultados
-                    df_resultados = pd.DataFrame(resultados_masivos)
-                    
-                    # Combinar datos originales con predicciones
-                    df_completo = df_estudiantes.merge(df_resultados, on='id', how='left')
-                    
-                    st.success("✅ ¡Análisis masivo completado!")
-                    
-                    # --------------------------------------------------
-                    # ESTADÍSTICAS Y VISUALIZACIONES
-                    # --------------------------------------------------
-                    
-                    st.header(":material/bar_chart_4_bars: Estadísticas Generales")
-                    
-                    # Métricas principales
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Total Estudiantes", len(df_completo))
-                    with col2:
-                        mujeres = df_completo['estu_mujer'].sum()
-                        st.metric("Mujeres", f"{mujeres} ({mujeres/len(df_completo)*100:.1f}%)")
-                    with col3:
-                        edad_promedio = df_completo['edad_grado'].mean()
-                        st.metric("Edad Promedio", f"{edad_promedio:.1f} años")
-                    with col4:
-                        faltas_promedio = df_completo['total_faltas_disc'].mean()
-                        st.metric("Faltas Promedio", f"{faltas_promedio:.1f}")
-                    
-                    # Estadísticas de predicciones
-                    st.subheader(":material/finance_mode: Estadísticas de Predicciones")
-                    
-                    # Crear tabla de estadísticas
-                    materias_pred = ['pred_global', 'pred_lectura', 'pred_math', 'pred_cnat', 'pred_soc', 'pred_ingles' ]
-                    stats_data = []
-                    
-                    for materia in materias_pred:
-                        if materia in df_completo.columns:
-                            serie = df_completo[materia].dropna()
-                            stats_data.append({
-                                'Materia': materia.replace('pred_', '').upper(),
-                                'Promedio': serie.mean(),
-                                'Mediana': serie.median(),
-                                'Desv. Estándar': serie.std(),
-                                'Mínimo': serie.min(),
-                                'Máximo': serie.max(),
-                                'Positivos (%)': (serie > 0).sum() / len(serie) * 100
-                            })
-                    
-                    df_stats = pd.DataFrame(stats_data)
-                    df_stats = df_stats.round(3)
-                    st.dataframe(df_stats, use_container_width=True)
-                    
-                    # --------------------------------------------------
-                    # VISUALIZACIONES
-                    # --------------------------------------------------
-
-                    st.subheader(":material/analytics: Visualizaciones")
+            # Los resultados se guardan por contenido del archivo, módulo y versión de los modelos:
+            # al volver a ejecutar la página (cualquier interacción) se muestran sin recalcular,
+            # pero solo si en esta sesión ya se hizo clic en procesar con esa clave (el cálculo
+            # adelantado hace instantáneo el clic, no lo reemplaza).
+            # Esta consulta se repite en cada recarga, así que no cuenta en los aciertos y fallos
+            # de la caché: solo cuenta la del clic en el botón.
+            clave_resultados = (carga["huella"], modulo_masivo, REGISTRO["hash"])
+            resultados = obtener(CACHE_RESULTADOS, clave_resultados, contar=False)
+            
+            en_segundo_plano = st.checkbox(
+                "Procesar en segundo plano",
+                value=(total_estimado or 0) >= UMBRAL_SEGUNDO_PLANO,
+                help="El análisis sigue en el servidor aunque cierre la pestaña; "
+                     "vuelva con el enlace de la página para ver y descargar los resultados.",
+            )
 
-                    # Gráfico de distribución de predicciones
-                    fig_dist = make_subplots(
-                        rows=2, cols=3,
-                        subplot_titles=[mat.replace('pred_', '').upper() for mat in materias_pred],
-                        specs=[[{"secondary_y": False}]*3]*2
-                    )
-                    
-                    for i, materia in enumerate(materias_pred):
-                        if materia in df_completo.columns:
-                            row = (i // 3) + 1
-                            col = (i % 3) + 1
-                            
-                            data = df_completo[materia].dropna()
-                            fig_dist.add_trace(
-                                go.Histogram(x=data, name=materia.replace('pred_', '').upper(), showlegend=False),
-                                row=row, col=col
-                            )
-                    
-                    fig_dist.update_layout(
-                        title="Distribución de Predicciones por Materia",
-                        height=600,
-                        showlegend=False
+            # Cálculo adelantado: empieza al subir el archivo, antes del clic en el botón. Si cambia
+            # el grado o el archivo, se cancela el de la clave anterior si aún no empezó; si ya
+            # empezó, termina y sus resultados quedan en CACHE_RESULTADOS por si se vuelve a ella.
+            # Se lanza una sola vez por clave y sesión: si falla, el error se ve al procesar.
+            if ESPECULACION is not None and st.session_state.get("clave_especulativa") != clave_resultados:
+                anterior = st.session_state.pop("clave_especulativa", None)
+                if anterior is not None:
+                    cancelar(ESPECULACION, anterior)
+                if resultados is None and not en_segundo_plano and (total_estimado or 0) < UMBRAL_ESPECULACION:
+                    copia = BytesIO(uploaded_file.getbuffer())
+                    copia.name = uploaded_file.name
+                    especular(
+                        ESPECULACION, clave_resultados,
+                        calcular_especulativo, carga, copia, REGISTRO["compilados"][modulo_masivo], clave_resultados,
                     )
-                    st.plotly_chart(fig_dist, use_container_width=True)
-                    
-  
-                    
-                    # Gráfico de rendimiento por género
-                    if 'estu_mujer' in df_completo.columns:
-                        st.subheader(":material/groups_3: Análisis por Género")
-                        
-                        # Preparar datos para el gráfico
-                        genero_data = []
-                        for materia in materias_pred:
-                            if materia in df_completo.columns:
-                                for genero in [0, 1]:
-                                    subset = df_completo[df_completo['estu_mujer'] == genero]
-                                    if len(subset) > 0:
-                                        promedio = subset[materia].mean()
-                                        promedio = round(promedio, 2)
-                                        genero_data.append({
-                                            'Materia': materia.replace('pred_', '').upper(),
-                                            'Género': 'Mujer' if genero == 1 else 'Hombre',
-                                            'Promedio': promedio
-                                        })
-                        
-                        if genero_data:
-                            df_genero = pd.DataFrame(genero_data)
-                            fig_genero = px.bar(
-                                df_genero, 
-                                x='Materia', 
-                                y='Promedio', 
-                                color='Género',
-                                title="Promedio de Predicciones por Género",
-                                barmode='group',
-                                range_y=(0,1.1)
-                            )
-                            st.plotly_chart(fig_genero, use_container_width=True)
-                    
-                    # Análisis de factores de riesgo
-                    st.subheader(":material/crisis_alert: Análisis de Factores de Riesgo")
-                    
-                    # Estudiantes con bajo rendimiento
-                    threshold = 0.5
-                    materias_bajo = []
-                    for materia in materias_pred:
-                        if materia in df_completo.columns:
-                            bajo_rendimiento = (df_completo[materia] < threshold).sum()
-                            porcentaje = bajo_rendimiento / len(df_completo) * 100
-                            porcentaje = round(porcentaje, 2)
-                            materias_bajo.append({
-                                'Materia': materia.replace('pred_', '').upper(),
-                                'Estudiantes en Riesgo': bajo_rendimiento,
-                                'Porcentaje': porcentaje
-                            })
-                    
-                    if materias_bajo:
-                        df_riesgo = pd.DataFrame(materias_bajo)
-                        st.dataframe(df_riesgo, use_container_width=True)
-                        
-                        # Gráfico de factores de riesgo
-                        fig_riesgo = px.bar(
-                            df_riesgo,
-                            x='Materia',
-                            y='Porcentaje',
-                            title="Porcentaje de Estudiantes en Riesgo por Materia",
-                            color='Porcentaje',
-                            color_continuous_scale="Reds",
-                            range_y=(0, 101)
-                        )
-                        st.plotly_chart(fig_riesgo, use_container_width=True)
-                    
-                    # --------------------------------------------------
-                    # DESCARGA DE RESULTADOS
-                    # --------------------------------------------------
-                    
-                    st.subheader("Descargar Resultados")
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # Descarga completa como Excel
-                        excel_completo = convert_df_to_excel(df_completo, 'Analisis_Completo')
-                        st.download_button(
-                            "Descargar Datos Completos (Excel)",
-                            data=excel_completo,
-                            file_name="analisis_masivo_completo.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                                            
-                    with col2:
-                        # Descarga estadísticas como Excel
-                        excel_stats = convert_df_to_excel(df_stats, 'Estadisticas')
-                        st.download_button(
-                            "Descargar Estadísticas (Excel)",
-                            data=excel_stats,
-                            file_name="estadisticas_predicciones.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    st.session_state["clave_especulativa"] = clave_resultados
 
-                    # Vista previa de resultados
-                    with st.expander("Vista Previa de Resultados Completos"):
-                        st.dataframe(df_completo, use_container_width=True)
+            # Botón para procesar
+            clic = st.button("🚀 Procesar Análisis Masivo", type="primary", use_container_width=True)
+            procesar = False
+            pedidos = st.session_state.setdefault("resultados_pedidos", set())
+            if clic:
+                pedidos.add(clave_resultados)
+                if resultados is None and not en_segundo_plano and ESPECULACION is not None:
+                    # Si el cálculo adelantado sigue en curso se espera; si falló o se canceló, se calcula aquí
+                    with st.spinner("Terminando el cálculo iniciado al subir el archivo..."):
+                        with etapa(medicion, "esperar_especulativo"):
+                            esperar(ESPECULACION, clave_resultados)
+                resultados = obtener(CACHE_RESULTADOS, clave_resultados)
+                procesar = resultados is None
+                if resultados is not None:
+                    incrementar("parrish_predicciones_servidas_total", pagina="masivo")
+            if procesar and en_segundo_plano:
+                # El archivo y las predicciones quedan en disco; el id del trabajo va en la URL
+                trabajo_id = enviar_trabajo(
+                    COLA_TRABAJOS,
+                    uploaded_file.getvalue(),
+                    uploaded_file.name,
+                    REGISTRO["compilados"][modulo_masivo],
+                    modulo_masivo,
+                    REGISTRO["hash"],
+                )
+                st.query_params["trabajo"] = trabajo_id
+            elif procesar:
+                # Si hay otros análisis grandes en curso se espera el turno, mostrando la posición en la cola
+                aviso = st.empty()
+                filas = filas_estimadas(carga)
+                turno = admitir(
+                    ADMISION, filas, memoria_estimada(filas),
+                    lambda lugar: aviso.info(
+                        f"⏳ Hay otros análisis grandes en curso. Su análisis está en la posición {lugar} de la cola "
+                        "y empezará automáticamente."
+                    ),
+                    pagina="masivo",
+                )
+                with turno:
+                    aviso.empty()
+                    # Barra de progreso con filas por segundo y tiempo restante (unas pocas actualizaciones por segundo)
+                    barra = st.progress(0.0, text="Leyendo archivo...")
+                    compilado = REGISTRO["compilados"][modulo_masivo]
+                    with etapa(medicion, "leer_datos", filas=carga["total"]):
+                        df_entrada = datos_completos(
+                            carga, uploaded_file, progreso_en_barra(barra, "Leyendo archivo", carga["total"])
+                        )
+                    progreso = progreso_en_barra(barra, "Calculando predicciones", len(df_entrada))
+                    with etapa(medicion, "calcular", filas=len(df_entrada)):
+                        if paralelo_masivo:
+                            # Fragmentos repartidos entre varios procesos; cada uno devuelve
+                            # sus estadísticas y se combinan en orden. La copia superficial (copy-on-write)
+                            # protege los datos en caché sin duplicarlos.
+                            df_completo, acumulador = procesar_en_paralelo(
+                                df_entrada.copy(deep=False), compilado, int(trabajadores_masivo), progreso
+                            )
+                        else:
+                            # Calcular predicciones bloque a bloque; las estadísticas se acumulan
+                            # a medida que llega cada bloque. df_completo comparte las columnas
+                            # de df_entrada (en CACHE_CARGAS) y solo agrega las predicciones.
+                            acumulador = nuevo_acumulador()
+                            df_completo = procesar_en_memoria(df_entrada, compilado, acumulador, progreso)
+                    incrementar("parrish_filas_calculadas_total", len(df_completo), pagina="masivo")
+                    incrementar("parrish_predicciones_servidas_total", pagina="masivo")
+                    with st.spinner("Preparando estadísticas y gráficos..."):
+                        with etapa(medicion, "estadisticas", filas=len(df_completo)):
+                            resultados = construir_resultados(df_completo, acumulador)
+                            guardar(CACHE_RESULTADOS, clave_resultados, resultados)
+                    barra.empty()
+            
+            if resultados is not None and clave_resultados in pedidos:
+                with etapa(medicion, "graficos"):
+                    figuras = figuras_resultados(resultados)
+                with etapa(medicion, "mostrar", filas=len(resultados["df_completo"])):
+                    mostrar_resultados(resultados, figuras, formato_descarga, compresion_descarga)
         
         except Exception as e:
             st.error(f"❌ Error al procesar el archivo: {str(e)}")
             st.info("Verifique que el archivo tenga el formato correcto y todas las columnas requeridas.")
+
+    # Trabajo en segundo plano de la URL (?trabajo=<id>): se puede volver más tarde con el mismo enlace
+    if st.query_params.get("trabajo"):
+        mostrar_trabajo(st.query_params["trabajo"], formato_descarga, compresion_descarga)
+
+# --------------------------------------------------
+# Diagnóstico (oculto): ?diagnostico=1 o PARRISH_DIAGNOSTICO=1
+# --------------------------------------------------
+if os.environ.get("PARRISH_DIAGNOSTICO") == "1" or st.query_params.get("diagnostico") == "1":
+    mostrar_diagnostico(HISTORIAL_TIEMPOS)
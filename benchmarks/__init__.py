@@ -0,0 +1 @@
+"""Benchmarks del Sistema de Predicción Colegio Parrish (se ejecutan con python -m benchmarks.<nombre>)"""
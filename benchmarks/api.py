@@ -0,0 +1,153 @@
+"""
+Prueba de carga del servicio HTTP de predicciones (parrish.servicio):
+
+    python -m benchmarks.api
+    python -m benchmarks.api --ruta batch --filas 1000 --formato arrow --concurrencia 4
+    python -m benchmarks.api --url http://localhost:8000 --duracion 30
+
+Sin --url levanta el servicio en este mismo proceso, en un puerto libre (el cliente y el
+servidor comparten la CPU; para medir el servidor solo, inícielo aparte con
+python -m parrish serve y use --url). Antes de medir se envían --calentamiento solicitudes;
+después cada hilo cliente mantiene una conexión persistente y envía solicitudes sin pausa
+durante --duracion segundos. Informa solicitudes por segundo,
+filas por segundo y la latencia p50/p90/p99 en milisegundos.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+import argparse
+import time
+
+import numpy as np
+import orjson
+
+from parrish.modelos import MODELOS_XLSX, crear_gestor
+from parrish.servicio import ARROW_FLUJO, crear_servicio, iniciar_en_segundo_plano
+from parrish.sintetico import generar_cohorte
+
+from .comun import entorno, guardar_json
+
+
+def cuerpos(ruta: str, filas: int, formato: str, semilla: int = 0) -> tuple[bytes, dict]:
+    """Cuerpo y encabezados de la solicitud: un estudiante para /score, `filas` para /score/batch"""
+    df = generar_cohorte(1 if ruta == "score" else filas, semilla, con_vacios=False)
+    if ruta == "score":
+        return orjson.dumps(df.to_dict("records")[0]), {"Content-Type": "application/json"}
+    if formato == "arrow":
+        import pyarrow as pa
+
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        destino = BytesIO()
+        with pa.ipc.new_stream(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+        return destino.getvalue(), {"Content-Type": ARROW_FLUJO, "Accept": ARROW_FLUJO}
+    return orjson.dumps(df.to_dict("records")), {"Content-Type": "application/json"}
+
+
+def cliente(
+    url: str, ruta: str, cuerpo: bytes, encabezados: dict, fin: float, maximo: int | None = None
+) -> tuple[list[float], int]:
+    """
+    Envía solicitudes por una conexión persistente hasta `fin` (o hasta enviar `maximo`);
+    devuelve las latencias (s) y los errores
+    """
+    destino = urlsplit(url)
+    conexion = HTTPConnection(destino.hostname, destino.port, timeout=60)
+    latencias, errores = [], 0
+    while time.perf_counter() < fin and (maximo is None or len(latencias) + errores < maximo):
+        inicio = time.perf_counter()
+        try:
+            conexion.request("POST", ruta, body=cuerpo, headers=encabezados)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status != 200:
+                errores += 1
+                continue
+        except OSError:
+            errores += 1
+            conexion.close()
+            conexion = HTTPConnection(destino.hostname, destino.port, timeout=60)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+    conexion.close()
+    return latencias, errores
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.api", description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Servicio ya iniciado (por defecto se inicia uno en este proceso)")
+    parser.add_argument("--ruta", choices=["score", "batch"], default="score")
+    parser.add_argument("--modulo", type=int, default=24)
+    parser.add_argument("--filas", type=int, default=1000, help="Estudiantes por solicitud en /score/batch")
+    parser.add_argument("--formato", choices=["json", "arrow"], default="json", help="Formato del lote")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Clientes simultáneos")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument("--calentamiento", type=int, default=20, help="Solicitudes enviadas antes de medir")
+    parser.add_argument("--modelos", type=Path, default=MODELOS_XLSX)
+    parser.add_argument("-o", "--salida", type=Path, help="Archivo JSON de resultados (por defecto en benchmarks/resultados/)")
+    args = parser.parse_args(argv)
+
+    servidor = None
+    url = args.url
+    if url is None:
+        servidor = crear_servicio(crear_gestor(args.modelos), "127.0.0.1", 0)
+        iniciar_en_segundo_plano(servidor)
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    ruta = f"/{'score' if args.ruta == 'score' else 'score/batch'}?modulo={args.modulo}"
+    cuerpo, encabezados = cuerpos(args.ruta, args.filas, args.formato)
+    filas = 1 if args.ruta == "score" else args.filas
+
+    # Calentamiento: las primeras solicitudes (carga perezosa, cachés) quedan fuera de la medición
+    calentamiento, errores_calentamiento = cliente(url, ruta, cuerpo, encabezados, float("inf"), args.calentamiento)
+    if args.calentamiento and not calentamiento:
+        print(f"❌ Ninguna solicitud de calentamiento fue exitosa ({errores_calentamiento} errores)")
+        if servidor is not None:
+            servidor.shutdown()
+        return 1
+    inicio = time.perf_counter()
+    fin = inicio + args.duracion
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as ejecutor:
+        resultados = list(ejecutor.map(
+            lambda _: cliente(url, ruta, cuerpo, encabezados, fin), range(args.concurrencia)
+        ))
+    transcurrido = time.perf_counter() - inicio
+    if servidor is not None:
+        servidor.shutdown()
+
+    latencias = np.array([l for lista, _ in resultados for l in lista]) * 1000
+    errores = sum(e for _, e in resultados)
+    if not len(latencias):
+        print(f"❌ Ninguna solicitud exitosa ({errores} errores)")
+        return 1
+    p50, p90, p99 = np.percentile(latencias, [50, 90, 99])
+    informe = {
+        **entorno(),
+        "url": args.url or "en proceso",
+        "ruta": ruta,
+        "formato": args.formato if args.ruta == "batch" else "json",
+        "filas_por_solicitud": filas,
+        "concurrencia": args.concurrencia,
+        "calentamiento": args.calentamiento,
+        "duracion": transcurrido,
+        "solicitudes": len(latencias),
+        "errores": errores,
+        "solicitudes_por_segundo": len(latencias) / transcurrido,
+        "filas_por_segundo": len(latencias) * filas / transcurrido,
+        "latencia_ms": {"p50": p50, "p90": p90, "p99": p99, "max": float(latencias.max())},
+    }
+    print(
+        f"{ruta} · {informe['formato']} · {filas:,} filas/solicitud · {args.concurrencia} clientes · {transcurrido:.1f} s\n"
+        f"  {informe['solicitudes']:,} solicitudes ({errores} errores) · "
+        f"{informe['solicitudes_por_segundo']:,.1f} solicitudes/s · {informe['filas_por_segundo']:,.0f} filas/s\n"
+        f"  latencia ms: p50 {p50:.2f} · p90 {p90:.2f} · p99 {p99:.2f} · máx {latencias.max():.2f}"
+    )
+    destino = guardar_json(informe, args.salida, "api")
+    print(f"✅ Resultados guardados en {destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""
+Utilidades compartidas por los benchmarks: medición y resultados en JSON
+para comparar corridas en el tiempo.
+"""
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+# Carpeta por defecto de los resultados (ignorada por git)
+CARPETA_RESULTADOS = Path(__file__).with_name("resultados")
+
+
+def medir(funcion, *args, repeticiones: int = 3) -> float:
+    """Mejor tiempo (segundos) de `repeticiones` llamadas"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def entorno() -> dict:
+    """Datos de la máquina y del código con que se midió, para poder comparar corridas"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def guardar_json(informe: dict, path: Path | None, nombre: str) -> Path:
+    """Escribe el informe en `path` (por defecto, benchmarks/resultados/<nombre>-<fecha>.json)"""
+    if path is None:
+        CARPETA_RESULTADOS.mkdir(exist_ok=True)
+        path = CARPETA_RESULTADOS / f"{nombre}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def comparar(informe: dict, anterior: dict) -> list[dict]:
+    """
+    Une dos informes por (caso, filas): segundos de cada corrida y cuántas veces más rápida
+    es la actual (> 1 = mejoró). Solo incluye las mediciones presentes en ambos.
+    """
+    previos = {(r["caso"], r["filas"]): r for r in anterior["resultados"] if r.get("segundos") is not None}
+    filas = []
+    for r in informe["resultados"]:
+        previo = previos.get((r["caso"], r["filas"]))
+        if previo is None or r.get("segundos") is None:
+            continue
+        filas.append({
+            "caso": r["caso"],
+            "filas": r["filas"],
+            "antes": previo["segundos"],
+            "ahora": r["segundos"],
+            "aceleracion": previo["segundos"] / r["segundos"] if r["segundos"] > 0 else float("inf"),
+        })
+    return filas
@@ -0,0 +1,108 @@
+"""
+Benchmark de las estadísticas del análisis masivo según el tamaño de la cohorte:
+
+    python -m benchmarks.estadisticas
+    python -m benchmarks.estadisticas --tamanos 1000 100000 --repeticiones 5
+
+Compara los bucles por materia que usaba la página (dropna/mean/median/std por columna y
+un filtro por género para cada materia) con parrish.estadisticas, tanto en una sola pasada
+sobre la cohorte completa como bloque a bloque (como en el procesamiento masivo).
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from parrish.datos import TAMANO_BLOQUE, dividir_en_bloques
+from parrish.estadisticas import (
+    COLUMNAS_PRED,
+    UMBRAL_RIESGO,
+    acumular,
+    estadisticas_cohorte,
+    nuevo_acumulador,
+    tabla_estadisticas,
+    tabla_genero,
+    tabla_riesgo,
+)
+
+from .comun import medir
+
+TAMANOS = [100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def cohorte_predicciones(filas: int, semilla: int = 0) -> pd.DataFrame:
+    """Cohorte ya calculada: predicciones en [0, 1] (con 1% de vacíos), género, edad y faltas"""
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({col: rng.beta(2, 2, filas) for col in COLUMNAS_PRED})
+    for col in COLUMNAS_PRED:
+        df.loc[rng.random(filas) < 0.01, col] = np.nan
+    df['estu_mujer'] = rng.integers(0, 2, filas)
+    df['edad_grado'] = rng.integers(15, 20, filas)
+    df['total_faltas_disc'] = rng.poisson(20, filas)
+    return df
+
+
+def estadisticas_por_materia(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Referencia: los bucles por materia y por género que hacía la página de análisis masivo"""
+    stats_data = []
+    for materia in COLUMNAS_PRED:
+        serie = df[materia].dropna()
+        stats_data.append({
+            'Materia': materia.replace('pred_', '').upper(),
+            'Promedio': serie.mean(),
+            'Mediana': serie.median(),
+            'Desv. Estándar': serie.std(),
+            'Mínimo': serie.min(),
+            'Máximo': serie.max(),
+            'Positivos (%)': (serie > 0).sum() / len(serie) * 100,
+        })
+    genero_data = []
+    for materia in COLUMNAS_PRED:
+        for genero in [0, 1]:
+            subset = df[df['estu_mujer'] == genero]
+            if len(subset) > 0:
+                genero_data.append({
+                    'Materia': materia.replace('pred_', '').upper(),
+                    'Género': 'Mujer' if genero == 1 else 'Hombre',
+                    'Promedio': round(subset[materia].mean(), 2),
+                })
+    materias_bajo = []
+    for materia in COLUMNAS_PRED:
+        bajo_rendimiento = (df[materia] < UMBRAL_RIESGO).sum()
+        materias_bajo.append({
+            'Materia': materia.replace('pred_', '').upper(),
+            'Estudiantes en Riesgo': bajo_rendimiento,
+            'Porcentaje': round(bajo_rendimiento / len(df) * 100, 2),
+        })
+    return pd.DataFrame(stats_data), pd.DataFrame(genero_data), pd.DataFrame(materias_bajo)
+
+
+def por_bloques(df: pd.DataFrame) -> dict:
+    """Estadísticas acumuladas bloque a bloque, como en el procesamiento masivo"""
+    acum = nuevo_acumulador()
+    for bloque in dividir_en_bloques(df, TAMANO_BLOQUE):
+        acumular(acum, bloque)
+    return {"estadisticas": tabla_estadisticas(acum), "genero": tabla_genero(acum), "riesgo": tabla_riesgo(acum)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.estadisticas", description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS, metavar="FILAS")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'filas':>10} {'bucles (s)':>11} {'1 pasada (s)':>13} {'bloques (s)':>12} {'aceleración':>12} {'filas/s':>12}")
+    for filas in args.tamanos:
+        df = cohorte_predicciones(filas)
+        bucles = medir(estadisticas_por_materia, df, repeticiones=args.repeticiones)
+        pasada = medir(estadisticas_cohorte, df, repeticiones=args.repeticiones)
+        bloques = medir(por_bloques, df, repeticiones=args.repeticiones)
+        print(
+            f"{filas:>10,} {bucles:>11.4f} {pasada:>13.4f} {bloques:>12.4f} "
+            f"{bucles / pasada:>11.1f}x {filas / pasada:>12,.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+"""
+Benchmark de todo el flujo de predicción, sin navegador:
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --tamanos 100 10000 --casos exportar
+    python -m benchmarks.pipeline --comparar benchmarks/resultados/pipeline-20260101-120000.json
+
+Mide la carga de modelos, el cálculo estudiante por estudiante (predecir, predecir_probit,
+predecir_con_detalles y explicar_probit), el cálculo masivo (en un paso, por bloques y en paralelo), las
+estadísticas y cada ruta de exportación, para cohortes de 100 a 1.000.000 de estudiantes.
+Los resultados se guardan en JSON (ver benchmarks/comun.py) para comparar corridas.
+"""
+from pathlib import Path
+import argparse
+import json
+import tempfile
+
+from parrish.datos import dividir_en_bloques, guardar_resultados, guardar_resultados_por_bloques
+from parrish.estadisticas import estadisticas_cohorte, nuevo_acumulador
+from parrish.exportar import COMPRESIONES, FORMATOS_EXPORTACION, exportar
+from parrish.masivo import procesar_por_bloques
+from parrish.modelos import MATERIAS, MODELOS_XLSX, cargar_modelos, construir_registro, leer_coeficientes
+from parrish.paralelo import procesar_en_paralelo, trabajadores_por_defecto
+from parrish.prediccion import explicar_probit, predecir, predecir_con_detalles, predecir_probit, predecir_probit_lote
+from parrish.sintetico import generar_cohorte
+
+from .comun import comparar, entorno, guardar_json, medir
+
+TAMANOS = [100, 1_000, 10_000, 100_000, 1_000_000]
+
+# Casos lentos que se omiten por encima de estas filas (salvo con --sin-limites)
+LIMITE_POR_FILA = 10_000
+LIMITE_EXCEL = 100_000
+
+MODULO = 24
+
+
+def casos_por_fila(modelos: dict, compilado: dict) -> dict:
+    """Cálculo estudiante por estudiante para las 6 materias, como la página individual"""
+    hojas = {materia: modelos[f"s11_{materia}_mod{MODULO}"] for materia in MATERIAS}
+
+    def con(funcion, *extra):
+        def calcular(registros):
+            for datos in registros:
+                for materia, modelo in hojas.items():
+                    funcion(modelo, datos, *([materia] if extra else []))
+        return calcular
+
+    return {
+        "predecir": con(predecir),
+        "predecir_probit": con(predecir_probit),
+        "predecir_con_detalles": con(predecir_con_detalles, True),
+        # Las 6 materias con sus contribuciones en un solo paso, sin texto
+        "explicar_probit": lambda registros: [explicar_probit(compilado, datos) for datos in registros],
+    }
+
+
+def casos_masivos(compilado: dict, trabajadores: int) -> dict:
+    """Cálculo de la cohorte completa por las tres rutas del análisis masivo"""
+    def por_bloques(df):
+        for _ in procesar_por_bloques(dividir_en_bloques(df), compilado, nuevo_acumulador()):
+            pass
+
+    return {
+        "predecir_probit_lote": lambda df: predecir_probit_lote(compilado, df.copy()),
+        "procesar_por_bloques": por_bloques,
+        "procesar_en_paralelo": lambda df: procesar_en_paralelo(df.copy(), compilado, trabajadores),
+    }
+
+
+def casos_exportacion(carpeta: Path) -> dict:
+    """Cada formato y compresión de la descarga, y cada escritura a disco de la línea de comandos"""
+    casos = {}
+    for formato in FORMATOS_EXPORTACION:
+        for compresion in (None, *COMPRESIONES):
+            nombre = f"exportar_{formato}" + (f"_{compresion}" if compresion else "")
+            casos[nombre] = lambda df, f=formato, c=compresion: exportar({"Datos": df}, f, c)
+    for sufijo in (".parquet", ".csv", ".xlsx"):
+        destino = carpeta / f"salida{sufijo}"
+        casos[f"guardar_resultados{sufijo}"] = lambda df, d=destino: guardar_resultados(df, d)
+        casos[f"guardar_resultados_por_bloques{sufijo}"] = (
+            lambda df, d=destino: guardar_resultados_por_bloques(dividir_en_bloques(df), d)
+        )
+    return casos
+
+
+def omitir(caso: str, filas: int, sin_limites: bool) -> bool:
+    if sin_limites:
+        return False
+    if caso == "explicar_probit" or caso.startswith("predecir") and caso != "predecir_probit_lote":
+        return filas > LIMITE_POR_FILA
+    return "xlsx" in caso and filas > LIMITE_EXCEL
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.pipeline", description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS, metavar="FILAS")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--casos", nargs="+", metavar="TEXTO", help="Solo los casos cuyo nombre contiene alguno de estos textos")
+    parser.add_argument("--trabajadores", type=int, default=trabajadores_por_defecto(), help="Procesos de procesar_en_paralelo")
+    parser.add_argument(
+        "--sin-limites", action="store_true",
+        help=f"No omitir el cálculo por fila sobre {LIMITE_POR_FILA:,} filas ni Excel sobre {LIMITE_EXCEL:,}",
+    )
+    parser.add_argument("--modelos", type=Path, default=MODELOS_XLSX)
+    parser.add_argument("-o", "--salida", type=Path, help="Archivo JSON de resultados (por defecto en benchmarks/resultados/)")
+    parser.add_argument("--comparar", type=Path, metavar="JSON", help="Informe anterior con el que comparar")
+    args = parser.parse_args(argv)
+
+    def incluido(caso: str) -> bool:
+        return not args.casos or any(texto in caso for texto in args.casos)
+
+    informe = {
+        **entorno(),
+        "repeticiones": args.repeticiones,
+        "trabajadores": args.trabajadores,
+        "resultados": [],
+    }
+
+    def registrar(caso: str, filas: int | None, segundos: float | None) -> None:
+        informe["resultados"].append({
+            "caso": caso,
+            "filas": filas,
+            "segundos": segundos,
+            "filas_por_segundo": filas / segundos if filas and segundos else None,
+        })
+        detalle = "omitido" if segundos is None else f"{segundos:10.4f} s"
+        print(f"{caso:<42} {filas if filas is not None else '-':>10} {detalle}", flush=True)
+
+    # Carga de modelos: no depende del tamaño de la cohorte. leer_coeficientes lee siempre el
+    # Excel; cargar_modelos y construir_registro usan el artefacto compilado si está al día
+    if incluido("leer_coeficientes"):
+        registrar("leer_coeficientes", None, medir(leer_coeficientes, args.modelos, repeticiones=args.repeticiones))
+    if incluido("cargar_modelos"):
+        registrar("cargar_modelos", None, medir(cargar_modelos, args.modelos, repeticiones=args.repeticiones))
+    if incluido("construir_registro"):
+        registrar("construir_registro", None, medir(construir_registro, args.modelos, 1, repeticiones=args.repeticiones))
+
+    registro = construir_registro(args.modelos, version=1)
+    por_fila = casos_por_fila(registro["modelos"], registro["compilados"][MODULO])
+    masivos = casos_masivos(registro["compilados"][MODULO], args.trabajadores)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        exportaciones = casos_exportacion(Path(carpeta))
+        for filas in args.tamanos:
+            df = generar_cohorte(filas)
+            registros = df.to_dict("records")
+            for caso, funcion in por_fila.items():
+                if incluido(caso):
+                    omitido = omitir(caso, filas, args.sin_limites)
+                    registrar(caso, filas, None if omitido else medir(funcion, registros, repeticiones=args.repeticiones))
+            for caso, funcion in masivos.items():
+                if incluido(caso):
+                    registrar(caso, filas, medir(funcion, df, repeticiones=args.repeticiones))
+
+            calculado = predecir_probit_lote(registro["compilados"][MODULO], df.copy())
+            if incluido("estadisticas_cohorte"):
+                registrar("estadisticas_cohorte", filas, medir(estadisticas_cohorte, calculado, repeticiones=args.repeticiones))
+            for caso, funcion in exportaciones.items():
+                if incluido(caso):
+                    omitido = omitir(caso, filas, args.sin_limites)
+                    registrar(caso, filas, None if omitido else medir(funcion, calculado, repeticiones=args.repeticiones))
+
+    destino = guardar_json(informe, args.salida, "pipeline")
+    print(f"✅ Resultados guardados en {destino}")
+
+    if args.comparar:
+        anterior = json.loads(args.comparar.read_text(encoding="utf-8"))
+        print(f"\nComparación con {args.comparar} (commit {anterior.get('commit')}):")
+        for fila in comparar(informe, anterior):
+            print(
+                f"{fila['caso']:<42} {fila['filas'] if fila['filas'] is not None else '-':>10} "
+                f"{fila['antes']:10.4f} s -> {fila['ahora']:10.4f} s  ({fila['aceleracion']:.2f}x)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,15 @@
+"""
+Núcleo de predicción del Sistema de Predicción Colegio Parrish.
+Este paquete no depende de Streamlit: lo comparten la app y la línea de comandos (python -m parrish).
+"""
+from .datos import COLUMNAS_REQUERIDAS, columnas_faltantes, leer_estudiantes
+from .modelos import MATERIAS, MODULOS, cargar_modelos, construir_registro, crear_gestor, registro_vigente
+from .prediccion import (
+    compilar_modelos,
+    contribuciones_materia,
+    explicar_probit,
+    predecir,
+    predecir_con_detalles,
+    predecir_probit,
+    predecir_probit_lote,
+)
@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+# La guarda evita que los procesos del pool (spawn) vuelvan a ejecutar la línea de comandos
+if __name__ == "__main__":
+    sys.exit(main())
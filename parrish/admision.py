@@ -0,0 +1,150 @@
+"""
+Control de admisión del proceso para los trabajos pesados (análisis masivos, cálculo adelantado,
+trabajos en segundo plano y exportaciones): si varias personas procesan archivos grandes a la
+vez, en lugar de correr todo al mismo tiempo y quedarse sin memoria, los que no caben esperan
+en una cola por orden de llegada.
+
+Cada solicitud declara sus filas y la memoria que se estima que va a usar (ver
+memoria_estimada). Entra si, sumada a las que están corriendo, no supera ni el límite de filas
+ni el de memoria; una solicitud más grande que los límites entra cuando no hay nada corriendo,
+así que nunca queda esperando para siempre. La cola es estricta (la primera espera a que haya
+lugar para ella aunque las siguientes sí quepan), para que las solicitudes grandes no pierdan
+su turno frente a un flujo de pequeñas.
+"""
+from contextlib import contextmanager
+from typing import Callable, Iterator
+import threading
+import time
+import uuid
+
+from .metricas import observar
+
+# Bytes por estudiante medidos con cohortes sintéticas (ver parrish.sintetico), con margen:
+# análisis en memoria (datos leídos, predicciones y estadísticas) y exportación (CSV, el peor formato)
+BYTES_POR_FILA_ANALISIS = 512
+BYTES_POR_FILA_EXPORTACION = 320
+# Tamaño medio de una fila en CSV, para estimar las filas cuando el formato no permite contarlas
+BYTES_POR_FILA_ARCHIVO = 50
+
+
+def nuevo_control(max_filas: int | None = None, max_memoria_mb: float | None = None) -> dict:
+    """
+    Control de admisión con esos límites (None: sin límite) para las solicitudes que corren a la vez:
+        activos  -> ticket -> (filas, bytes) de las solicitudes admitidas
+        cola     -> tickets en espera, por orden de llegada
+    """
+    return {
+        "max_filas": max_filas,
+        "max_bytes": None if max_memoria_mb is None else max_memoria_mb * 1024 * 1024,
+        "activos": {},
+        "cola": [],
+        "pedidos": {},
+        "condicion": threading.Condition(),
+    }
+
+
+def memoria_estimada(filas: int, bytes_por_fila: int = BYTES_POR_FILA_ANALISIS) -> int:
+    """Bytes que se estima que usa procesar `filas` estudiantes"""
+    return int(filas * bytes_por_fila)
+
+
+def cabe(control: dict, filas: int, memoria: int) -> bool:
+    """Si una solicitud de `filas` y `memoria` bytes entra junto a las activas (o si no hay ninguna activa)"""
+    if not control["activos"]:
+        return True
+    filas_activas = sum(f for f, _ in control["activos"].values())
+    bytes_activos = sum(b for _, b in control["activos"].values())
+    return (
+        (control["max_filas"] is None or filas_activas + filas <= control["max_filas"])
+        and (control["max_bytes"] is None or bytes_activos + memoria <= control["max_bytes"])
+    )
+
+
+def posicion(control: dict, ticket: str) -> int | None:
+    """0 si el ticket ya fue admitido, su lugar en la cola (1 = el siguiente) si espera, o None si no existe"""
+    with control["condicion"]:
+        if ticket in control["activos"]:
+            return 0
+        if ticket in control["cola"]:
+            return control["cola"].index(ticket) + 1
+    return None
+
+
+def intentar_admitir(control: dict, filas: int, memoria: int) -> str | None:
+    """Admite la solicitud solo si no hay cola y cabe ahora; devuelve su ticket o None (sin esperar)"""
+    with control["condicion"]:
+        if control["cola"] or not cabe(control, filas, memoria):
+            return None
+        ticket = uuid.uuid4().hex
+        control["activos"][ticket] = (filas, memoria)
+        return ticket
+
+
+def liberar(control: dict, ticket: str) -> None:
+    """Saca el ticket de las activas o de la cola y avisa a los que esperan"""
+    with control["condicion"]:
+        control["activos"].pop(ticket, None)
+        if ticket in control["cola"]:
+            control["cola"].remove(ticket)
+            del control["pedidos"][ticket]
+        control["condicion"].notify_all()
+
+
+@contextmanager
+def admitir(
+    control: dict,
+    filas: int,
+    memoria: int,
+    al_esperar: Callable[[int], None] | None = None,
+    intervalo: float = 0.5,
+    **etiquetas,
+) -> Iterator[str]:
+    """
+    Espera el turno de una solicitud de `filas` y `memoria` bytes y la mantiene admitida durante
+    el bloque `with`. Mientras espera llama a al_esperar(posición en la cola) cada vez que la
+    posición cambia (se revisa al menos cada `intervalo` segundos). La espera se publica en el
+    histograma parrish_admision_espera_segundos con `etiquetas`. Si el bloque o la espera se
+    interrumpen (por ejemplo, porque la persona cambió de página), el lugar se libera igual.
+    """
+    ticket = uuid.uuid4().hex
+    inicio = time.perf_counter()
+    with control["condicion"]:
+        control["cola"].append(ticket)
+        control["pedidos"][ticket] = (filas, memoria)
+    try:
+        anterior = None
+        while True:
+            with control["condicion"]:
+                if control["cola"][0] == ticket and cabe(control, filas, memoria):
+                    control["cola"].pop(0)
+                    del control["pedidos"][ticket]
+                    control["activos"][ticket] = (filas, memoria)
+                    # El siguiente de la cola puede caber también
+                    control["condicion"].notify_all()
+                    break
+                lugar = control["cola"].index(ticket) + 1
+                if lugar == anterior or al_esperar is None:
+                    control["condicion"].wait(intervalo)
+                    continue
+            anterior = lugar
+            al_esperar(lugar)
+        observar("parrish_admision_espera_segundos", time.perf_counter() - inicio, **etiquetas)
+        yield ticket
+    finally:
+        liberar(control, ticket)
+
+
+def estado_admision(control: dict) -> dict:
+    """Solicitudes activas y en cola, con sus filas y bytes estimados, y los límites"""
+    with control["condicion"]:
+        activos = list(control["activos"].values())
+        en_cola = [control["pedidos"][t] for t in control["cola"]]
+    return {
+        "activos": len(activos),
+        "filas_activas": sum(f for f, _ in activos),
+        "bytes_activos": sum(b for _, b in activos),
+        "en_cola": len(en_cola),
+        "filas_en_cola": sum(f for f, _ in en_cola),
+        "max_filas": control["max_filas"],
+        "max_bytes": control["max_bytes"],
+    }
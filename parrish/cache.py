@@ -0,0 +1,132 @@
+"""
+Caché en memoria con presupuesto de bytes: cuando el total supera el límite se descartan
+las entradas usadas hace más tiempo (LRU), y opcionalmente las que superan un tiempo de vida.
+Es segura entre hilos, así que la pueden compartir todas las sesiones de la app.
+"""
+from collections import OrderedDict
+import hashlib
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def nueva_cache(limite_bytes: int, ttl: float | None = None) -> dict:
+    """
+    Caché vacía:
+        limite             -> bytes máximos que puede ocupar
+        ttl                -> segundos que vive cada entrada desde que se guarda (None: sin vencimiento)
+        entradas           -> clave -> (valor, bytes, vence), de la menos a la más recientemente usada
+        bytes              -> bytes ocupados
+        aciertos, fallos   -> contadores de consultas
+    """
+    return {
+        "limite": int(limite_bytes),
+        "ttl": ttl,
+        "entradas": OrderedDict(),
+        "bytes": 0,
+        "aciertos": 0,
+        "fallos": 0,
+        "lock": threading.Lock(),
+    }
+
+
+def tamano_objeto(valor) -> int:
+    """
+    Bytes aproximados que ocupa `valor`: DataFrames y arreglos por su memoria real,
+    figuras de Plotly por los arreglos de sus trazas y contenedores sumando sus elementos.
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(index=True, deep=True)
+        return int(uso.sum() if isinstance(valor, pd.DataFrame) else uso)
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, (bytes, bytearray, str)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamano_objeto(k) + tamano_objeto(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(tamano_objeto(v) for v in valor)
+    if hasattr(valor, "data") and hasattr(valor, "layout"):
+        # Figura de Plotly: los datos viven en las trazas
+        return sum(tamano_objeto(traza.to_plotly_json()) for traza in valor.data) + 4096
+    return sys.getsizeof(valor)
+
+
+def huella_datos(*partes) -> str:
+    """
+    Hash (blake2b) del contenido de `partes`: DataFrames por columnas, tipos y valores,
+    arreglos por forma, tipo y bytes, y cualquier otro valor por su repr. Sirve como clave de caché.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            h.update(f"|df|{list(parte.columns)}|{list(map(str, parte.dtypes))}|{len(parte)}".encode())
+            h.update(pd.util.hash_pandas_object(parte, index=False).to_numpy().tobytes())
+        elif isinstance(parte, np.ndarray):
+            h.update(f"|nd|{parte.shape}|{parte.dtype}".encode())
+            h.update(np.ascontiguousarray(parte).tobytes())
+        else:
+            h.update(f"|{parte!r}".encode())
+    return h.hexdigest()
+
+
+def obtener(cache: dict, clave, contar: bool = True):
+    """
+    Valor guardado con `clave` (y lo marca como usado recientemente), o None si no está.
+    Con contar=False la consulta no suma aciertos ni fallos (para mirar si ya hay un valor
+    sin que cuente como un uso de la caché, por ejemplo en cada recarga de la página).
+    """
+    with cache["lock"]:
+        entrada = cache["entradas"].get(clave)
+        if entrada is not None and entrada[2] < time.monotonic():
+            del cache["entradas"][clave]
+            cache["bytes"] -= entrada[1]
+            entrada = None
+        if entrada is None:
+            if contar:
+                cache["fallos"] += 1
+            return None
+        cache["entradas"].move_to_end(clave)
+        if contar:
+            cache["aciertos"] += 1
+        return entrada[0]
+
+
+def guardar(cache: dict, clave, valor, tamano: int | None = None) -> bool:
+    """
+    Guarda `valor` con `clave` (reemplaza la entrada anterior y reinicia su tiempo de vida),
+    descarta las entradas vencidas y luego las más antiguas hasta volver al límite.
+    Un valor más grande que el límite completo no se guarda (devuelve False).
+    """
+    tamano = tamano_objeto(valor) if tamano is None else int(tamano)
+    if tamano > cache["limite"]:
+        return False
+    ahora = time.monotonic()
+    vence = ahora + cache["ttl"] if cache["ttl"] is not None else float("inf")
+    with cache["lock"]:
+        anterior = cache["entradas"].pop(clave, None)
+        if anterior is not None:
+            cache["bytes"] -= anterior[1]
+        for vieja in [k for k, (_, _, v) in cache["entradas"].items() if v < ahora]:
+            cache["bytes"] -= cache["entradas"].pop(vieja)[1]
+        cache["entradas"][clave] = (valor, tamano, vence)
+        cache["bytes"] += tamano
+        while cache["bytes"] > cache["limite"]:
+            _, (_, liberado, _) = cache["entradas"].popitem(last=False)
+            cache["bytes"] -= liberado
+    return True
+
+
+def resumen_cache(cache: dict) -> dict:
+    """Entradas, bytes ocupados, límite, aciertos y fallos (para mostrar en la app)"""
+    with cache["lock"]:
+        return {
+            "entradas": len(cache["entradas"]),
+            "bytes": cache["bytes"],
+            "limite": cache["limite"],
+            "aciertos": cache["aciertos"],
+            "fallos": cache["fallos"],
+        }
@@ -0,0 +1,191 @@
+"""
+Línea de comandos sin navegador para procesos nocturnos:
+
+    python -m parrish score estudiantes.xlsx --modulo 24 -o predicciones.parquet
+    python -m parrish compile
+    python -m parrish synth 1000000 -o cohorte.parquet --semilla 7
+    python -m parrish serve --host 0.0.0.0 --puerto 8000
+
+No importa Streamlit ni Plotly, de modo que arranca rápido y puede correr desde cron. Lo que
+solo usa un subcomando (el servicio HTTP, el pool de procesos, las cohortes sintéticas) se
+importa dentro de ese subcomando.
+"""
+from io import BytesIO
+from pathlib import Path
+import argparse
+import hashlib
+import sys
+import time
+
+from .datos import (
+    columnas_faltantes,
+    contar_estudiantes,
+    guardar_resultados,
+    guardar_resultados_por_bloques,
+    leer_estudiantes,
+    leer_estudiantes_por_bloques,
+)
+from .estadisticas import nuevo_acumulador
+from .masivo import procesar_por_bloques
+from .modelos import MODELOS_XLSX, MODULOS, construir_registro, crear_gestor, guardar_artefacto, leer_coeficientes
+from .prediccion import predecir_probit_lote
+from .progreso import avanzar, con_progreso, describir_progreso, nuevo_progreso, terminar
+
+
+def progreso_consola(total: int | None) -> dict:
+    """Progreso que reescribe una línea en stderr (filas/s y tiempo restante), unas pocas veces por segundo"""
+    def notificar(estado: dict) -> None:
+        fin = "\n" if estado["total"] and estado["filas"] >= estado["total"] else ""
+        print(f"\r⏳ {describir_progreso(estado)}", end=fin, file=sys.stderr, flush=True)
+    return nuevo_progreso(total, notificar)
+
+
+def comando_score(args: argparse.Namespace) -> int:
+    """Calcula las predicciones de todos los estudiantes del archivo y las guarda en la salida"""
+    inicio = time.perf_counter()
+    registro = construir_registro(args.modelos, version=1)
+
+    compilado = registro["compilados"][args.modulo]
+
+    try:
+        if args.bloque:
+            # Lectura, cálculo y escritura bloque a bloque: la memoria no crece con el archivo
+            progreso = progreso_consola(contar_estudiantes(args.entrada)) if args.progreso else None
+            bloques = leer_estudiantes_por_bloques(args.entrada, args.bloque)
+            total = guardar_resultados_por_bloques(
+                con_progreso(procesar_por_bloques(bloques, compilado, nuevo_acumulador()), progreso), args.salida
+            )
+        elif args.trabajadores:
+            # Fragmentos repartidos entre varios procesos
+            from .paralelo import procesar_en_paralelo
+
+            df = leer_estudiantes(args.entrada)
+            progreso = progreso_consola(len(df)) if args.progreso else None
+            df, _ = procesar_en_paralelo(df, compilado, args.trabajadores, progreso)
+            guardar_resultados(df, args.salida)
+            total = len(df)
+        else:
+            df = leer_estudiantes(args.entrada)
+            faltantes = columnas_faltantes(df)
+            if faltantes:
+                raise ValueError(f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+
+            progreso = progreso_consola(len(df)) if args.progreso else None
+            predecir_probit_lote(compilado, df)
+            avanzar(progreso, len(df))
+            terminar(progreso)
+            guardar_resultados(df, args.salida)
+            total = len(df)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    print(
+        f"✅ {total} estudiantes procesados con el módulo {args.modulo} "
+        f"(modelos {registro['hash'][:12]}, {registro['fuente']}) en {time.perf_counter() - inicio:.2f} s -> {args.salida}"
+    )
+    return 0
+
+
+def comando_compile(args: argparse.Namespace) -> int:
+    """Compila el Excel de coeficientes al artefacto JSON que se carga al iniciar"""
+    contenido = args.modelos.read_bytes()
+    modelos = leer_coeficientes(BytesIO(contenido))
+    artefacto = args.modelos.with_suffix(".json")
+    guardar_artefacto(modelos, artefacto, hashlib.sha256(contenido).hexdigest())
+    print(f"✅ {len(modelos)} hojas compiladas -> {artefacto}")
+    return 0
+
+
+def comando_synth(args: argparse.Namespace) -> int:
+    """Escribe una cohorte sintética de N estudiantes, bloque a bloque, en la salida"""
+    from .sintetico import generar_por_bloques
+
+    inicio = time.perf_counter()
+    progreso = progreso_consola(args.filas) if args.progreso else None
+    bloques = generar_por_bloques(args.filas, args.semilla, con_vacios=not args.sin_vacios)
+    try:
+        total = guardar_resultados_por_bloques(con_progreso(bloques, progreso), args.salida)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    print(f"✅ {total} estudiantes sintéticos (semilla {args.semilla}) en {time.perf_counter() - inicio:.2f} s -> {args.salida}")
+    return 0
+
+
+def comando_serve(args: argparse.Namespace) -> int:
+    """Atiende el servicio HTTP de predicciones (ver parrish.servicio) hasta Ctrl+C"""
+    from .servicio import crear_servicio
+
+    gestor = crear_gestor(args.modelos)
+    try:
+        servidor = crear_servicio(gestor, args.host, args.puerto)
+    except OSError as e:
+        print(f"❌ No se pudo abrir {args.host}:{args.puerto}: {e}", file=sys.stderr)
+        return 2
+
+    registro = gestor["registro"]
+    print(
+        f"✅ Servicio de predicciones en http://{args.host}:{args.puerto} "
+        f"(modelos v{registro['version']} {registro['hash'][:12]}, {registro['fuente']})",
+        flush=True,
+    )
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m parrish", description="Sistema de Predicción Colegio Parrish")
+    parser.add_argument(
+        "--modelos", type=Path, default=MODELOS_XLSX,
+        help="Excel de coeficientes (por defecto Coeficientes_modelos.xlsx del proyecto)",
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    score = subparsers.add_parser("score", help="Calcula predicciones para un archivo de estudiantes")
+    score.add_argument("entrada", type=Path, help="Archivo de estudiantes: Excel (hoja 'Data'), CSV, Parquet o Arrow IPC")
+    score.add_argument("--modulo", type=int, choices=MODULOS, required=True, help="14 = grados 9 o 10, 24 = grado 11")
+    score.add_argument("-o", "--salida", type=Path, required=True, help="Archivo de salida (.parquet, .csv o .xlsx)")
+    modo = score.add_mutually_exclusive_group()
+    modo.add_argument(
+        "--bloque", type=int, default=0, metavar="FILAS",
+        help="Procesa el archivo en bloques de FILAS filas con memoria acotada (salida .csv, .parquet o .xlsx)",
+    )
+    modo.add_argument(
+        "--trabajadores", type=int, default=0, metavar="N",
+        help="Reparte el cálculo entre N procesos (0 = en este proceso)",
+    )
+    score.add_argument(
+        "--progreso", action="store_true",
+        help="Muestra en stderr el avance con filas por segundo y tiempo restante",
+    )
+    score.set_defaults(funcion=comando_score)
+
+    synth = subparsers.add_parser("synth", help="Genera una cohorte sintética para pruebas de carga")
+    synth.add_argument("filas", type=int, help="Número de estudiantes")
+    synth.add_argument("-o", "--salida", type=Path, required=True, help="Archivo de salida (.parquet, .csv o .xlsx)")
+    synth.add_argument("--semilla", type=int, default=0, help="Semilla aleatoria (la misma semilla da la misma cohorte)")
+    synth.add_argument("--sin-vacios", action="store_true", help="No deja notas ni percentiles vacíos")
+    synth.add_argument("--progreso", action="store_true", help="Muestra en stderr el avance")
+    synth.set_defaults(funcion=comando_synth)
+
+    serve = subparsers.add_parser("serve", help="Servicio HTTP de predicciones (/score, /score/batch)")
+    serve.add_argument("--host", default="127.0.0.1", help="Dirección donde escuchar (0.0.0.0 dentro de un contenedor)")
+    serve.add_argument("--puerto", type=int, default=8000)
+    serve.set_defaults(funcion=comando_serve)
+
+    compilar = subparsers.add_parser("compile", help="Compila el Excel de coeficientes al artefacto JSON")
+    compilar.set_defaults(funcion=comando_compile)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = crear_parser().parse_args(argv)
+    return args.funcion(args)
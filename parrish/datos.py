@@ -0,0 +1,374 @@
+"""
+Lectura y validación de los archivos de estudiantes para el análisis masivo
+(Excel, CSV, Parquet o Arrow IPC).
+"""
+from pathlib import Path
+import hashlib
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+# Columnas que debe traer el archivo de estudiantes (hoja "Data" en Excel)
+COLUMNAS_REQUERIDAS = [
+    'id', 'estu_mujer', 'edad_grado', 'educ_max_padremadre1',
+    'educ_max_padremadre2', 'educ_max_padremadre3', 'educ_max_padremadre4',
+    'educ_max_padremadre5', 'total_faltas_disc', 'human_langs_08',
+    'maths_08', 'nat_sc_08', 'soc_sc_08', 'nwea_math_perc', 'nwea_reading_perc'
+]
+
+
+# Filas por bloque en la lectura por bloques (ver leer_estudiantes_por_bloques)
+TAMANO_BLOQUE = 10_000
+
+# Formatos de entrada aceptados según la extensión del archivo
+FORMATOS_ENTRADA = {
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+    ".xls": "excel",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+EXTENSIONES_ENTRADA = [sufijo.lstrip(".") for sufijo in FORMATOS_ENTRADA]
+
+
+def columnas_faltantes(df: pd.DataFrame) -> list[str]:
+    """Devuelve las columnas requeridas que no están en `df`, en el orden de COLUMNAS_REQUERIDAS"""
+    return [col for col in COLUMNAS_REQUERIDAS if col not in df.columns]
+
+
+def extension(fuente) -> str:
+    """Extensión en minúsculas de una ruta o de un archivo subido (usa su atributo name)"""
+    return Path(str(getattr(fuente, "name", fuente))).suffix.lower()
+
+
+def formato_archivo(fuente) -> str:
+    """Formato de entrada según la extensión: "excel", "csv", "parquet" o "arrow" (ver FORMATOS_ENTRADA)"""
+    sufijo = extension(fuente)
+    if sufijo not in FORMATOS_ENTRADA:
+        soportadas = ", ".join(sorted(FORMATOS_ENTRADA))
+        raise ValueError(f"Formato de archivo no soportado: '{sufijo}' (use {soportadas})")
+    return FORMATOS_ENTRADA[sufijo]
+
+
+def rebobinar(fuente) -> None:
+    """Vuelve al inicio si `fuente` es un archivo abierto (por ejemplo, el de st.file_uploader)"""
+    if hasattr(fuente, "seek"):
+        fuente.seek(0)
+
+
+def huella_archivo(fuente) -> str:
+    """
+    Hash (blake2b) del contenido de `fuente` (ruta o archivo abierto): identifica una carga
+    por sus bytes, aunque cambie el nombre del archivo.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(fuente, (str, Path)):
+        with open(fuente, "rb") as archivo:
+            for trozo in iter(lambda: archivo.read(1 << 20), b""):
+                h.update(trozo)
+    elif hasattr(fuente, "getbuffer"):
+        h.update(fuente.getbuffer())
+    else:
+        rebobinar(fuente)
+        for trozo in iter(lambda: fuente.read(1 << 20), b""):
+            h.update(trozo)
+        rebobinar(fuente)
+    return h.hexdigest()
+
+
+def leer_tabla_arrow(fuente):
+    """
+    Lee un archivo Arrow IPC (formato archivo/Feather v2 o formato stream) como pyarrow.Table.
+    Las rutas se abren con memory map, sin copiar los datos.
+    """
+    import pyarrow as pa
+
+    rebobinar(fuente)
+    if hasattr(fuente, "read"):
+        origen = pa.BufferReader(fuente.read())
+    else:
+        origen = pa.memory_map(str(fuente))
+    try:
+        return pa.ipc.open_file(origen).read_all()
+    except pa.ArrowInvalid:
+        origen.seek(0)
+        return pa.ipc.open_stream(origen).read_all()
+
+
+def leer_estudiantes(fuente) -> pd.DataFrame:
+    """
+    Lee el archivo de estudiantes completo (ruta o archivo subido):
+    Excel (hoja "Data"), CSV, Parquet o Arrow IPC. Parquet y Arrow llegan
+    con sus columnas ya tipadas, sin volver a interpretar texto.
+    """
+    formato = formato_archivo(fuente)
+    rebobinar(fuente)
+    if formato == "csv":
+        return pd.read_csv(fuente)
+    if formato == "parquet":
+        return pd.read_parquet(fuente)
+    if formato == "arrow":
+        return leer_tabla_arrow(fuente).to_pandas()
+    return pd.read_excel(fuente, sheet_name="Data")
+
+
+def bloque_a_dataframe(filas: list[tuple], columnas: list[str]) -> pd.DataFrame:
+    """
+    Convierte filas crudas de openpyxl en un DataFrame con los mismos tipos que
+    daría pd.read_excel: los textos numéricos (por ejemplo, ids guardados como texto) pasan a número.
+    """
+    df = pd.DataFrame(filas, columns=columnas)
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def contar_estudiantes(fuente) -> int | None:
+    """
+    Número de estudiantes sin leer los datos: dimensiones guardadas en el .xlsx
+    o metadatos de Parquet/Arrow. Devuelve None si el formato no lo permite (CSV, .xls)
+    o si el .xlsx no guarda sus dimensiones.
+    """
+    formato = formato_archivo(fuente)
+    rebobinar(fuente)
+    try:
+        if formato == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetFile(fuente).metadata.num_rows
+        if formato == "arrow":
+            return leer_tabla_arrow(fuente).num_rows
+        if formato == "excel" and extension(fuente) != ".xls":
+            import openpyxl
+
+            wb = openpyxl.load_workbook(fuente, read_only=True, data_only=True)
+            try:
+                max_row = wb["Data"].max_row if "Data" in wb.sheetnames else None
+                return max_row - 1 if max_row else None
+            finally:
+                wb.close()
+        return None
+    finally:
+        rebobinar(fuente)
+
+
+def leer_excel_por_bloques(fuente, tamano_bloque: int) -> Iterator[pd.DataFrame]:
+    """
+    Recorre la hoja "Data" de un .xlsx con openpyxl en modo de solo lectura, así que nunca
+    se tiene el libro completo en memoria. Se omiten las filas totalmente vacías.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(fuente, read_only=True, data_only=True)
+    try:
+        if "Data" not in wb.sheetnames:
+            raise ValueError("Worksheet named 'Data' not found")
+        ws = wb["Data"]
+        encabezado = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        columnas = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(encabezado)]
+
+        filas = []
+        for fila in ws.iter_rows(min_row=2, max_col=len(columnas), values_only=True):
+            if all(valor is None for valor in fila):
+                continue
+            filas.append(fila)
+            if len(filas) == tamano_bloque:
+                yield bloque_a_dataframe(filas, columnas)
+                filas = []
+        if filas or not columnas:
+            yield bloque_a_dataframe(filas, columnas)
+    finally:
+        wb.close()
+
+
+def leer_estudiantes_por_bloques(fuente, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[pd.DataFrame]:
+    """
+    Lee el archivo de estudiantes en bloques de hasta `tamano_bloque` filas:
+        .xlsx   -> openpyxl en modo de solo lectura (ver leer_excel_por_bloques)
+        CSV     -> pd.read_csv con chunksize
+        Parquet -> lotes de pyarrow, sin cargar el archivo completo
+        Arrow   -> cortes de la tabla (memory map si es una ruta)
+        .xls    -> se lee completo y se entrega por partes
+    """
+    formato = formato_archivo(fuente)
+    rebobinar(fuente)
+    try:
+        if formato == "csv":
+            with pd.read_csv(fuente, chunksize=tamano_bloque) as lector:
+                for df in lector:
+                    yield df.reset_index(drop=True)
+        elif formato == "parquet":
+            import pyarrow.parquet as pq
+
+            for lote in pq.ParquetFile(fuente).iter_batches(batch_size=tamano_bloque):
+                yield lote.to_pandas()
+        elif formato == "arrow":
+            tabla = leer_tabla_arrow(fuente)
+            for inicio in range(0, tabla.num_rows, tamano_bloque):
+                yield tabla.slice(inicio, tamano_bloque).to_pandas()
+        elif extension(fuente) != ".xls":
+            yield from leer_excel_por_bloques(fuente, tamano_bloque)
+        else:
+            df = leer_estudiantes(fuente)
+            for inicio in range(0, len(df), tamano_bloque):
+                yield df.iloc[inicio:inicio + tamano_bloque].reset_index(drop=True)
+    finally:
+        rebobinar(fuente)
+
+
+def dividir_en_bloques(df: pd.DataFrame, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[pd.DataFrame]:
+    """
+    Recorre un DataFrame ya leído en bloques de `tamano_bloque` filas, con la misma forma que
+    leer_estudiantes_por_bloques. Los bloques son copias: agregarles columnas no modifica `df`.
+    """
+    for inicio in range(0, len(df), tamano_bloque):
+        yield df.iloc[inicio:inicio + tamano_bloque].copy()
+
+
+def es_numpy_numerica(columna: pd.Series) -> bool:
+    """Si la columna es de un tipo numérico o booleano de numpy (se puede reservar como arreglo)"""
+    return isinstance(columna.dtype, np.dtype) and columna.dtype.kind in "biuf"
+
+
+def concatenar_bloques(bloques: Iterable[pd.DataFrame], total: int | None = None) -> pd.DataFrame:
+    """
+    Une los bloques (ver leer_estudiantes_por_bloques) en un solo DataFrame, como
+    pd.concat(list(bloques), ignore_index=True) pero sin tener los datos dos veces en memoria.
+    Las columnas numéricas se copian a arreglos reservados de antemano para `total` filas (si no
+    se conoce, crecen al doble cuando se llenan) y cada bloque se suelta en cuanto se copia; las
+    de texto se unen columna por columna. Si una columna numérica trae texto en un bloque
+    posterior, desde ahí se une como texto.
+    """
+    arreglos: dict[str, np.ndarray] = {}
+    partes: dict[str, list[pd.Series]] = {}
+    orden: list[str] = []
+    filas = 0
+    for df in bloques:
+        if not orden:
+            orden = list(df.columns)
+            for col in orden:
+                if es_numpy_numerica(df[col]):
+                    arreglos[col] = np.empty(max(total or 0, len(df)), dtype=df[col].dtype)
+                else:
+                    partes[col] = []
+        fin = filas + len(df)
+        for col in list(arreglos):
+            columna = df[col]
+            arreglo = arreglos[col]
+            if not es_numpy_numerica(columna):
+                partes[col] = [pd.Series(arreglos.pop(col)[:filas])]
+                continue
+            tipo = np.result_type(arreglo.dtype, columna.dtype)
+            if fin > len(arreglo) or tipo != arreglo.dtype:
+                nuevo = np.empty(max(fin, 2 * len(arreglo)) if fin > len(arreglo) else len(arreglo), dtype=tipo)
+                nuevo[:filas] = arreglo[:filas]
+                arreglo = arreglos[col] = nuevo
+            arreglo[filas:fin] = columna.to_numpy()
+        for col in partes:
+            partes[col].append(df[col].copy())
+        filas = fin
+
+    columnas = {}
+    for col in orden:
+        if col in arreglos:
+            arreglo = arreglos.pop(col)
+            # Sin copiar si el total era exacto; si sobró espacio, se recorta columna por columna
+            columnas[col] = arreglo if len(arreglo) == filas else arreglo[:filas].copy()
+        else:
+            columnas[col] = pd.concat(partes.pop(col), ignore_index=True)
+    return pd.DataFrame(columnas, copy=False)
+
+
+def guardar_resultados(df: pd.DataFrame, path: Path) -> None:
+    """Guarda `df` según la extensión de `path`: .parquet, .csv o .xlsx"""
+    sufijo = path.suffix.lower()
+    if sufijo == ".parquet":
+        df.to_parquet(path, index=False)
+    elif sufijo == ".csv":
+        df.to_csv(path, index=False)
+    elif sufijo == ".xlsx":
+        from .exportar import exportar_excel
+
+        path.write_bytes(exportar_excel({"Data": df}))
+    else:
+        raise ValueError(f"Formato de salida no soportado: '{path.suffix}' (use .parquet, .csv o .xlsx)")
+
+
+def esquema_por_bloques(df: pd.DataFrame):
+    """
+    Esquema Arrow fijo para escribir Parquet bloque a bloque. No sale de los tipos del primer
+    bloque, que pueden variar en los siguientes (enteros que luego traen vacíos, un texto suelto
+    en una columna numérica, ids numéricos y luego alfanuméricos): las variables de los modelos
+    y las columnas pred_* se escriben como float64 y las demás (id incluido) como texto.
+    """
+    import pyarrow as pa
+
+    return pa.schema([
+        (str(col), pa.float64() if (col in COLUMNAS_REQUERIDAS and col != 'id') or str(col).startswith('pred_') else pa.string())
+        for col in df.columns
+    ])
+
+
+def ajustar_a_esquema(df: pd.DataFrame, esquema) -> pd.DataFrame:
+    """
+    Convierte un bloque a los tipos de `esquema` (ver esquema_por_bloques): los valores que no
+    son números en una columna float64 quedan vacíos y el texto conserva los vacíos como nulos.
+    """
+    import pyarrow as pa
+
+    return df.assign(**{
+        campo.name: (
+            pd.to_numeric(df[campo.name], errors="coerce").astype("float64")
+            if campo.type == pa.float64()
+            else df[campo.name].astype("string")
+        )
+        for campo in esquema
+    })
+
+
+def guardar_resultados_por_bloques(bloques: Iterable[pd.DataFrame], path: Path) -> int:
+    """
+    Escribe los bloques en `path` a medida que llegan (.csv, .parquet o .xlsx), sin juntarlos
+    en memoria. Devuelve el número de filas escritas.
+    """
+    sufijo = path.suffix.lower()
+    if sufijo not in (".csv", ".parquet", ".xlsx"):
+        raise ValueError(f"La escritura por bloques solo admite .csv, .parquet o .xlsx, no '{path.suffix}'")
+
+    if sufijo == ".xlsx":
+        from .exportar import escribir_hoja, nuevo_libro
+
+        libro = nuevo_libro(str(path))
+        try:
+            return escribir_hoja(libro, "Data", bloques)
+        finally:
+            libro.close()
+
+    filas = 0
+    escritor = None
+    try:
+        for i, df in enumerate(bloques):
+            if sufijo == ".csv":
+                df.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                if escritor is None:
+                    esquema = esquema_por_bloques(df)
+                    escritor = pq.ParquetWriter(path, esquema)
+                tabla = pa.Table.from_pandas(ajustar_a_esquema(df, esquema), preserve_index=False)
+                escritor.write_table(tabla.select(esquema.names).cast(esquema))
+            filas += len(df)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
@@ -0,0 +1,64 @@
+"""
+Trabajo especulativo: cálculos que se adelantan en segundo plano porque probablemente se van
+a pedir (por ejemplo, las predicciones de un archivo recién subido, antes del clic en procesar).
+Cada tarea se identifica por una clave; pedir la misma clave reutiliza la tarea en curso, y una
+tarea que todavía no empezó se puede cancelar si deja de ser útil. La función de la tarea
+guarda su resultado donde corresponda (por ejemplo, en una caché de parrish.cache).
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def nueva_especulacion(trabajadores: int = 1) -> dict:
+    """Pool de `trabajadores` hilos para tareas especulativas; tareas -> clave -> Future en curso"""
+    return {
+        "ejecutor": ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="parrish-especulacion"),
+        "tareas": {},
+        "lock": threading.Lock(),
+    }
+
+
+def especular(esp: dict, clave, funcion, *args) -> Future:
+    """Lanza funcion(*args) con `clave`, o devuelve la tarea que ya está en curso con esa clave"""
+    with esp["lock"]:
+        tarea = esp["tareas"].get(clave)
+        if tarea is not None and not tarea.cancelled():
+            return tarea
+        tarea = esp["ejecutor"].submit(funcion, *args)
+        esp["tareas"][clave] = tarea
+
+    def olvidar(terminada: Future) -> None:
+        with esp["lock"]:
+            if esp["tareas"].get(clave) is terminada:
+                del esp["tareas"][clave]
+        if not terminada.cancelled() and terminada.exception() is not None:
+            logger.warning("Falló la tarea especulativa %s: %s", clave, terminada.exception())
+
+    tarea.add_done_callback(olvidar)
+    return tarea
+
+
+def cancelar(esp: dict, clave) -> bool:
+    """Cancela la tarea de `clave` si todavía no empezó (una tarea en curso termina y su resultado se conserva)"""
+    with esp["lock"]:
+        tarea = esp["tareas"].get(clave)
+    return tarea is not None and tarea.cancel()
+
+
+def esperar(esp: dict, clave) -> bool:
+    """
+    Espera la tarea de `clave` si está en curso. Devuelve True si había una y terminó bien;
+    False si no había ninguna, se canceló o falló (en ese caso el cálculo se hace de nuevo).
+    """
+    with esp["lock"]:
+        tarea = esp["tareas"].get(clave)
+    if tarea is None:
+        return False
+    try:
+        tarea.result()
+    except Exception:
+        return False
+    return True
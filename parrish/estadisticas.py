@@ -0,0 +1,253 @@
+"""
+Estadísticas del análisis masivo acumuladas bloque a bloque.
+El acumulador ocupa la misma memoria sin importar el número de estudiantes.
+"""
+import numpy as np
+import pandas as pd
+
+# Columnas de predicción en el orden en que se muestran las tablas y gráficos
+COLUMNAS_PRED = ['pred_global', 'pred_lectura', 'pred_math', 'pred_cnat', 'pred_soc', 'pred_ingles']
+
+# Predicciones por debajo de este valor se consideran en riesgo
+UMBRAL_RIESGO = 0.5
+
+# Número de intervalos en [0, 1] del histograma usado para la mediana
+BINS_MEDIANA = 10_000
+
+# Número de barras de los histogramas de distribución que se envían al navegador
+BINS_GRAFICO = 50
+
+
+def nuevo_acumulador(columnas: list[str] = COLUMNAS_PRED, umbral: float = UMBRAL_RIESGO, bins: int = BINS_MEDIANA) -> dict:
+    """
+    Acumulador vacío para las estadísticas del análisis masivo:
+        filas, mujeres, edad, faltas      -> métricas generales
+        n, media, m2, minimo, maximo      -> descriptivas por columna (media y varianza por el método de Chan)
+        positivos, bajo_umbral            -> conteos por columna
+        histograma                        -> conteos por intervalo de [0, 1] para la mediana
+        genero                            -> filas, sumas y conteos por columna para cada valor de estu_mujer
+    """
+    k = len(columnas)
+    return {
+        "columnas": list(columnas),
+        "umbral": umbral,
+        "bins": bins,
+        "filas": 0,
+        "mujeres": 0.0,
+        "edad": {"suma": 0.0, "n": 0},
+        "faltas": {"suma": 0.0, "n": 0},
+        "n": np.zeros(k, dtype=np.int64),
+        "media": np.zeros(k),
+        "m2": np.zeros(k),
+        "minimo": np.full(k, np.inf),
+        "maximo": np.full(k, -np.inf),
+        "positivos": np.zeros(k, dtype=np.int64),
+        "bajo_umbral": np.zeros(k, dtype=np.int64),
+        "histograma": np.zeros((k, bins), dtype=np.int64),
+        "genero": {g: {"filas": 0, "suma": np.zeros(k), "n": np.zeros(k, dtype=np.int64)} for g in (0, 1)},
+    }
+
+
+def acumular(acum: dict, df: pd.DataFrame) -> dict:
+    """Suma un bloque de estudiantes ya calculados (con columnas pred_*) al acumulador"""
+    acum["filas"] += len(df)
+    if 'estu_mujer' in df.columns:
+        acum["mujeres"] += float(pd.to_numeric(df['estu_mujer'], errors='coerce').sum())
+    for clave, col in (("edad", 'edad_grado'), ("faltas", 'total_faltas_disc')):
+        if col in df.columns:
+            serie = pd.to_numeric(df[col], errors='coerce')
+            acum[clave]["suma"] += float(serie.sum())
+            acum[clave]["n"] += int(serie.count())
+
+    genero = df['estu_mujer'].to_numpy() if 'estu_mujer' in df.columns else None
+    if genero is not None:
+        for g in (0, 1):
+            acum["genero"][g]["filas"] += int((genero == g).sum())
+
+    # Todas las columnas de predicción a la vez: una matriz (filas × columnas) en orden de
+    # columna, para que cada reducción recorra memoria contigua
+    presentes = [j for j, col in enumerate(acum["columnas"]) if col in df.columns]
+    if not presentes or len(df) == 0:
+        return acum
+    valores = np.empty((len(df), len(presentes)), order="F")
+    for k, j in enumerate(presentes):
+        valores[:, k] = df[acum["columnas"][j]].to_numpy(dtype=float)
+    validos = ~np.isnan(valores)
+    n_b = validos.sum(axis=0)
+    vacios = len(df) - n_b
+    con_datos = n_b > 0
+
+    # Mínimo, máximo y conteos sobre los valores con NaN: fmin/fmax ignoran los vacíos y
+    # las comparaciones con NaN son falsas
+    acum["minimo"][presentes] = np.fmin(acum["minimo"][presentes], np.fmin.reduce(valores, axis=0))
+    acum["maximo"][presentes] = np.fmax(acum["maximo"][presentes], np.fmax.reduce(valores, axis=0))
+    acum["positivos"][presentes] += np.count_nonzero(valores > 0, axis=0)
+    acum["bajo_umbral"][presentes] += np.count_nonzero(valores < acum["umbral"], axis=0)
+
+    # Desde aquí los vacíos valen 0; su aporte se descuenta con `vacios`
+    if vacios.any():
+        np.copyto(valores, 0.0, where=~validos)
+
+    # Combinación de media y suma de cuadrados (Chan et al.), todas las columnas juntas.
+    # Cada vacío aporta (0 - media)² a la suma de cuadrados de su columna
+    media_b = np.divide(valores.sum(axis=0), n_b, out=np.zeros(len(presentes)), where=con_datos)
+    dif = valores - media_b
+    m2_b = np.einsum("ij,ij->j", dif, dif) - vacios * media_b ** 2
+    n_a = acum["n"][presentes]
+    n = n_a + n_b
+    delta = media_b - acum["media"][presentes]
+    peso = np.divide(n_b, n, out=np.zeros(len(presentes)), where=con_datos)
+    acum["media"][presentes] += delta * peso
+    acum["m2"][presentes] += m2_b + delta ** 2 * n_a * peso
+    acum["n"][presentes] = n
+
+    # Un solo bincount para todos los histogramas: cada columna usa su propio rango de
+    # índices. Los vacíos caen en el primer intervalo de su columna y se descuentan
+    bins = acum["bins"]
+    escala = valores * bins
+    np.clip(escala, 0, bins - 1, out=escala)
+    indices = escala.astype(np.int64)
+    indices += np.arange(len(presentes)) * bins
+    histograma = np.bincount(indices.ravel(order="F"), minlength=len(presentes) * bins).reshape(len(presentes), bins)
+    histograma[:, 0] -= vacios
+    acum["histograma"][presentes] += histograma
+
+    # Sumas y conteos por género como productos matriciales (una fila por género)
+    if genero is not None:
+        for g in (0, 1):
+            del_genero = genero == g
+            acum["genero"][g]["suma"][presentes] += del_genero.astype(float) @ valores
+            if vacios.any():
+                acum["genero"][g]["n"][presentes] += np.count_nonzero(validos[del_genero], axis=0)
+            else:
+                acum["genero"][g]["n"][presentes] += int(del_genero.sum())
+    return acum
+
+
+def combinar(acum: dict, otro: dict) -> dict:
+    """
+    Suma al acumulador `acum` otro acumulador con las mismas columnas (por ejemplo, el de
+    un fragmento procesado en otro proceso). El resultado es el mismo que si todos los
+    estudiantes se hubieran acumulado en `acum`.
+    """
+    acum["filas"] += otro["filas"]
+    acum["mujeres"] += otro["mujeres"]
+    for clave in ("edad", "faltas"):
+        acum[clave]["suma"] += otro[clave]["suma"]
+        acum[clave]["n"] += otro[clave]["n"]
+
+    # Combinación de media y suma de cuadrados (Chan et al.), columna por columna
+    n_a, n_b = acum["n"], otro["n"]
+    n = n_a + n_b
+    con_datos = n > 0
+    delta = otro["media"] - acum["media"]
+    peso = np.divide(n_b, n, out=np.zeros(len(n)), where=con_datos)
+    acum["media"] = acum["media"] + delta * peso
+    acum["m2"] = acum["m2"] + otro["m2"] + delta ** 2 * n_a * peso
+    acum["n"] = n
+
+    acum["minimo"] = np.minimum(acum["minimo"], otro["minimo"])
+    acum["maximo"] = np.maximum(acum["maximo"], otro["maximo"])
+    acum["positivos"] = acum["positivos"] + otro["positivos"]
+    acum["bajo_umbral"] = acum["bajo_umbral"] + otro["bajo_umbral"]
+    acum["histograma"] = acum["histograma"] + otro["histograma"]
+    for g in (0, 1):
+        acum["genero"][g]["filas"] += otro["genero"][g]["filas"]
+        acum["genero"][g]["suma"] = acum["genero"][g]["suma"] + otro["genero"][g]["suma"]
+        acum["genero"][g]["n"] = acum["genero"][g]["n"] + otro["genero"][g]["n"]
+    return acum
+
+
+def mediana_histograma(histograma: np.ndarray, n: int) -> float:
+    """
+    Mediana aproximada: centro del intervalo que contiene el dato central
+    (promedio de los dos intervalos centrales si `n` es par). Error máximo de 1 / (2 · bins).
+    """
+    if n == 0:
+        return np.nan
+    acumulado = np.cumsum(histograma)
+    posiciones = np.searchsorted(acumulado, [(n + 1) // 2, n // 2 + 1])
+    return float((posiciones.mean() + 0.5) / len(histograma))
+
+
+def histograma_agrupado(acum: dict, intervalos: int = BINS_GRAFICO) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Histogramas de las columnas de predicción reagrupados en `intervalos` barras iguales de [0, 1]
+    a partir del histograma fino del acumulador, sin volver a recorrer los datos.
+    Devuelve (bordes, conteos): `intervalos` + 1 bordes y una fila de conteos por columna.
+    """
+    inicios = np.linspace(0, acum["bins"], intervalos + 1)[:-1].astype(np.int64)
+    conteos = np.add.reduceat(acum["histograma"], inicios, axis=1)
+    bordes = np.append(inicios / acum["bins"], 1.0)
+    return bordes, conteos
+
+
+def metricas_generales(acum: dict) -> dict:
+    """Total de estudiantes, mujeres, edad promedio y faltas promedio"""
+    return {
+        "total": acum["filas"],
+        "mujeres": acum["mujeres"],
+        "edad_promedio": acum["edad"]["suma"] / acum["edad"]["n"] if acum["edad"]["n"] else np.nan,
+        "faltas_promedio": acum["faltas"]["suma"] / acum["faltas"]["n"] if acum["faltas"]["n"] else np.nan,
+    }
+
+
+def tabla_estadisticas(acum: dict) -> pd.DataFrame:
+    """Tabla de estadísticas descriptivas por materia (Promedio, Mediana, Desv. Estándar, ...)"""
+    stats_data = []
+    for j, materia in enumerate(acum["columnas"]):
+        n = acum["n"][j]
+        stats_data.append({
+            'Materia': materia.replace('pred_', '').upper(),
+            'Promedio': acum["media"][j] if n else np.nan,
+            'Mediana': mediana_histograma(acum["histograma"][j], n),
+            'Desv. Estándar': np.sqrt(acum["m2"][j] / (n - 1)) if n > 1 else np.nan,
+            'Mínimo': acum["minimo"][j] if n else np.nan,
+            'Máximo': acum["maximo"][j] if n else np.nan,
+            'Positivos (%)': acum["positivos"][j] / n * 100 if n else np.nan,
+        })
+    return pd.DataFrame(stats_data)
+
+
+def tabla_genero(acum: dict) -> pd.DataFrame:
+    """Promedio de cada predicción por género (solo géneros con estudiantes)"""
+    genero_data = []
+    for j, materia in enumerate(acum["columnas"]):
+        for g in (0, 1):
+            grupo = acum["genero"][g]
+            if grupo["filas"] > 0:
+                promedio = grupo["suma"][j] / grupo["n"][j] if grupo["n"][j] else np.nan
+                genero_data.append({
+                    'Materia': materia.replace('pred_', '').upper(),
+                    'Género': 'Mujer' if g == 1 else 'Hombre',
+                    'Promedio': round(promedio, 2),
+                })
+    return pd.DataFrame(genero_data)
+
+
+def tabla_riesgo(acum: dict) -> pd.DataFrame:
+    """Estudiantes con predicción por debajo del umbral, por materia"""
+    materias_bajo = []
+    for j, materia in enumerate(acum["columnas"]):
+        bajo_rendimiento = int(acum["bajo_umbral"][j])
+        porcentaje = bajo_rendimiento / acum["filas"] * 100 if acum["filas"] else np.nan
+        materias_bajo.append({
+            'Materia': materia.replace('pred_', '').upper(),
+            'Estudiantes en Riesgo': bajo_rendimiento,
+            'Porcentaje': round(porcentaje, 2),
+        })
+    return pd.DataFrame(materias_bajo)
+
+
+def estadisticas_cohorte(df: pd.DataFrame, columnas: list[str] = COLUMNAS_PRED, umbral: float = UMBRAL_RIESGO) -> dict:
+    """
+    Todas las estadísticas de una cohorte ya calculada, en una sola pasada por los datos:
+    métricas generales y tablas de estadísticas, género y riesgo.
+    """
+    acum = acumular(nuevo_acumulador(columnas, umbral), df)
+    return {
+        "metricas": metricas_generales(acum),
+        "estadisticas": tabla_estadisticas(acum),
+        "genero": tabla_genero(acum),
+        "riesgo": tabla_riesgo(acum),
+    }
@@ -0,0 +1,151 @@
+"""
+Exportación de resultados: Excel (xlsxwriter en modo de memoria constante), CSV y Parquet,
+con compresión gzip o zip opcional.
+"""
+from io import BytesIO
+from typing import Iterable
+import gzip
+import zipfile
+
+import pandas as pd
+import xlsxwriter
+
+from .cache import huella_datos
+
+# Filas que se convierten a valores de Python de una vez al escribir Excel
+FILAS_POR_TANDA = 10_000
+
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+MAX_FILAS_EXCEL = 1_048_576
+
+FORMATOS_EXPORTACION = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COMPRESIONES = {
+    "gzip": ("gz", "application/gzip"),
+    "zip": ("zip", "application/zip"),
+}
+
+
+def nuevo_libro(destino) -> xlsxwriter.Workbook:
+    """
+    Libro de xlsxwriter en modo de memoria constante: cada fila se escribe a disco en cuanto
+    se completa, así que las filas deben escribirse en orden.
+    """
+    return xlsxwriter.Workbook(destino, {"constant_memory": True, "in_memory": False})
+
+
+def escribir_hoja(libro: xlsxwriter.Workbook, nombre: str, bloques: Iterable[pd.DataFrame]) -> int:
+    """
+    Escribe en una hoja nueva los bloques (DataFrames con las mismas columnas), fila por fila.
+    Los valores vacíos (NaN) quedan como celdas vacías. Devuelve el número de filas de datos.
+    """
+    hoja = libro.add_worksheet(nombre)
+    negrita = libro.add_format({"bold": True})
+    fila = 0
+    for df in bloques:
+        if fila == 0:
+            hoja.write_row(0, 0, [str(col) for col in df.columns], negrita)
+            fila = 1
+        if fila + len(df) > MAX_FILAS_EXCEL:
+            raise ValueError(
+                f"La hoja '{nombre}' supera el límite de {MAX_FILAS_EXCEL:,} filas de Excel; exporte en CSV o Parquet"
+            )
+        for inicio in range(0, len(df), FILAS_POR_TANDA):
+            tanda = df.iloc[inicio:inicio + FILAS_POR_TANDA].astype(object)
+            for valores in tanda.where(tanda.notna(), None).to_numpy().tolist():
+                hoja.write_row(fila, 0, valores)
+                fila += 1
+    if fila == 0:
+        return 0
+    return fila - 1
+
+
+def exportar_excel(hojas: dict[str, pd.DataFrame]) -> bytes:
+    """Un solo libro de Excel con una hoja por DataFrame, en el orden de `hojas`"""
+    salida = BytesIO()
+    libro = nuevo_libro(salida)
+    try:
+        for nombre, df in hojas.items():
+            escribir_hoja(libro, nombre, [df])
+    finally:
+        libro.close()
+    return salida.getvalue()
+
+
+def exportar_csv(df: pd.DataFrame) -> bytes:
+    """CSV en UTF-8 con BOM, para que Excel muestre bien las tildes"""
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def exportar_parquet(df: pd.DataFrame) -> bytes:
+    salida = BytesIO()
+    df.to_parquet(salida, index=False)
+    return salida.getvalue()
+
+
+def tipo_exportacion(hojas: dict[str, pd.DataFrame], formato: str = "xlsx", compresion: str | None = None) -> tuple[str, str]:
+    """
+    (extensión, tipo MIME) del archivo que produce `exportar` con los mismos argumentos,
+    sin serializar nada: sirve para ofrecer la descarga antes de generarla.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: '{formato}' (use {', '.join(FORMATOS_EXPORTACION)})")
+    if compresion is not None and compresion not in COMPRESIONES:
+        raise ValueError(f"Compresión no soportada: '{compresion}' (use {', '.join(COMPRESIONES)})")
+    if (formato != "xlsx" and len(hojas) > 1) or compresion == "zip":
+        return "zip", COMPRESIONES["zip"][1]
+    if compresion == "gzip":
+        return f"{formato}.gz", COMPRESIONES["gzip"][1]
+    return formato, FORMATOS_EXPORTACION[formato]
+
+
+def huella_hojas(hojas: dict[str, pd.DataFrame]) -> str:
+    """Hash del contenido de las tablas (nombres de hoja, columnas, tipos y valores), sin formato ni compresión"""
+    return huella_datos(*[parte for nombre, df in hojas.items() for parte in (nombre, df)])
+
+
+def huella_exportacion(
+    hojas: dict[str, pd.DataFrame],
+    formato: str = "xlsx",
+    compresion: str | None = None,
+    contenido: str | None = None,
+) -> str:
+    """
+    Hash del contenido de las tablas junto con el formato y la compresión: dos exportaciones
+    con la misma huella producen el mismo archivo. `contenido` es huella_hojas(hojas) ya
+    calculada (así no se recorren de nuevo las tablas, que pueden ser grandes).
+    """
+    return huella_datos(formato, compresion, contenido or huella_hojas(hojas))
+
+
+def exportar(hojas: dict[str, pd.DataFrame], formato: str = "xlsx", compresion: str | None = None) -> tuple[bytes, str, str]:
+    """
+    Exporta las tablas de `hojas` y devuelve (contenido, extensión, tipo MIME):
+        xlsx        -> un libro con una hoja por tabla
+        csv/parquet -> un archivo si hay una sola tabla; si hay varias, un .zip con un archivo por tabla
+    `compresion` ("gzip" o "zip") comprime el resultado; un .zip nunca se vuelve a comprimir.
+    """
+    extension, mime = tipo_exportacion(hojas, formato, compresion)
+
+    if formato == "xlsx":
+        archivos = {f"resultados.{formato}": exportar_excel(hojas)}
+    else:
+        convertir = exportar_csv if formato == "csv" else exportar_parquet
+        archivos = {f"{nombre}.{formato}": convertir(df) for nombre, df in hojas.items()}
+
+    if extension == "zip":
+        salida = BytesIO()
+        metodo = zipfile.ZIP_STORED if formato in ("xlsx", "parquet") else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(salida, "w", compression=metodo) as archivo_zip:
+            for nombre, contenido in archivos.items():
+                archivo_zip.writestr(nombre, contenido)
+        return salida.getvalue(), extension, mime
+
+    contenido = next(iter(archivos.values()))
+    if compresion == "gzip":
+        return gzip.compress(contenido, compresslevel=6), extension, mime
+    return contenido, extension, mime
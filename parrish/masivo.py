@@ -0,0 +1,62 @@
+"""
+Análisis masivo por bloques: cada bloque se valida, se calcula y se suma a las
+estadísticas en cuanto se lee, sin esperar al archivo completo.
+"""
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .datos import TAMANO_BLOQUE, columnas_faltantes
+from .estadisticas import acumular
+from .prediccion import predecir_probit_lote
+from .progreso import avanzar, terminar
+
+
+def procesar_por_bloques(bloques: Iterable[pd.DataFrame], compilado: dict, acumulador: dict) -> Iterator[pd.DataFrame]:
+    """
+    Recorre `bloques` (ver leer_estudiantes_por_bloques) y entrega cada bloque con sus
+    columnas pred_* ya calculadas, después de sumarlo a `acumulador` (ver nuevo_acumulador).
+    Lanza ValueError si a un bloque le faltan columnas requeridas.
+    """
+    for df in bloques:
+        faltantes = columnas_faltantes(df)
+        if faltantes:
+            raise ValueError(f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+        predecir_probit_lote(compilado, df)
+        acumular(acumulador, df)
+        yield df
+
+
+def procesar_en_memoria(
+    df: pd.DataFrame,
+    compilado: dict,
+    acumulador: dict,
+    progreso: dict | None = None,
+    tamano_bloque: int = TAMANO_BLOQUE,
+) -> pd.DataFrame:
+    """
+    Calcula las columnas pred_* de un DataFrame ya leído, por bloques de `tamano_bloque` filas
+    (sumando cada uno a `acumulador` y avanzando `progreso`), y devuelve `df` con esas columnas.
+    Las predicciones se escriben en un arreglo reservado de antemano y el resultado comparte
+    las columnas de `df` (copy-on-write): no se copia el archivo completo ni se modifica `df`.
+    Lanza ValueError si faltan columnas requeridas.
+    """
+    faltantes = columnas_faltantes(df)
+    if faltantes:
+        raise ValueError(f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+    columnas = [f"pred_{materia}" for materia in compilado["materias"]]
+    # Una fila por materia: cada columna de predicciones queda contigua y pandas la usa sin copiarla
+    salida = np.empty((len(columnas), len(df)))
+    for inicio in range(0, len(df), tamano_bloque):
+        bloque = df.iloc[inicio:inicio + tamano_bloque]
+        predecir_probit_lote(compilado, bloque)
+        acumular(acumulador, bloque)
+        for j, col in enumerate(columnas):
+            salida[j, inicio:inicio + len(bloque)] = bloque[col].to_numpy(dtype=float)
+        avanzar(progreso, len(bloque))
+    terminar(progreso)
+    resultado = df.copy(deep=False)
+    for j, col in enumerate(columnas):
+        resultado[col] = pd.Series(salida[j], index=df.index, copy=False)
+    return resultado
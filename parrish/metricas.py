@@ -0,0 +1,164 @@
+"""
+Métricas en formato de texto de Prometheus, servidas por un listener HTTP pequeño dentro
+del mismo proceso (GET /metrics), para graficar el rendimiento y detectar regresiones:
+
+    PARRISH_METRICAS_PUERTO=9108 streamlit run app.py
+    curl localhost:9108/metrics
+
+Contadores e histogramas viven en memoria en METRICAS (un registro por proceso, como el
+logging). Las cachés registradas (ver registrar_cache) se leen en cada consulta.
+"""
+from typing import TYPE_CHECKING
+import threading
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Límites superiores de los histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BUCKETS_BYTES = (1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def nuevas_metricas() -> dict:
+    """
+    Registro vacío de métricas:
+        familias  -> nombre -> {"tipo", "ayuda", "buckets", "series": etiquetas -> valor}
+        cachés    -> nombre -> caché de parrish.cache (se leen al generar el texto)
+    """
+    return {"familias": {}, "caches": {}, "lock": threading.Lock()}
+
+
+def declarar(metricas: dict, nombre: str, tipo: str, ayuda: str, buckets: tuple | None = None) -> None:
+    """Declara la familia `nombre` ("counter" o "histogram"); declararla de nuevo no la reinicia"""
+    with metricas["lock"]:
+        metricas["familias"].setdefault(nombre, {"tipo": tipo, "ayuda": ayuda, "buckets": buckets, "series": {}})
+
+
+def incrementar(nombre: str, valor: float = 1, metricas: dict | None = None, **etiquetas) -> None:
+    """Suma `valor` al contador `nombre` con esas etiquetas"""
+    metricas = METRICAS if metricas is None else metricas
+    clave = tuple(sorted(etiquetas.items()))
+    with metricas["lock"]:
+        series = metricas["familias"][nombre]["series"]
+        series[clave] = series.get(clave, 0) + valor
+
+
+def observar(nombre: str, valor: float, metricas: dict | None = None, **etiquetas) -> None:
+    """Registra `valor` en el histograma `nombre` con esas etiquetas"""
+    metricas = METRICAS if metricas is None else metricas
+    clave = tuple(sorted(etiquetas.items()))
+    with metricas["lock"]:
+        familia = metricas["familias"][nombre]
+        serie = familia["series"].get(clave)
+        if serie is None:
+            serie = familia["series"][clave] = {"buckets": [0] * len(familia["buckets"]), "suma": 0.0, "cuenta": 0}
+        for i, limite in enumerate(familia["buckets"]):
+            if valor <= limite:
+                serie["buckets"][i] += 1
+        serie["suma"] += valor
+        serie["cuenta"] += 1
+
+
+def registrar_cache(nombre: str, cache: dict, metricas: dict | None = None) -> None:
+    """Publica los aciertos, fallos, entradas y bytes de `cache` con la etiqueta cache=`nombre`"""
+    metricas = METRICAS if metricas is None else metricas
+    with metricas["lock"]:
+        metricas["caches"][nombre] = cache
+
+
+def escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def etiquetas_texto(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in etiquetas) + "}"
+
+
+def numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def texto_prometheus(metricas: dict | None = None) -> str:
+    """Todas las métricas en el formato de exposición de texto de Prometheus (0.0.4)"""
+    metricas = METRICAS if metricas is None else metricas
+    lineas = []
+    with metricas["lock"]:
+        for nombre, familia in metricas["familias"].items():
+            lineas.append(f"# HELP {nombre} {familia['ayuda']}")
+            lineas.append(f"# TYPE {nombre} {familia['tipo']}")
+            for clave, serie in familia["series"].items():
+                if familia["tipo"] == "counter":
+                    lineas.append(f"{nombre}{etiquetas_texto(clave)} {numero(serie)}")
+                    continue
+                for limite, cuenta in zip(familia["buckets"], serie["buckets"]):
+                    lineas.append(f"{nombre}_bucket{etiquetas_texto(clave + (('le', numero(limite)),))} {cuenta}")
+                lineas.append(f"{nombre}_bucket{etiquetas_texto(clave + (('le', '+Inf'),))} {serie['cuenta']}")
+                lineas.append(f"{nombre}_sum{etiquetas_texto(clave)} {numero(serie['suma'])}")
+                lineas.append(f"{nombre}_count{etiquetas_texto(clave)} {serie['cuenta']}")
+        caches = dict(metricas["caches"])
+
+    # Cachés: contadores de consultas y ocupación actual (tasa de aciertos = aciertos / (aciertos + fallos))
+    estados = {}
+    for nombre, cache in caches.items():
+        with cache["lock"]:
+            estados[nombre] = (cache["aciertos"], cache["fallos"], len(cache["entradas"]), cache["bytes"], cache["limite"])
+    for i, (metrica, tipo, ayuda) in enumerate((
+        ("parrish_cache_aciertos_total", "counter", "Consultas a la caché que encontraron el valor"),
+        ("parrish_cache_fallos_total", "counter", "Consultas a la caché que no encontraron el valor"),
+        ("parrish_cache_entradas", "gauge", "Entradas guardadas en la caché"),
+        ("parrish_cache_bytes", "gauge", "Bytes aproximados que ocupa la caché"),
+        ("parrish_cache_limite_bytes", "gauge", "Presupuesto de bytes de la caché"),
+    )):
+        if not estados:
+            break
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} {tipo}")
+        for nombre, valores in estados.items():
+            lineas.append(f"{metrica}{etiquetas_texto((('cache', nombre),))} {valores[i]}")
+    return "\n".join(lineas) + "\n"
+
+
+def iniciar_servidor_metricas(puerto: int, host: str = "0.0.0.0", metricas: dict | None = None) -> "ThreadingHTTPServer":
+    """
+    Sirve texto_prometheus en http://host:puerto/metrics desde un hilo en segundo plano
+    (daemon: termina con el proceso). Lanza OSError si el puerto está ocupado.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            cuerpo = texto_prometheus(metricas).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", TIPO_CONTENIDO)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            # Las consultas periódicas de Prometheus no van a la consola
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="parrish-metricas", daemon=True).start()
+    return servidor
+
+
+# Registro del proceso con las métricas de la aplicación
+METRICAS = nuevas_metricas()
+declarar(METRICAS, "parrish_predicciones_servidas_total", "counter",
+         "Resultados de predicción entregados (envíos de la página individual y de la API, clics en procesar "
+         "un análisis masivo y trabajos en segundo plano terminados; volver a mostrar resultados no cuenta)")
+declarar(METRICAS, "parrish_filas_calculadas_total", "counter", "Estudiantes a los que se les calcularon predicciones")
+declarar(METRICAS, "parrish_archivo_bytes", "histogram", "Tamaño de los archivos subidos al análisis masivo", BUCKETS_BYTES)
+declarar(METRICAS, "parrish_etapa_segundos", "histogram", "Duración de cada etapa (ver parrish.tiempos)", BUCKETS_SEGUNDOS)
+declarar(METRICAS, "parrish_admision_espera_segundos", "histogram",
+         "Espera en la cola de admisión de los trabajos pesados (ver parrish.admision)", BUCKETS_SEGUNDOS)
+declarar(METRICAS, "parrish_carga_modelos_segundos", "histogram", "Duración de la carga y compilación de los modelos", BUCKETS_SEGUNDOS)
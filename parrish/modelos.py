@@ -0,0 +1,237 @@
+"""
+Carga de los coeficientes (Excel o artefacto JSON compilado) y registro de modelos
+compartido por el proceso, con recarga en caliente cuando cambia el Excel.
+"""
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from .metricas import observar
+from .prediccion import compilar_modelos
+
+# 📂 Ruta por defecto del archivo de coeficientes
+MODELOS_XLSX = Path(__file__).resolve().parent.parent / "Coeficientes_modelos.xlsx"
+
+# 📦 Versión del formato del artefacto compilado (Coeficientes_modelos.json, junto al Excel)
+FORMATO_ARTEFACTO = 1
+
+# Materias y módulos que se precompilan en el registro de modelos
+MATERIAS = ["lectura", "math", "soc", "cnat", "ingles", "global"]
+MODULOS = (14, 24)
+
+logger = logging.getLogger(__name__)
+
+
+def leer_coeficientes(fuente) -> dict[str, pd.Series]:
+    """
+    Lee el Excel de coeficientes (ruta o bytes) y devuelve un diccionario:
+        clave   -> nombre de la hoja
+        valor   -> Series con coeficientes (index = variable, value = coef)
+    Lanza la excepción original si el archivo no se puede leer.
+    """
+    xl = pd.ExcelFile(fuente)
+    modelos: dict[str, pd.Series] = {}
+    for sheet in xl.sheet_names:
+        df = xl.parse(sheet)
+        # Los coeficientes están en la fila 0
+        coefs = df.iloc[0]
+        # Convertir todos los valores a numéricos, forzando errores a NaN
+        coefs = pd.to_numeric(coefs, errors='coerce').fillna(0.0)
+        modelos[sheet] = coefs
+    return modelos
+
+
+def cargar_modelos(path: Path) -> dict[str, pd.Series]:
+    """
+    Coeficientes del Excel en `path` (como leer_coeficientes), tomados del artefacto compilado
+    si está al día (ver leer_modelos). Registra el error en el log y devuelve un diccionario
+    vacío si falla la lectura.
+    """
+    try:
+        contenido = Path(path).read_bytes()
+        modelos, _ = leer_modelos(Path(path), contenido, hashlib.sha256(contenido).hexdigest())
+        return modelos
+    except Exception as e:
+        logger.error("Error al cargar modelos: %s", e)
+        return {}
+
+
+def checksum_hojas(hojas: dict) -> str:
+    """SHA-256 de la representación canónica (JSON ordenado) de las hojas del artefacto"""
+    return hashlib.sha256(json.dumps(hojas, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def guardar_artefacto(modelos: dict[str, pd.Series], path: Path, origen_sha256: str) -> None:
+    """
+    Guarda los coeficientes ya convertidos en un artefacto JSON compacto:
+        formato       -> versión del formato del artefacto
+        origen_sha256 -> SHA-256 del Excel del que se compiló
+        hojas         -> {hoja: {"variables": [...], "coeficientes": [...]}} en el orden del Excel
+        checksum      -> checksum_hojas(hojas)
+    Se escribe en un archivo temporal y se reemplaza de forma atómica.
+    """
+    hojas = {
+        hoja: {"variables": [str(var) for var in coefs.index], "coeficientes": [float(c) for c in coefs]}
+        for hoja, coefs in modelos.items()
+    }
+    artefacto = {
+        "formato": FORMATO_ARTEFACTO,
+        "origen_sha256": origen_sha256,
+        "hojas": hojas,
+        "checksum": checksum_hojas(hojas),
+    }
+    temporal = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporal.write_text(json.dumps(artefacto), encoding="utf-8")
+    os.replace(temporal, path)
+
+
+def cargar_artefacto(path: Path, origen_sha256: str) -> dict[str, pd.Series] | None:
+    """
+    Carga los coeficientes desde el artefacto JSON (ver guardar_artefacto).
+    Devuelve None si el artefacto no existe, está dañado o fue compilado
+    a partir de otra versión del Excel.
+    """
+    try:
+        artefacto = json.loads(path.read_text(encoding="utf-8"))
+        if artefacto.get("formato") != FORMATO_ARTEFACTO or artefacto.get("origen_sha256") != origen_sha256:
+            return None
+        hojas = artefacto["hojas"]
+        if checksum_hojas(hojas) != artefacto.get("checksum"):
+            return None
+        return {
+            hoja: pd.Series(datos["coeficientes"], index=datos["variables"], name=0, dtype=float)
+            for hoja, datos in hojas.items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def leer_modelos(path: Path, contenido: bytes, origen_sha256: str) -> tuple[dict[str, pd.Series], str]:
+    """
+    Coeficientes del Excel en `path` (`contenido` son sus bytes y `origen_sha256` su hash):
+    desde el artefacto JSON junto al Excel si existe y corresponde a esa versión; si no, se
+    leen del Excel y se vuelve a compilar el artefacto. Devuelve (modelos, fuente), con
+    fuente "artefacto" o "excel". Lanza ValueError si el Excel no tiene hojas.
+    """
+    artefacto = path.with_suffix(".json")
+    modelos = cargar_artefacto(artefacto, origen_sha256)
+    if modelos is not None:
+        return modelos, "artefacto"
+    modelos = leer_coeficientes(BytesIO(contenido))
+    if not modelos:
+        raise ValueError(f"El archivo '{path.name}' no contiene hojas de coeficientes")
+    try:
+        guardar_artefacto(modelos, artefacto, origen_sha256)
+    except OSError:
+        # Sin permisos de escritura se sigue trabajando desde el Excel
+        pass
+    return modelos, "excel"
+
+
+def leer_firma(path: Path) -> tuple[int, int]:
+    """Firma barata del archivo (mtime en ns, tamaño) para detectar cambios"""
+    estado = path.stat()
+    return (estado.st_mtime_ns, estado.st_size)
+
+
+def construir_registro(path: Path, version: int) -> dict:
+    """
+    Lee y compila el Excel de coeficientes en un registro inmutable:
+        version    -> número de versión dentro del proceso (1, 2, ...)
+        hash       -> SHA-256 del contenido del Excel
+        firma      -> firma del archivo al momento de leerlo (ver leer_firma)
+        cargado    -> fecha y hora de carga
+        fuente     -> "artefacto" si se usó el JSON compilado, "excel" si hubo que leer el Excel
+        modelos    -> Series de coeficientes por hoja (como leer_coeficientes)
+        compilados -> modelo compilado por módulo (como compilar_modelos)
+    """
+    inicio = time.perf_counter()
+    # La firma se toma antes de leer: si el archivo cambia durante la lectura
+    # la próxima verificación detecta el cambio y vuelve a cargar
+    firma = leer_firma(path)
+    contenido = path.read_bytes()
+    origen_sha256 = hashlib.sha256(contenido).hexdigest()
+    modelos, fuente = leer_modelos(path, contenido, origen_sha256)
+
+    compilados = {modulo: compilar_modelos(modelos, modulo, MATERIAS) for modulo in MODULOS}
+    observar("parrish_carga_modelos_segundos", time.perf_counter() - inicio, fuente=fuente)
+    return {
+        "version": version,
+        "hash": origen_sha256,
+        "firma": firma,
+        "cargado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "fuente": fuente,
+        "modelos": modelos,
+        "compilados": compilados,
+    }
+
+
+def crear_gestor(path: Path) -> dict:
+    """
+    Gestor de modelos para todo el proceso.
+    gestor["registro"] siempre apunta a un registro completo (ver construir_registro);
+    una recarga solo reemplaza esa referencia, de modo que quien ya tomó el
+    registro anterior termina sus cálculos con él.
+    """
+    return {
+        "path": path,
+        "registro": construir_registro(path, version=1),
+        "lock": threading.Lock(),
+        "recargando": False,
+        "firma_fallida": None,
+        "error": None,
+    }
+
+
+def recargar_registro(gestor: dict, firma: tuple[int, int]) -> None:
+    """
+    Compila la nueva versión del Excel y la publica con un único intercambio de referencia.
+    `firma` es la que disparó la recarga: si falla, esa firma queda como fallida.
+    """
+    actual = gestor["registro"]
+    try:
+        nuevo = construir_registro(gestor["path"], version=actual["version"] + 1)
+        if nuevo["hash"] == actual["hash"]:
+            # Solo cambió la fecha del archivo: se conserva la versión activa
+            nuevo = {**actual, "firma": nuevo["firma"]}
+        with gestor["lock"]:
+            gestor["registro"] = nuevo
+            gestor["error"] = None
+    except Exception as e:
+        # Se mantiene la versión anterior; se reintenta cuando el archivo vuelva a cambiar. Se
+        # guarda la firma que disparó la recarga y no una leída ahora: si el archivo cambió otra
+        # vez mientras tanto, esa versión nueva todavía no se intentó y debe recargarse
+        with gestor["lock"]:
+            gestor["firma_fallida"] = firma
+            gestor["error"] = str(e)
+    finally:
+        with gestor["lock"]:
+            gestor["recargando"] = False
+
+
+def registro_vigente(gestor: dict) -> dict:
+    """
+    Devuelve el registro activo. Si el Excel cambió en disco, lanza su
+    compilación en segundo plano; el registro nuevo se usa desde el siguiente rerun.
+    """
+    try:
+        firma = leer_firma(gestor["path"])
+    except OSError:
+        return gestor["registro"]
+
+    with gestor["lock"]:
+        registro = gestor["registro"]
+        if gestor["recargando"] or firma in (registro["firma"], gestor["firma_fallida"]):
+            return registro
+        gestor["recargando"] = True
+
+    threading.Thread(target=recargar_registro, args=(gestor, firma), daemon=True).start()
+    return registro
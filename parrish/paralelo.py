@@ -0,0 +1,196 @@
+"""
+Cálculo del análisis masivo repartido en fragmentos entre varios procesos.
+
+La matriz de diseño, los coeficientes y la salida viven en memoria compartida
+(multiprocessing.shared_memory): cada tarea solo envía los nombres de los bloques
+y su rango de filas, y cada proceso escribe sus predicciones en su propio rango
+de la salida, así que el resultado queda en el orden original.
+"""
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from .datos import columnas_faltantes
+from .estadisticas import acumular, combinar, nuevo_acumulador
+from .prediccion import construir_matriz
+from .progreso import avanzar, terminar
+
+# Columnas que las estadísticas necesitan además de las predicciones
+COLUMNAS_AUXILIARES = ['estu_mujer', 'edad_grado', 'total_faltas_disc']
+
+# Fragmentos por proceso: más de uno reparte mejor la carga si algún proceso se atrasa
+FRAGMENTOS_POR_TRABAJADOR = 4
+
+# Un pool por número de procesos, reutilizado entre llamadas (arrancar procesos es lo más caro)
+EJECUTORES: dict[int, ProcessPoolExecutor] = {}
+LOCK_EJECUTORES = threading.Lock()
+
+
+def trabajadores_por_defecto() -> int:
+    """Número de procesos por defecto: uno por núcleo disponible"""
+    return os.cpu_count() or 1
+
+
+def obtener_ejecutor(trabajadores: int) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por todo el proceso principal.
+    Se usa "spawn" porque Streamlit tiene hilos activos y fork no es seguro en ese caso.
+    """
+    with LOCK_EJECUTORES:
+        if trabajadores not in EJECUTORES:
+            EJECUTORES[trabajadores] = ProcessPoolExecutor(max_workers=trabajadores, mp_context=get_context("spawn"))
+        return EJECUTORES[trabajadores]
+
+
+def descartar_ejecutor(trabajadores: int, ejecutor: ProcessPoolExecutor) -> None:
+    """
+    Saca de EJECUTORES un pool roto (por ejemplo, porque el sistema mató un proceso por falta
+    de memoria), para que la siguiente llamada a obtener_ejecutor cree uno nuevo.
+    """
+    with LOCK_EJECUTORES:
+        if EJECUTORES.get(trabajadores) is ejecutor:
+            del EJECUTORES[trabajadores]
+    ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+def enviar_fragmentos(trabajadores: int, descriptores: dict, materias: list[str], rangos: list[tuple]) -> tuple:
+    """
+    Envía un fragmento por rango al pool compartido y devuelve (pool, futuros). Si el pool
+    ya estaba roto, lo reemplaza por uno nuevo y vuelve a enviar (todavía no se calculó nada).
+    """
+    for intento in range(2):
+        ejecutor = obtener_ejecutor(trabajadores)
+        try:
+            return ejecutor, [
+                ejecutor.submit(procesar_fragmento, descriptores, materias, inicio, fin)
+                for inicio, fin in rangos
+            ]
+        except BrokenProcessPool:
+            descartar_ejecutor(trabajadores, ejecutor)
+            if intento:
+                raise
+
+
+def compartir(arreglo: np.ndarray) -> tuple[SharedMemory, tuple]:
+    """Copia `arreglo` a un bloque de memoria compartida y devuelve (bloque, descriptor)"""
+    memoria = SharedMemory(create=True, size=max(arreglo.nbytes, 1))
+    vista = np.ndarray(arreglo.shape, dtype=arreglo.dtype, buffer=memoria.buf)
+    vista[...] = arreglo
+    del vista
+    return memoria, (memoria.name, arreglo.shape, arreglo.dtype.str)
+
+
+def adjuntar(descriptor: tuple) -> tuple[SharedMemory, np.ndarray]:
+    """Abre un bloque creado con compartir y devuelve (bloque, arreglo sobre el bloque)"""
+    nombre, forma, dtype = descriptor
+    memoria = SharedMemory(name=nombre)
+    return memoria, np.ndarray(forma, dtype=np.dtype(dtype), buffer=memoria.buf)
+
+
+def calcular_fragmento(vistas: dict, materias: list[str], inicio: int, fin: int) -> dict:
+    """Calcula las filas [inicio, fin), escribe sus predicciones en la salida y devuelve su acumulador"""
+    probabilidades = ndtr(vistas["X"][inicio:fin] @ vistas["coeficientes"] + vistas["constantes"])
+    probabilidades[:, ~vistas["disponibles"]] = np.nan
+    vistas["salida"][inicio:fin] = probabilidades
+
+    auxiliares = vistas["auxiliares"][inicio:fin]
+    df = pd.DataFrame({f"pred_{materia}": probabilidades[:, j] for j, materia in enumerate(materias)})
+    for j, col in enumerate(COLUMNAS_AUXILIARES):
+        df[col] = auxiliares[:, j]
+    return acumular(nuevo_acumulador(), df)
+
+
+def procesar_fragmento(descriptores: dict, materias: list[str], inicio: int, fin: int) -> dict:
+    """Tarea de un proceso del pool: abre la memoria compartida, calcula su fragmento y la suelta"""
+    memorias = []
+    vistas = {}
+    for clave, descriptor in descriptores.items():
+        memoria, vistas[clave] = adjuntar(descriptor)
+        memorias.append(memoria)
+    try:
+        return calcular_fragmento(vistas, materias, inicio, fin)
+    finally:
+        # Las vistas deben liberarse antes de cerrar los bloques
+        vistas.clear()
+        for memoria in memorias:
+            try:
+                memoria.close()
+            except BufferError:
+                # Alguna vista sigue viva (por ejemplo, en el traceback de un error)
+                pass
+
+
+def procesar_en_paralelo(
+    df: pd.DataFrame, compilado: dict, trabajadores: int | None = None, progreso: dict | None = None
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Calcula las columnas pred_* de `df` repartiendo las filas en fragmentos entre
+    `trabajadores` procesos (por defecto, uno por núcleo) y devuelve (df, acumulador),
+    con el mismo resultado que procesar_por_bloques. Con un solo trabajador calcula en este proceso.
+    `progreso` (ver parrish.progreso) avanza a medida que se completa cada fragmento.
+    """
+    faltantes = columnas_faltantes(df)
+    if faltantes:
+        raise ValueError(f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+
+    trabajadores = max(1, trabajadores or trabajadores_por_defecto())
+    materias = compilado["materias"]
+    n = len(df)
+    arreglos = {
+        "coeficientes": np.ascontiguousarray(compilado["coeficientes"]),
+        "constantes": np.ascontiguousarray(compilado["constantes"]),
+        "disponibles": np.ascontiguousarray(compilado["disponibles"]),
+        "X": construir_matriz(df, compilado["variables"]),
+        "auxiliares": np.column_stack(
+            [pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) for col in COLUMNAS_AUXILIARES]
+        ),
+        "salida": np.empty((n, len(materias))),
+    }
+
+    tamano = max(1, math.ceil(n / (trabajadores * FRAGMENTOS_POR_TRABAJADOR)))
+    rangos = [(inicio, min(inicio + tamano, n)) for inicio in range(0, n, tamano)]
+    acumulador = nuevo_acumulador()
+
+    if trabajadores == 1:
+        for inicio, fin in rangos:
+            combinar(acumulador, calcular_fragmento(arreglos, materias, inicio, fin))
+            avanzar(progreso, fin - inicio)
+        salida = arreglos["salida"]
+    else:
+        bloques = {clave: compartir(arreglo) for clave, arreglo in arreglos.items()}
+        try:
+            descriptores = {clave: descriptor for clave, (_, descriptor) in bloques.items()}
+            ejecutor, futuros = enviar_fragmentos(trabajadores, descriptores, materias, rangos)
+            try:
+                for futuro, (inicio, fin) in zip(futuros, rangos):
+                    combinar(acumulador, futuro.result())
+                    avanzar(progreso, fin - inicio)
+            except BaseException as e:
+                if isinstance(e, BrokenProcessPool):
+                    # Un proceso murió a mitad del cálculo: el pool ya no sirve, el siguiente análisis usa uno nuevo
+                    descartar_ejecutor(trabajadores, ejecutor)
+                # Los fragmentos pendientes no deben abrir la memoria compartida después de que se libere:
+                # se cancelan los que no empezaron y se espera a los que ya están corriendo
+                for pendiente in futuros:
+                    pendiente.cancel()
+                wait(futuros)
+                raise
+            memoria_salida, (_, forma, dtype) = bloques["salida"]
+            salida = np.ndarray(forma, dtype=np.dtype(dtype), buffer=memoria_salida.buf).copy()
+        finally:
+            for memoria, _ in bloques.values():
+                memoria.close()
+                memoria.unlink()
+
+    for j, materia in enumerate(materias):
+        df[f"pred_{materia}"] = salida[:, j]
+    terminar(progreso)
+    return df, acumulador
@@ -0,0 +1,248 @@
+"""
+Cálculo de predicciones Probit a partir de los coeficientes de cada hoja.
+No depende de Streamlit ni de Plotly: lo usan la app, la línea de comandos y los procesos de lote.
+"""
+import numpy as np
+import pandas as pd
+# ndtr es la CDF normal estándar (Φ); es la misma función que usa scipy.stats.norm.cdf
+# pero sin el costo de importar scipy.stats
+from scipy.special import ndtr
+
+# Contribuciones que se muestran en el detalle del cálculo (en valor absoluto)
+UMBRAL_CONTRIBUCION = 0.001
+
+
+def predecir_con_detalles(modelo: pd.Series, datos: dict[str, float], nombre_materia: str) -> tuple[float, list]:
+    """
+    Calcula Σ (coef_i * dato_i)  +  _cons y retorna detalles del cálculo
+    """
+    detalles = []
+    suma = 0.0
+    
+    # Obtener la constante
+    try:
+        constante = float(modelo.get("_cons", 0.0))
+        suma = constante
+        detalles.append(f"Constante: {constante:.6f}")
+    except (ValueError, TypeError):
+        constante = 0.0
+        suma = 0.0
+        detalles.append("Constante: 0.0 (error al leer)")
+    
+    # Sumar cada término
+    for var, coef in modelo.items():
+        if var == "_cons":
+            continue
+        
+        try:
+            # Convertir coeficiente a float
+            coef_num = float(coef)
+            # Obtener valor de la variable y convertir a float
+            var_val = float(datos.get(var, 0))
+            contribucion = coef_num * var_val
+            suma += contribucion
+
+            if abs(contribucion) > UMBRAL_CONTRIBUCION:  # Solo mostrar contribuciones significativas
+                detalles.append(f"{var}: {coef_num:.6f} × {var_val} = {contribucion:.6f}")
+            
+        except (ValueError, TypeError) as e:
+            detalles.append(f"{var}: Error - {e}")
+            continue
+    
+    # Probit: probability = Φ(suma), where Φ is the standard normal CDF
+    probabilidad = ndtr(suma)
+    return float(probabilidad), detalles
+
+
+def valor_numerico(valor) -> float:
+    """Valor de una variable como en predecir_probit: lo que no es numérico aporta 0"""
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def explicar_probit(compilado: dict, datos: dict[str, float]) -> dict:
+    """
+    Predicción de un estudiante en todas las materias de un modelo compilado (ver
+    compilar_modelos) junto con la contribución de cada variable, en un solo paso vectorizado:
+        materias, variables -> nombres de las columnas y filas
+        valores             -> (n_variables,) dato del estudiante en cada variable (0 si falta)
+        coeficientes        -> (n_variables, n_materias) coeficientes del modelo compilado
+        contribuciones      -> (n_variables, n_materias) coeficiente × valor
+        constantes          -> (n_materias,) _cons de cada hoja
+        indices             -> (n_materias,) constante + Σ contribuciones
+        probabilidades      -> (n_materias,) Φ(indice); NaN si no existe la hoja
+    Sin texto: el detalle para mostrar se arma con contribuciones_materia solo cuando se necesita.
+    """
+    valores = np.array([valor_numerico(datos.get(var, 0)) for var in compilado["variables"]])
+    contribuciones = valores[:, None] * compilado["coeficientes"]
+    indices = compilado["constantes"] + contribuciones.sum(axis=0)
+    probabilidades = np.where(compilado["disponibles"], ndtr(indices), np.nan)
+    return {
+        "materias": compilado["materias"],
+        "variables": compilado["variables"],
+        "valores": valores,
+        "coeficientes": compilado["coeficientes"],
+        "contribuciones": contribuciones,
+        "constantes": compilado["constantes"],
+        "indices": indices,
+        "probabilidades": probabilidades,
+    }
+
+
+def contribuciones_materia(explicacion: dict, materia: str, umbral: float = UMBRAL_CONTRIBUCION) -> pd.DataFrame:
+    """
+    Contribuciones de `materia` en una explicación de explicar_probit, una fila por variable
+    (variable, coeficiente, valor, contribucion), solo las que superan `umbral` en valor absoluto
+    y en el orden de las variables del modelo.
+    """
+    j = explicacion["materias"].index(materia)
+    contribuciones = explicacion["contribuciones"][:, j]
+    significativas = np.abs(contribuciones) > umbral
+    return pd.DataFrame({
+        "variable": np.asarray(explicacion["variables"], dtype=object)[significativas],
+        "coeficiente": explicacion["coeficientes"][significativas, j],
+        "valor": explicacion["valores"][significativas],
+        "contribucion": contribuciones[significativas],
+    })
+
+
+def predecir_probit(modelo: pd.Series, datos: dict[str, float]) -> float:
+    """
+    modelos Probit
+    """
+    suma = 0.0
+    try:
+        suma = float(modelo.get("_cons", 0.0))
+    except (ValueError, TypeError):
+        suma = 0.0
+
+    for var, coef in modelo.items():
+        if var == "_cons":
+            continue
+        try:
+            coef_num = float(coef)
+            var_val = float(datos.get(var, 0))
+            suma += coef_num * var_val
+        except (ValueError, TypeError):
+            continue
+
+    # Probit: probability = Φ(suma), where Φ is the standard normal CDF
+    probabilidad = ndtr(suma)
+    return float(probabilidad)
+
+
+def predecir(modelo: pd.Series, datos: dict[str, float]) -> float:
+    """
+    Calcula Σ (coef_i * dato_i)  +  _cons
+    Si falta alguna variable, asume 0.
+    """
+    suma = 0.0
+    
+    # Obtener la constante
+    try:
+        suma = float(modelo.get("_cons", 0.0))
+    except (ValueError, TypeError):
+        suma = 0.0
+    
+    # Sumar cada término
+    for var, coef in modelo.items():
+        if var == "_cons":
+            continue
+        
+        try:
+            # Convertir coeficiente a float
+            coef_num = float(coef)
+            # Obtener valor de la variable y convertir a float
+            var_val = float(datos.get(var, 0))
+            suma += coef_num * var_val
+        except (ValueError, TypeError) as e:
+            # Si hay error, asumir que el coeficiente es 0
+            print(f"Warning: No se pudo convertir coeficiente para {var}: {coef} - Error: {e}")
+            continue
+    
+    return float(suma)
+
+
+def compilar_modelos(modelos: dict[str, pd.Series], modulo: int, materias: list[str]) -> dict:
+    """
+    Compila las hojas s11_{materia}_mod{modulo} en una sola matriz de coeficientes:
+        variables    -> unión ordenada de las variables de todas las hojas (sin _cons)
+        materias     -> materias en el orden de las columnas
+        coeficientes -> matriz (n_variables, n_materias); 0 si la hoja no usa la variable
+        constantes   -> vector (n_materias,) con el _cons de cada hoja
+        disponibles  -> vector booleano (n_materias,); False si no existe la hoja
+    """
+    variables: list[str] = []
+    for materia in materias:
+        modelo = modelos.get(f"s11_{materia}_mod{modulo}")
+        if modelo is None:
+            continue
+        for var in modelo.index:
+            if var != "_cons" and var not in variables:
+                variables.append(var)
+
+    coeficientes = np.zeros((len(variables), len(materias)))
+    constantes = np.zeros(len(materias))
+    disponibles = np.zeros(len(materias), dtype=bool)
+    posicion = {var: i for i, var in enumerate(variables)}
+
+    for j, materia in enumerate(materias):
+        modelo = modelos.get(f"s11_{materia}_mod{modulo}")
+        if modelo is None:
+            continue
+        disponibles[j] = True
+        for var, coef in modelo.items():
+            try:
+                coef_num = float(coef)
+            except (ValueError, TypeError):
+                continue
+            if var == "_cons":
+                constantes[j] = coef_num
+            else:
+                coeficientes[posicion[var], j] = coef_num
+
+    # El registro se comparte entre sesiones: las matrices son de solo lectura
+    for arreglo in (coeficientes, constantes, disponibles):
+        arreglo.setflags(write=False)
+
+    return {
+        "variables": variables,
+        "materias": list(materias),
+        "coeficientes": coeficientes,
+        "constantes": constantes,
+        "disponibles": disponibles,
+    }
+
+
+def construir_matriz(df: pd.DataFrame, variables: list[str]) -> np.ndarray:
+    """
+    Construye la matriz de diseño (n_estudiantes, n_variables) en el orden de `variables`.
+    Igual que en predecir_probit: una variable ausente o no numérica aporta 0,
+    y un valor vacío (NaN) deja la predicción en NaN.
+    """
+    X = np.zeros((len(df), len(variables)))
+    for j, var in enumerate(variables):
+        if var not in df.columns:
+            continue
+        columna = df[var]
+        numerica = pd.to_numeric(columna, errors="coerce")
+        numerica = numerica.where(numerica.notna() | columna.isna(), 0.0)
+        X[:, j] = numerica.to_numpy(dtype=float)
+    return X
+
+
+def predecir_probit_lote(compilado: dict, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula Φ(X · coeficientes + constantes) para todos los estudiantes a la vez
+    con un modelo compilado por compilar_modelos y escribe las columnas
+    pred_{materia} directamente en `df`.
+    """
+    X = construir_matriz(df, compilado["variables"])
+    probabilidades = ndtr(X @ compilado["coeficientes"] + compilado["constantes"])
+    probabilidades[:, ~compilado["disponibles"]] = np.nan
+
+    for j, materia in enumerate(compilado["materias"]):
+        df[f"pred_{materia}"] = probabilidades[:, j]
+    return df
@@ -0,0 +1,90 @@
+"""
+Reporte de progreso con frecuencia limitada: se avisa como máximo una vez cada
+`intervalo` segundos (y siempre al terminar), con filas por segundo y tiempo restante.
+El mismo progreso sirve para el cálculo por bloques, en paralelo o en un solo paso.
+"""
+from typing import Callable, Iterable, Iterator
+import time
+
+import pandas as pd
+
+# Segundos mínimos entre dos avisos de progreso
+INTERVALO_PROGRESO = 0.25
+
+
+def nuevo_progreso(total: int | None, notificar: Callable[[dict], None], intervalo: float = INTERVALO_PROGRESO) -> dict:
+    """
+    Progreso vacío de `total` filas (None si no se conoce). `notificar` recibe el
+    estado (ver estado_progreso) cada vez que corresponde avisar.
+    """
+    return {
+        "total": total,
+        "filas": 0,
+        "inicio": time.perf_counter(),
+        "ultimo_aviso": float("-inf"),
+        "intervalo": intervalo,
+        "notificar": notificar,
+        "avisos": 0,
+    }
+
+
+def estado_progreso(progreso: dict) -> dict:
+    """
+    Estado actual:
+        filas, total          -> filas procesadas y total esperado (None si no se conoce)
+        fraccion              -> filas / total entre 0 y 1 (None sin total)
+        filas_por_segundo     -> velocidad promedio desde el inicio
+        eta_segundos          -> tiempo restante estimado (None sin total o sin velocidad)
+        transcurrido          -> segundos desde el inicio
+    """
+    transcurrido = time.perf_counter() - progreso["inicio"]
+    filas, total = progreso["filas"], progreso["total"]
+    velocidad = filas / transcurrido if transcurrido > 0 else 0.0
+    return {
+        "filas": filas,
+        "total": total,
+        "fraccion": min(1.0, filas / total) if total else None,
+        "filas_por_segundo": velocidad,
+        "eta_segundos": max(0.0, (total - filas) / velocidad) if total and velocidad > 0 else None,
+        "transcurrido": transcurrido,
+    }
+
+
+def avisar(progreso: dict) -> None:
+    progreso["ultimo_aviso"] = time.perf_counter()
+    progreso["avisos"] += 1
+    progreso["notificar"](estado_progreso(progreso))
+
+
+def avanzar(progreso: dict | None, filas: int) -> None:
+    """Suma `filas` al progreso y avisa si pasó al menos `intervalo` desde el último aviso"""
+    if progreso is None:
+        return
+    progreso["filas"] += filas
+    if time.perf_counter() - progreso["ultimo_aviso"] >= progreso["intervalo"]:
+        avisar(progreso)
+
+
+def terminar(progreso: dict | None) -> None:
+    """Último aviso, con el estado final (siempre se envía)"""
+    if progreso is not None:
+        avisar(progreso)
+
+
+def con_progreso(bloques: Iterable[pd.DataFrame], progreso: dict | None) -> Iterator[pd.DataFrame]:
+    """Entrega los mismos bloques y avanza el progreso con las filas de cada uno"""
+    for df in bloques:
+        avanzar(progreso, len(df))
+        yield df
+    terminar(progreso)
+
+
+def describir_progreso(estado: dict) -> str:
+    """Texto para mostrar, por ejemplo '12,000 de 50,000 estudiantes · 8,400 filas/s · faltan 4 s'"""
+    texto = f"{estado['filas']:,} estudiantes"
+    if estado["total"]:
+        texto = f"{estado['filas']:,} de {estado['total']:,} estudiantes"
+    texto += f" · {estado['filas_por_segundo']:,.0f} filas/s"
+    if estado["eta_segundos"] is not None and estado["filas"] < estado["total"]:
+        texto += f" · faltan {estado['eta_segundos']:.0f} s"
+    return texto
@@ -0,0 +1,264 @@
+"""
+Servicio HTTP de predicciones para otros sistemas (por ejemplo, el sistema de información
+académica), junto a la interfaz de Streamlit y con los mismos modelos:
+
+    python -m parrish serve --host 0.0.0.0 --puerto 8000
+
+    POST /score?modulo=24          un estudiante en JSON   -> {"predicciones": {"global": 0.71, ...}}
+    POST /score/batch?modulo=24    JSON (lista de estudiantes) o Arrow IPC -> id y pred_{materia}
+    GET  /salud                    versión y hash de los modelos activos
+    GET  /metrics                  métricas en formato Prometheus (ver parrish.metricas)
+
+/score usa predecir_probit hoja por hoja, igual que la página individual; /score/batch usa
+predecir_probit_lote, igual que el análisis masivo. Los modelos vienen del mismo gestor con
+recarga en caliente (ver parrish.modelos), así que publicar coeficientes nuevos no obliga a
+reiniciar. La respuesta del lote es Arrow si el encabezado Accept lo pide y JSON si no.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+import threading
+
+import orjson
+import pandas as pd
+
+from .datos import COLUMNAS_REQUERIDAS
+from .metricas import TIPO_CONTENIDO, incrementar, texto_prometheus
+from .modelos import MATERIAS, MODULOS, registro_vigente
+from .prediccion import predecir_probit, predecir_probit_lote
+from .tiempos import etapa, nueva_medicion
+
+# Tipos de contenido de Arrow IPC (formato de flujo y de archivo)
+ARROW_FLUJO = "application/vnd.apache.arrow.stream"
+ARROW_ARCHIVO = "application/vnd.apache.arrow.file"
+
+# Tamaño máximo del cuerpo de una solicitud
+MAX_BYTES_SOLICITUD = 256 * 1024 * 1024
+
+
+class ErrorSolicitud(Exception):
+    """Solicitud inválida: se responde con `estado` y el mensaje en JSON"""
+
+    def __init__(self, estado: int, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def leer_modulo(consulta: dict, cuerpo: dict | None = None) -> int:
+    """Módulo pedido en ?modulo= o en el campo "modulo" del cuerpo JSON"""
+    valor = consulta.get("modulo", [None])[0]
+    if valor is None and isinstance(cuerpo, dict):
+        valor = cuerpo.get("modulo")
+    try:
+        modulo = int(valor)
+    except (TypeError, ValueError):
+        raise ErrorSolicitud(422, f"Indique el módulo ({' o '.join(map(str, MODULOS))}) en ?modulo= o en el campo 'modulo'")
+    if modulo not in MODULOS:
+        raise ErrorSolicitud(422, f"Módulo {modulo} desconocido; use {' o '.join(map(str, MODULOS))}")
+    return modulo
+
+
+def leer_json(cuerpo: bytes):
+    try:
+        return orjson.loads(cuerpo)
+    except orjson.JSONDecodeError as e:
+        raise ErrorSolicitud(400, f"JSON inválido: {e}")
+
+
+def columnas_del_modulo(registro: dict, modulo: int) -> list[str]:
+    """Columnas de entrada (ver COLUMNAS_REQUERIDAS) que usan los modelos del módulo: las que se exigen"""
+    variables = registro["compilados"][modulo]["variables"]
+    return [col for col in COLUMNAS_REQUERIDAS if col in variables]
+
+
+def puntuar_estudiante(registro: dict, modulo: int, estudiante: dict) -> dict:
+    """Predicción de un estudiante con predecir_probit en cada hoja del módulo (como la página individual)"""
+    variables = columnas_del_modulo(registro, modulo)
+    faltantes = [var for var in variables if var not in estudiante]
+    if faltantes:
+        raise ErrorSolicitud(422, f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+    invalidas = [
+        var for var in variables
+        if isinstance(estudiante[var], bool) or not isinstance(estudiante[var], (int, float))
+    ]
+    if invalidas:
+        raise ErrorSolicitud(422, f"Valores no numéricos en: {', '.join(invalidas)}")
+
+    predicciones = {}
+    for materia in MATERIAS:
+        modelo = registro["modelos"].get(f"s11_{materia}_mod{modulo}")
+        predicciones[materia] = None if modelo is None else predecir_probit(modelo, estudiante)
+    return {
+        "id": estudiante.get("id"),
+        "modulo": modulo,
+        "modelos": registro["hash"][:12],
+        "predicciones": predicciones,
+    }
+
+
+def leer_lote(cuerpo: bytes, tipo: str) -> tuple[pd.DataFrame, dict | None]:
+    """
+    Estudiantes del cuerpo de /score/batch: Arrow IPC (flujo o archivo) o JSON, ya sea una
+    lista de estudiantes o {"modulo": ..., "estudiantes": [...]}. Devuelve también el JSON leído.
+    """
+    if tipo in (ARROW_FLUJO, ARROW_ARCHIVO):
+        import pyarrow as pa
+
+        try:
+            lector = pa.ipc.open_stream(cuerpo) if tipo == ARROW_FLUJO else pa.ipc.open_file(cuerpo)
+            return lector.read_pandas(), None
+        except pa.ArrowInvalid as e:
+            raise ErrorSolicitud(400, f"Arrow inválido: {e}")
+
+    datos = leer_json(cuerpo)
+    estudiantes = datos.get("estudiantes") if isinstance(datos, dict) else datos
+    if not isinstance(estudiantes, list) or not all(isinstance(e, dict) for e in estudiantes):
+        raise ErrorSolicitud(422, "Envíe una lista de estudiantes o {\"modulo\": ..., \"estudiantes\": [...]}")
+    return pd.DataFrame.from_records(estudiantes), datos
+
+
+def puntuar_lote(registro: dict, modulo: int, df: pd.DataFrame) -> pd.DataFrame:
+    """id (si viene) y pred_{materia} de todos los estudiantes con predecir_probit_lote (como el análisis masivo)"""
+    compilado = registro["compilados"][modulo]
+    faltantes = [col for col in columnas_del_modulo(registro, modulo) if col not in df.columns]
+    if faltantes and len(df):
+        raise ErrorSolicitud(422, f"Faltan las siguientes columnas: {', '.join(faltantes)}")
+    salida = df[["id"]].copy() if "id" in df.columns else pd.DataFrame(index=df.index)
+    predicciones = predecir_probit_lote(compilado, df.copy())
+    for materia in compilado["materias"]:
+        salida[f"pred_{materia}"] = predicciones[f"pred_{materia}"]
+    return salida
+
+
+def lote_a_arrow(df: pd.DataFrame) -> bytes:
+    """Resultado del lote como flujo Arrow IPC"""
+    import pyarrow as pa
+
+    if "id" in df.columns and pd.api.types.is_object_dtype(df["id"]):
+        # Ids mezclados (números y textos) en JSON: Arrow necesita un solo tipo
+        df = df.astype({"id": "string"})
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    destino = BytesIO()
+    with pa.ipc.new_stream(destino, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return destino.getvalue()
+
+
+def crear_servicio(gestor: dict, host: str = "127.0.0.1", puerto: int = 8000) -> ThreadingHTTPServer:
+    """
+    Servidor HTTP sin iniciar (serve_forever o iniciar_en_segundo_plano) que atiende cada
+    solicitud en su propio hilo con el registro vigente de `gestor` (ver parrish.modelos.crear_gestor).
+    """
+    class Manejador(BaseHTTPRequestHandler):
+        # Conexiones persistentes: un cliente puede enviar muchas solicitudes sin reconectar
+        protocol_version = "HTTP/1.1"
+        # Sin el algoritmo de Nagle, los encabezados y el cuerpo no esperan el ACK retrasado del cliente (~40 ms)
+        disable_nagle_algorithm = True
+
+        def responder(self, estado: int, cuerpo: bytes, tipo: str = "application/json") -> None:
+            self.send_response(estado)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def leer_cuerpo(self) -> bytes:
+            try:
+                largo = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                largo = -1
+            # Si el cuerpo no se lee, la conexión no se puede reutilizar
+            if largo < 0:
+                self.close_connection = True
+                raise ErrorSolicitud(400, "Content-Length inválido")
+            if largo > MAX_BYTES_SOLICITUD:
+                self.close_connection = True
+                raise ErrorSolicitud(413, f"La solicitud supera {MAX_BYTES_SOLICITUD // (1024 * 1024)} MB")
+            return self.rfile.read(largo)
+
+        def atender(self, funcion) -> None:
+            try:
+                funcion(urlsplit(self.path))
+            except ErrorSolicitud as e:
+                self.responder(e.estado, orjson.dumps({"error": str(e)}))
+            except Exception as e:
+                self.responder(500, orjson.dumps({"error": f"Error interno: {e}"}))
+
+        def do_GET(self):
+            self.atender(self.get)
+
+        def do_POST(self):
+            self.atender(self.post)
+
+        def get(self, url) -> None:
+            if url.path == "/salud":
+                registro = registro_vigente(gestor)
+                self.responder(200, orjson.dumps({
+                    "estado": "ok",
+                    "modelos": {clave: registro[clave] for clave in ("version", "hash", "fuente", "cargado")},
+                    "modulos": list(MODULOS),
+                }))
+            elif url.path == "/metrics":
+                self.responder(200, texto_prometheus().encode("utf-8"), TIPO_CONTENIDO)
+            elif url.path in ("/score", "/score/batch"):
+                raise ErrorSolicitud(405, "Use POST")
+            else:
+                raise ErrorSolicitud(404, f"Ruta desconocida: {url.path}")
+
+        def post(self, url) -> None:
+            # El cuerpo se lee siempre, para que la conexión quede lista para la siguiente solicitud
+            cuerpo = self.leer_cuerpo()
+            if url.path not in ("/score", "/score/batch"):
+                raise ErrorSolicitud(404, f"Ruta desconocida: {url.path}")
+            consulta = parse_qs(url.query)
+            registro = registro_vigente(gestor)
+            medicion = nueva_medicion(None, "api", ruta=url.path)
+
+            if url.path == "/score":
+                with etapa(medicion, "score"):
+                    estudiante = leer_json(cuerpo)
+                    if not isinstance(estudiante, dict):
+                        raise ErrorSolicitud(422, "Envíe un estudiante como objeto JSON")
+                    resultado = puntuar_estudiante(registro, leer_modulo(consulta, estudiante), estudiante)
+                incrementar("parrish_filas_calculadas_total", pagina="api")
+                incrementar("parrish_predicciones_servidas_total", pagina="api")
+                self.responder(200, orjson.dumps(resultado))
+                return
+
+            tipo = (self.headers.get("Content-Type") or "application/json").split(";")[0].strip()
+            with etapa(medicion, "score_batch") as registro_etapa:
+                df, datos = leer_lote(cuerpo, tipo)
+                modulo = leer_modulo(consulta, datos)
+                salida = puntuar_lote(registro, modulo, df)
+                registro_etapa["filas"] = len(salida)
+                if ARROW_FLUJO in (self.headers.get("Accept") or ""):
+                    respuesta, tipo_respuesta = lote_a_arrow(salida), ARROW_FLUJO
+                else:
+                    respuesta = orjson.dumps(
+                        {
+                            "modulo": modulo,
+                            "modelos": registro["hash"][:12],
+                            "filas": len(salida),
+                            "predicciones": salida.to_dict("records"),
+                        },
+                        option=orjson.OPT_SERIALIZE_NUMPY,
+                    )
+                    tipo_respuesta = "application/json"
+            incrementar("parrish_filas_calculadas_total", len(salida), pagina="api")
+            incrementar("parrish_predicciones_servidas_total", pagina="api")
+            self.responder(200, respuesta, tipo_respuesta)
+
+        def log_message(self, formato, *args):
+            # Cada solicitud ya queda en las métricas y en el log de parrish.tiempos
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_en_segundo_plano(servidor: ThreadingHTTPServer) -> threading.Thread:
+    """Atiende `servidor` desde un hilo daemon (para pruebas y benchmarks en el mismo proceso)"""
+    hilo = threading.Thread(target=servidor.serve_forever, name="parrish-servicio", daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,97 @@
+"""
+Cohortes sintéticas con las 15 columnas del análisis masivo, para pruebas de carga y
+escala sin datos reales de estudiantes. Las distribuciones imitan el archivo de referencia
+(grado 11): edades de 17 a 19, notas de 8° alrededor de 84 sobre 100, percentiles NWEA
+de 1 a 99 y faltas con cola larga. Las notas y los percentiles dependen de un mismo nivel
+latente, así que están correlacionados como en una cohorte real.
+"""
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from .datos import COLUMNAS_REQUERIDAS, TAMANO_BLOQUE
+
+# Primer id de la cohorte (los ids reales son números de 7 dígitos)
+ID_INICIAL = 2_000_000
+
+# Edad en el grado y su probabilidad
+EDADES = (17, 18, 19)
+PROB_EDADES = (0.08, 0.85, 0.07)
+
+# Probabilidad de cada nivel de educación máxima de los padres (educ_max_padremadre1..5)
+PROB_EDUCACION = (0.02, 0.02, 0.01, 0.46, 0.49)
+
+# Faltas: binomial negativa con media 21 y desviación 24
+MEDIA_FALTAS = 21.0
+DESVIACION_FALTAS = 24.0
+
+# Notas de 8° (media, desviación) sobre 100; se recortan al rango [NOTA_MINIMA, 100]
+NOTAS = {
+    'human_langs_08': (85.8, 7.0),
+    'maths_08': (84.0, 10.9),
+    'nat_sc_08': (82.8, 8.6),
+    'soc_sc_08': (84.3, 6.6),
+}
+NOTA_MINIMA = 50.0
+
+# Peso del nivel latente en notas y percentiles (correlación entre materias ≈ PESO_LATENTE²)
+PESO_LATENTE = 0.7
+
+# Fracción de vacíos por columna, como en el archivo de referencia
+VACIOS = {
+    'human_langs_08': 0.056, 'maths_08': 0.056, 'nat_sc_08': 0.056, 'soc_sc_08': 0.056,
+    'nwea_math_perc': 0.011, 'nwea_reading_perc': 0.011,
+}
+
+
+def generar_bloque(rng: np.random.Generator, filas: int, primer_id: int, con_vacios: bool = True) -> pd.DataFrame:
+    """`filas` estudiantes sintéticos con ids consecutivos desde `primer_id`"""
+    nivel = rng.standard_normal(filas)
+    ruido = np.sqrt(1 - PESO_LATENTE ** 2)
+
+    # Un solo nivel de educación por estudiante (one-hot consistente)
+    educacion = rng.choice(len(PROB_EDUCACION), size=filas, p=PROB_EDUCACION)
+
+    p_faltas = MEDIA_FALTAS / DESVIACION_FALTAS ** 2
+    n_faltas = MEDIA_FALTAS * p_faltas / (1 - p_faltas)
+
+    df = pd.DataFrame({
+        'id': np.arange(primer_id, primer_id + filas, dtype=np.int64),
+        'estu_mujer': rng.integers(0, 2, filas),
+        'edad_grado': rng.choice(EDADES, size=filas, p=PROB_EDADES),
+        **{f'educ_max_padremadre{k + 1}': (educacion == k).astype(np.int64) for k in range(len(PROB_EDUCACION))},
+        'total_faltas_disc': rng.negative_binomial(n_faltas, p_faltas, filas),
+    })
+    for col, (media, desviacion) in NOTAS.items():
+        z = PESO_LATENTE * nivel + ruido * rng.standard_normal(filas)
+        df[col] = np.clip(media + desviacion * z, NOTA_MINIMA, 100.0).round(1)
+    for col in ('nwea_math_perc', 'nwea_reading_perc'):
+        z = PESO_LATENTE * nivel + ruido * rng.standard_normal(filas)
+        df[col] = np.clip(ndtr(z) * 100, 1.0, 99.0).round(1)
+
+    if con_vacios:
+        for col, fraccion in VACIOS.items():
+            df.loc[rng.random(filas) < fraccion, col] = np.nan
+    return df[COLUMNAS_REQUERIDAS]
+
+
+def generar_por_bloques(
+    filas: int, semilla: int = 0, tamano_bloque: int = TAMANO_BLOQUE, con_vacios: bool = True
+) -> Iterator[pd.DataFrame]:
+    """
+    Cohorte sintética de `filas` estudiantes entregada en bloques, sin tenerla completa en memoria.
+    La misma semilla y el mismo tamaño de bloque producen siempre los mismos datos.
+    """
+    rng = np.random.default_rng(semilla)
+    for inicio in range(0, filas, tamano_bloque):
+        yield generar_bloque(rng, min(tamano_bloque, filas - inicio), ID_INICIAL + inicio, con_vacios)
+
+
+def generar_cohorte(filas: int, semilla: int = 0, con_vacios: bool = True) -> pd.DataFrame:
+    """Cohorte sintética completa de `filas` estudiantes (ver generar_por_bloques)"""
+    bloques = list(generar_por_bloques(filas, semilla, con_vacios=con_vacios))
+    if not bloques:
+        return generar_bloque(np.random.default_rng(semilla), 0, ID_INICIAL, con_vacios)
+    return pd.concat(bloques, ignore_index=True)
@@ -0,0 +1,239 @@
+"""
+Tiempos por etapa de cada corrida (lectura, validación, cálculo, estadísticas, gráficos,
+exportación...). Cada etapa escribe una línea de log estructurada (JSON) en el logger
+`parrish.tiempos` y queda en un historial con las últimas corridas, para el panel de
+diagnóstico de la aplicación. La duración también se publica en el histograma
+parrish_etapa_segundos (ver parrish.metricas).
+
+Memoria de cada etapa: su pico (pico_mb), la residente del proceso al terminarla (memoria_mb) y
+cuánto cambió durante la etapa (memoria_delta_mb). El pico se mide en Linux reiniciando la
+marca de agua de la memoria residente (/proc/self/clear_refs) al empezar la etapa y leyendo
+VmHWM al terminarla; si el kernel no lo permite, un hilo muestrea la memoria residente mientras
+la etapa corre (ver iniciar_pico). Es el pico del proceso durante la etapa: si otras etapas
+corren a la vez (otras sesiones), su memoria cuenta también. Solo cuando no hay forma de medirlo
+(fuera de Linux) se guarda pico_proceso_mb, el pico desde que arrancó el proceso, que solo sube.
+"""
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from .metricas import observar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Corridas que guarda el historial por defecto
+CORRIDAS_HISTORIAL = 20
+
+# Segundos entre muestras de memoria cuando el pico se mide con un hilo (ver iniciar_pico)
+INTERVALO_MUESTREO = 0.05
+
+# Etapas en curso en el proceso: la marca de agua solo se reinicia cuando no hay ninguna, para
+# no borrar el pico de una etapa que ya estaba corriendo. "marca" es None mientras no se sabe
+# si el kernel permite reiniciarla, luego True o False.
+PICOS = {"lock": threading.Lock(), "activas": 0, "marca": None}
+
+
+def pico_memoria_mb() -> float | None:
+    """
+    Pico de memoria residente del proceso desde que arrancó, en MB. None si no se puede medir
+    o si las etapas reinician la marca de agua (ver iniciar_pico), que también lo reinicia.
+    """
+    if resource is None or PICOS["marca"]:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def memoria_actual_mb() -> float | None:
+    """Memoria residente actual del proceso, en MB (None si no se puede medir: solo en Linux)"""
+    try:
+        with open("/proc/self/statm") as archivo:
+            paginas = int(archivo.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def reiniciar_marca() -> bool:
+    """Reinicia la marca de agua de la memoria residente del proceso (VmHWM); False si no se puede"""
+    try:
+        with open("/proc/self/clear_refs", "w") as archivo:
+            archivo.write("5")
+    except OSError:
+        return False
+    return marca_mb() is not None
+
+
+def marca_mb() -> float | None:
+    """Marca de agua de la memoria residente (VmHWM) desde el último reinicio, en MB (None si no se puede leer)"""
+    try:
+        with open("/proc/self/status") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def muestrear(seguimiento: dict) -> None:
+    """Guarda en seguimiento["pico"] la mayor memoria residente vista hasta que se marca seguimiento["fin"]"""
+    while not seguimiento["fin"].wait(INTERVALO_MUESTREO):
+        seguimiento["pico"] = max(seguimiento["pico"], memoria_actual_mb() or 0.0)
+
+
+def iniciar_pico() -> dict:
+    """
+    Empieza a medir el pico de memoria de una etapa (ver terminar_pico): con la marca de agua
+    del kernel si se puede reiniciar, si no con un hilo que muestrea la memoria residente,
+    y sin medir si tampoco se puede leer la memoria actual.
+    """
+    with PICOS["lock"]:
+        if PICOS["activas"] == 0 and PICOS["marca"] is not False:
+            PICOS["marca"] = reiniciar_marca()
+        if PICOS["marca"]:
+            PICOS["activas"] += 1
+            return {"modo": "marca"}
+    actual = memoria_actual_mb()
+    if actual is None:
+        return {"modo": None}
+    seguimiento = {"modo": "muestreo", "pico": actual, "fin": threading.Event()}
+    seguimiento["hilo"] = threading.Thread(target=muestrear, args=(seguimiento,), name="parrish-memoria", daemon=True)
+    seguimiento["hilo"].start()
+    return seguimiento
+
+
+def terminar_pico(seguimiento: dict) -> float | None:
+    """Pico de memoria residente (MB) desde iniciar_pico, o None si no se pudo medir"""
+    if seguimiento["modo"] == "marca":
+        pico = marca_mb()
+        with PICOS["lock"]:
+            PICOS["activas"] -= 1
+        return pico
+    if seguimiento["modo"] == "muestreo":
+        seguimiento["fin"].set()
+        seguimiento["hilo"].join()
+        return max(seguimiento["pico"], memoria_actual_mb() or 0.0)
+    return None
+
+
+def nuevo_historial(limite: int = CORRIDAS_HISTORIAL) -> deque:
+    """Historial con las últimas `limite` corridas medidas (las más antiguas se descartan)"""
+    return deque(maxlen=limite)
+
+
+def nueva_medicion(historial: deque | None, pagina: str, **contexto) -> dict:
+    """
+    Medición vacía de una corrida de `pagina`. `contexto` (módulo, filas, formato...) se copia
+    en cada línea de log. La corrida entra al historial con su primera etapa, así que las
+    corridas sin trabajo medido no desplazan a las demás.
+    """
+    return {
+        "corrida": uuid.uuid4().hex[:8],
+        "pagina": pagina,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "contexto": contexto,
+        "etapas": [],
+        "historial": historial,
+    }
+
+
+@contextmanager
+def etapa(medicion: dict | None, nombre: str, **datos) -> Iterator[dict]:
+    """
+    Mide el bloque `with` como la etapa `nombre` de `medicion` (None = no medir). El dict que
+    entrega se puede completar dentro del bloque (por ejemplo, con las filas procesadas).
+    Si el bloque lanza una excepción, la etapa se registra igual con error=True.
+    """
+    if medicion is None:
+        yield datos
+        return
+    registro = {"etapa": nombre, **datos}
+    memoria_inicio = memoria_actual_mb()
+    seguimiento = iniciar_pico()
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield registro
+    except BaseException:
+        error = True
+        raise
+    finally:
+        registro["segundos"] = time.perf_counter() - inicio
+        registro["pico_mb"] = terminar_pico(seguimiento)
+        memoria_fin = memoria_actual_mb()
+        registro["memoria_mb"] = memoria_fin
+        registro["memoria_delta_mb"] = None if memoria_fin is None or memoria_inicio is None else memoria_fin - memoria_inicio
+        if registro["pico_mb"] is None:
+            registro["pico_proceso_mb"] = pico_memoria_mb()
+        if error:
+            registro["error"] = True
+        medicion["etapas"].append(registro)
+        observar("parrish_etapa_segundos", registro["segundos"], pagina=medicion["pagina"], etapa=nombre)
+        if len(medicion["etapas"]) == 1 and medicion["historial"] is not None:
+            medicion["historial"].append(medicion)
+        logger.info(
+            "etapa %s",
+            json.dumps(
+                {"corrida": medicion["corrida"], "pagina": medicion["pagina"], **medicion["contexto"], **registro},
+                default=str,
+                ensure_ascii=False,
+            ),
+        )
+
+
+def resumen_corridas(historial: deque) -> pd.DataFrame:
+    """
+    Una fila por corrida (la más reciente primero): fecha, página, etapas, segundos totales y el
+    mayor pico de memoria de sus etapas (pico_mb; pico_proceso_mb donde no se pudo medir)
+    """
+    filas = []
+    for medicion in reversed(list(historial)):
+        etapas = medicion["etapas"]
+        picos = [e["pico_mb"] for e in etapas if e["pico_mb"] is not None]
+        fila = {
+            "corrida": medicion["corrida"],
+            "fecha": medicion["fecha"],
+            "pagina": medicion["pagina"],
+            **medicion["contexto"],
+            "etapas": len(etapas),
+            "segundos": sum(e["segundos"] for e in etapas),
+            "pico_mb": max(picos) if picos else None,
+        }
+        picos_proceso = [e["pico_proceso_mb"] for e in etapas if e.get("pico_proceso_mb") is not None]
+        if picos_proceso:
+            fila["pico_proceso_mb"] = max(picos_proceso)
+        fila["error"] = any(e.get("error") for e in etapas)
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def tabla_etapas(historial: deque) -> pd.DataFrame:
+    """Una fila por etapa de cada corrida (la más reciente primero), con su porcentaje del total de la corrida"""
+    filas = []
+    for medicion in reversed(list(historial)):
+        total = sum(e["segundos"] for e in medicion["etapas"]) or 1.0
+        for registro in medicion["etapas"]:
+            filas.append({
+                "corrida": medicion["corrida"],
+                "pagina": medicion["pagina"],
+                **registro,
+                "porcentaje": registro["segundos"] / total * 100,
+            })
+    return pd.DataFrame(filas)
@@ -0,0 +1,245 @@
+"""
+Cola de trabajos en segundo plano para análisis masivos grandes: el archivo se guarda en
+disco, un pool de hilos lo procesa por bloques (memoria acotada) y las predicciones quedan en
+disco junto con el estado del trabajo. Quien lo envió puede cerrar la pestaña y volver más
+tarde con el id del trabajo para ver los resultados y descargarlos sin recalcular.
+
+Cada trabajo vive en <carpeta>/<id>/:
+    entrada.<ext>            archivo subido (se borra cuando el trabajo termina bien)
+    estado.json              estado, avance y errores (ver estado_trabajo)
+    predicciones.parquet     estudiantes con sus columnas pred_* (cuando termina)
+
+Antes de empezar, cada trabajo pide turno al control de admisión de la cola (ver
+parrish.admision) por un bloque de filas, que es lo que tiene en memoria a la vez.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from .admision import admitir, memoria_estimada, nuevo_control
+from .datos import TAMANO_BLOQUE, contar_estudiantes, formato_archivo, guardar_resultados_por_bloques, leer_estudiantes_por_bloques
+from .estadisticas import acumular, nuevo_acumulador
+from .masivo import procesar_por_bloques
+from .metricas import incrementar
+from .progreso import con_progreso, nuevo_progreso
+from .tiempos import etapa, nueva_medicion
+
+# Estados de un trabajo
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+TERMINADO = "terminado"
+ERROR = "error"
+
+# Los ids son hexadecimales: un id de la URL no puede salirse de la carpeta de trabajos
+PATRON_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def crear_cola(
+    carpeta: Path,
+    trabajadores: int = 1,
+    retencion_segundos: float | None = None,
+    admision: dict | None = None,
+) -> dict:
+    """
+    Cola de trabajos en `carpeta` con `trabajadores` hilos. Los trabajos terminados hace más de
+    `retencion_segundos` se borran (None: se conservan). Los que quedaron a medias en un proceso
+    anterior se marcan con error, porque su hilo ya no existe. `admision` es el control de
+    admisión compartido con el resto del proceso (None: uno propio sin límites).
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    cola = {
+        "carpeta": carpeta,
+        "ejecutor": ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="parrish-trabajo"),
+        "retencion": retencion_segundos,
+        "admision": nuevo_control() if admision is None else admision,
+        "lock": threading.Lock(),
+    }
+    for estado in listar_trabajos(cola):
+        if estado["estado"] in (EN_COLA, PROCESANDO):
+            actualizar_estado(cola, estado["id"], estado=ERROR, error="Interrumpido al reiniciar el servidor; vuelva a enviarlo")
+    limpiar_trabajos(cola)
+    return cola
+
+
+def ruta_trabajo(cola: dict, trabajo_id: str) -> Path | None:
+    """Carpeta del trabajo, o None si el id no tiene el formato de un id de trabajo"""
+    if not isinstance(trabajo_id, str) or not PATRON_ID.match(trabajo_id):
+        return None
+    return cola["carpeta"] / trabajo_id
+
+
+def estado_trabajo(cola: dict, trabajo_id: str) -> dict | None:
+    """
+    Estado guardado del trabajo (None si no existe):
+        id, nombre, modulo, modelos      -> qué se envió y con qué versión de los modelos
+        estado                           -> en_cola, procesando, terminado o error
+        creado, inicio, fin              -> fechas ISO (None mientras no ocurren)
+        filas, total                     -> estudiantes procesados y total esperado (None si no se conoce)
+        filas_por_segundo, eta_segundos  -> avance (ver parrish.progreso)
+        posicion                         -> lugar en la cola de admisión mientras espera turno (None si no espera)
+        error                            -> mensaje si falló
+    """
+    carpeta = ruta_trabajo(cola, trabajo_id)
+    if carpeta is None:
+        return None
+    try:
+        return json.loads((carpeta / "estado.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def actualizar_estado(cola: dict, trabajo_id: str, **cambios) -> dict:
+    """Aplica `cambios` al estado del trabajo y lo reescribe de forma atómica"""
+    carpeta = ruta_trabajo(cola, trabajo_id)
+    with cola["lock"]:
+        estado = estado_trabajo(cola, trabajo_id) or {"id": trabajo_id}
+        estado.update(cambios)
+        temporal = carpeta / "estado.json.tmp"
+        temporal.write_text(json.dumps(estado, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporal, carpeta / "estado.json")
+    return estado
+
+
+def listar_trabajos(cola: dict) -> list[dict]:
+    """Estados de todos los trabajos de la carpeta, del más reciente al más antiguo"""
+    estados = [estado_trabajo(cola, carpeta.name) for carpeta in cola["carpeta"].iterdir() if carpeta.is_dir()]
+    return sorted((e for e in estados if e is not None), key=lambda e: e.get("creado") or "", reverse=True)
+
+
+def limpiar_trabajos(cola: dict) -> int:
+    """Borra los trabajos terminados (o con error) hace más que la retención; devuelve cuántos borró"""
+    if cola["retencion"] is None:
+        return 0
+    limite = time.time() - cola["retencion"]
+    borrados = 0
+    for estado in listar_trabajos(cola):
+        fin = estado.get("fin") or estado.get("creado")
+        if estado["estado"] in (TERMINADO, ERROR) and fin and datetime.fromisoformat(fin).timestamp() < limite:
+            shutil.rmtree(ruta_trabajo(cola, estado["id"]), ignore_errors=True)
+            borrados += 1
+    return borrados
+
+
+def enviar_trabajo(cola: dict, contenido: bytes, nombre: str, compilado: dict, modulo: int, modelos: str) -> str:
+    """
+    Guarda el archivo subido (`contenido`, con el nombre original `nombre` para conocer su
+    formato) y encola su cálculo con el modelo `compilado`. Devuelve el id del trabajo.
+    Lanza ValueError si el formato del archivo no es soportado, y el error de lectura si el archivo
+    está dañado (en ese caso no queda la carpeta del trabajo).
+    """
+    formato_archivo(nombre)
+    limpiar_trabajos(cola)
+    trabajo_id = uuid.uuid4().hex
+    carpeta = ruta_trabajo(cola, trabajo_id)
+    carpeta.mkdir()
+    try:
+        entrada = carpeta / f"entrada{Path(nombre).suffix.lower()}"
+        entrada.write_bytes(contenido)
+        actualizar_estado(
+            cola, trabajo_id,
+            nombre=nombre,
+            modulo=modulo,
+            modelos=modelos,
+            estado=EN_COLA,
+            creado=datetime.now().isoformat(timespec="seconds"),
+            inicio=None,
+            fin=None,
+            filas=0,
+            total=contar_estudiantes(entrada),
+            filas_por_segundo=None,
+            eta_segundos=None,
+            posicion=None,
+            error=None,
+        )
+    except BaseException:
+        # Sin estado.json el trabajo no se lista ni se limpia nunca: la carpeta no debe quedar
+        shutil.rmtree(carpeta, ignore_errors=True)
+        raise
+    cola["ejecutor"].submit(ejecutar_trabajo, cola, trabajo_id, entrada, compilado)
+    return trabajo_id
+
+
+def ejecutar_trabajo(cola: dict, trabajo_id: str, entrada: Path, compilado: dict) -> None:
+    """
+    Espera turno en el control de admisión de la cola (su posición queda en estado.json) y procesa
+    el trabajo. Cualquier error, también los de antes de empezar a procesar (leer el estado,
+    esperar turno), queda en estado.json: el Future del pool no lo consulta nadie.
+    """
+    try:
+        estado = estado_trabajo(cola, trabajo_id)
+        filas_bloque = min(estado["total"] or TAMANO_BLOQUE, TAMANO_BLOQUE)
+        with admitir(
+            cola["admision"], filas_bloque, memoria_estimada(filas_bloque),
+            lambda lugar: actualizar_estado(cola, trabajo_id, posicion=lugar),
+            pagina="trabajo",
+        ):
+            procesar_trabajo(cola, trabajo_id, entrada, compilado)
+    except Exception as e:
+        actualizar_estado(
+            cola, trabajo_id, estado=ERROR, posicion=None, error=str(e) or type(e).__name__,
+            fin=datetime.now().isoformat(timespec="seconds"),
+        )
+
+
+def procesar_trabajo(cola: dict, trabajo_id: str, entrada: Path, compilado: dict) -> None:
+    """Lee, calcula y escribe las predicciones bloque a bloque, actualizando el avance en estado.json"""
+    carpeta = ruta_trabajo(cola, trabajo_id)
+    estado = actualizar_estado(
+        cola, trabajo_id, estado=PROCESANDO, posicion=None, inicio=datetime.now().isoformat(timespec="seconds")
+    )
+
+    def notificar(avance: dict) -> None:
+        actualizar_estado(
+            cola, trabajo_id,
+            filas=avance["filas"],
+            filas_por_segundo=avance["filas_por_segundo"],
+            eta_segundos=avance["eta_segundos"],
+        )
+
+    # Se escribe a un temporal: predicciones.parquet solo existe cuando el trabajo terminó bien
+    temporal = carpeta / "predicciones.tmp.parquet"
+    medicion = nueva_medicion(None, "trabajo", modulo=estado["modulo"])
+    try:
+        with etapa(medicion, "calcular", filas=estado["total"]):
+            bloques = procesar_por_bloques(leer_estudiantes_por_bloques(entrada), compilado, nuevo_acumulador())
+            filas = guardar_resultados_por_bloques(
+                con_progreso(bloques, nuevo_progreso(estado["total"], notificar)), temporal
+            )
+            os.replace(temporal, carpeta / "predicciones.parquet")
+        entrada.unlink(missing_ok=True)
+    except Exception as e:
+        temporal.unlink(missing_ok=True)
+        actualizar_estado(cola, trabajo_id, estado=ERROR, error=str(e), fin=datetime.now().isoformat(timespec="seconds"))
+        return
+    incrementar("parrish_filas_calculadas_total", filas, pagina="trabajo")
+    incrementar("parrish_predicciones_servidas_total", pagina="trabajo")
+    actualizar_estado(
+        cola, trabajo_id,
+        estado=TERMINADO,
+        filas=filas,
+        total=filas,
+        eta_segundos=0.0,
+        fin=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def resultado_trabajo(cola: dict, trabajo_id: str) -> tuple[pd.DataFrame, dict] | None:
+    """
+    Predicciones de un trabajo terminado y su acumulador de estadísticas (ver nuevo_acumulador),
+    leídos de disco. None si el trabajo no existe o no ha terminado.
+    """
+    estado = estado_trabajo(cola, trabajo_id)
+    if estado is None or estado["estado"] != TERMINADO:
+        return None
+    df = pd.read_parquet(ruta_trabajo(cola, trabajo_id) / "predicciones.parquet")
+    return df, acumular(nuevo_acumulador(), df)
@@ -0,0 +1,307 @@
+"""
+Pruebas de las equivalencias que sostienen las optimizaciones: el cálculo vectorizado contra
+predecir_probit, las estadísticas por bloques contra los bucles de la página, la caché,
+la admisión, la unión y escritura de bloques y los códigos de error del servicio.
+
+    python -m pytest -q
+"""
+import http.client
+
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+
+from benchmarks.estadisticas import cohorte_predicciones, estadisticas_por_materia
+from parrish import servicio
+from parrish.admision import cabe, intentar_admitir, liberar, nuevo_control
+from parrish.cache import guardar, nueva_cache, obtener, resumen_cache
+from parrish.datos import (
+    COLUMNAS_REQUERIDAS,
+    ajustar_a_esquema,
+    concatenar_bloques,
+    dividir_en_bloques,
+    esquema_por_bloques,
+    guardar_resultados_por_bloques,
+)
+from parrish.estadisticas import (
+    BINS_MEDIANA,
+    COLUMNAS_PRED,
+    acumular,
+    combinar,
+    estadisticas_cohorte,
+    mediana_histograma,
+    nuevo_acumulador,
+    tabla_estadisticas,
+    tabla_genero,
+    tabla_riesgo,
+)
+from parrish.modelos import MATERIAS, MODELOS_XLSX, MODULOS, construir_registro, crear_gestor
+from parrish.prediccion import explicar_probit, predecir_probit, predecir_probit_lote
+from parrish.sintetico import generar_cohorte
+
+# Diferencia admitida entre el cálculo vectorizado y el de predecir_probit (orden de las sumas)
+TOLERANCIA = 1e-12
+
+
+@pytest.fixture(scope="module")
+def registro():
+    return construir_registro(MODELOS_XLSX, version=1)
+
+
+@pytest.fixture(scope="module")
+def cohorte():
+    return generar_cohorte(300, semilla=7, con_vacios=False)
+
+
+# --------------------------------------------------
+# Predicción
+# --------------------------------------------------
+@pytest.mark.parametrize("modulo", MODULOS)
+def test_compilar_modelos(registro, modulo):
+    compilado = registro["compilados"][modulo]
+    assert compilado["materias"] == MATERIAS
+    assert compilado["coeficientes"].shape == (len(compilado["variables"]), len(MATERIAS))
+    assert "_cons" not in compilado["variables"]
+    for j, materia in enumerate(MATERIAS):
+        modelo = registro["modelos"].get(f"s11_{materia}_mod{modulo}")
+        assert compilado["disponibles"][j] == (modelo is not None)
+        if modelo is not None:
+            assert compilado["constantes"][j] == float(modelo["_cons"])
+
+
+@pytest.mark.parametrize("modulo", MODULOS)
+def test_lote_y_explicacion_igual_a_predecir_probit(registro, cohorte, modulo):
+    compilado = registro["compilados"][modulo]
+    lote = predecir_probit_lote(compilado, cohorte.copy())
+    for i, estudiante in enumerate(cohorte.to_dict("records")):
+        explicacion = explicar_probit(compilado, estudiante)
+        for j, materia in enumerate(MATERIAS):
+            modelo = registro["modelos"].get(f"s11_{materia}_mod{modulo}")
+            if modelo is None:
+                assert np.isnan(lote[f"pred_{materia}"].iloc[i])
+                assert np.isnan(explicacion["probabilidades"][j])
+                continue
+            esperado = predecir_probit(modelo, estudiante)
+            assert lote[f"pred_{materia}"].iloc[i] == pytest.approx(esperado, abs=TOLERANCIA)
+            assert explicacion["probabilidades"][j] == pytest.approx(esperado, abs=TOLERANCIA)
+
+
+def test_lote_con_vacios_y_texto(registro):
+    compilado = registro["compilados"][MODULOS[0]]
+    df = generar_cohorte(20, semilla=1, con_vacios=False)
+    df = df.astype({"edad_grado": object})
+    df.loc[0, "edad_grado"] = "sin dato"
+    df.loc[1, "total_faltas_disc"] = np.nan
+    lote = predecir_probit_lote(compilado, df.copy())
+    estudiante = df.iloc[0].to_dict()
+    for j, materia in enumerate(MATERIAS):
+        modelo = registro["modelos"].get(f"s11_{materia}_mod{MODULOS[0]}")
+        if modelo is None:
+            continue
+        # Texto: aporta 0, como en predecir_probit; vacío: la predicción queda vacía
+        assert lote[f"pred_{materia}"].iloc[0] == pytest.approx(predecir_probit(modelo, estudiante), abs=TOLERANCIA)
+        if "total_faltas_disc" in modelo.index:
+            assert np.isnan(lote[f"pred_{materia}"].iloc[1])
+
+
+# --------------------------------------------------
+# Estadísticas
+# --------------------------------------------------
+def acumular_por_bloques(df: pd.DataFrame, tamano: int) -> dict:
+    acum = nuevo_acumulador()
+    for bloque in dividir_en_bloques(df, tamano):
+        acumular(acum, bloque)
+    return acum
+
+
+def test_estadisticas_por_bloques_igual_a_los_bucles():
+    df = cohorte_predicciones(25_000, semilla=3)
+    referencia, genero, riesgo = estadisticas_por_materia(df)
+    acum = acumular_por_bloques(df, 4_000)
+
+    tabla = tabla_estadisticas(acum)
+    for col in ("Promedio", "Desv. Estándar", "Mínimo", "Máximo", "Positivos (%)"):
+        np.testing.assert_allclose(tabla[col], referencia[col], rtol=1e-10)
+    # La mediana sale del histograma: error máximo de medio intervalo
+    np.testing.assert_allclose(tabla["Mediana"], referencia["Mediana"], atol=1 / BINS_MEDIANA)
+    pd.testing.assert_frame_equal(tabla_genero(acum), genero)
+    pd.testing.assert_frame_equal(tabla_riesgo(acum), riesgo, check_dtype=False)
+
+
+def test_combinar_igual_a_una_sola_pasada():
+    df = cohorte_predicciones(9_000, semilla=5)
+    una_pasada = estadisticas_cohorte(df)
+    acum = acumular_por_bloques(df.iloc[:2_500], 1_000)
+    combinar(acum, acumular_por_bloques(df.iloc[2_500:], 1_000))
+    combinar(acum, nuevo_acumulador())
+
+    assert acum["filas"] == len(df)
+    pd.testing.assert_frame_equal(tabla_estadisticas(acum), una_pasada["estadisticas"], rtol=1e-10)
+    pd.testing.assert_frame_equal(tabla_genero(acum), una_pasada["genero"])
+    pd.testing.assert_frame_equal(tabla_riesgo(acum), una_pasada["riesgo"])
+
+
+def test_mediana_histograma():
+    bins = 10
+    histograma = np.bincount([1, 3, 3, 7], minlength=bins)
+    # Par: promedio de los centros de los intervalos 3 y 3
+    assert mediana_histograma(histograma, 4) == pytest.approx(0.35)
+    histograma = np.bincount([1, 3, 7], minlength=bins)
+    assert mediana_histograma(histograma, 3) == pytest.approx(0.35)
+    histograma = np.bincount([1, 8], minlength=bins)
+    assert mediana_histograma(histograma, 2) == pytest.approx(0.5)
+    assert np.isnan(mediana_histograma(np.zeros(bins, dtype=np.int64), 0))
+
+
+def test_estadisticas_columna_vacia():
+    df = cohorte_predicciones(100)
+    df[COLUMNAS_PRED[-1]] = np.nan
+    tabla = estadisticas_cohorte(df)["estadisticas"]
+    assert tabla.iloc[-1][["Promedio", "Mediana", "Desv. Estándar"]].isna().all()
+
+
+# --------------------------------------------------
+# Caché y admisión
+# --------------------------------------------------
+def test_cache_descarta_la_menos_usada():
+    cache = nueva_cache(limite_bytes=100)
+    assert guardar(cache, "a", "A", tamano=40)
+    assert guardar(cache, "b", "B", tamano=40)
+    assert obtener(cache, "a") == "A"
+    assert guardar(cache, "c", "C", tamano=40)
+    assert obtener(cache, "b") is None
+    assert obtener(cache, "a") == "A" and obtener(cache, "c") == "C"
+    assert not guardar(cache, "d", "D", tamano=101)
+    resumen = resumen_cache(cache)
+    assert (resumen["entradas"], resumen["bytes"], resumen["aciertos"], resumen["fallos"]) == (2, 80, 3, 1)
+
+
+def test_cache_sin_contar_y_vencimiento():
+    cache = nueva_cache(limite_bytes=100, ttl=-1)
+    guardar(cache, "a", "A", tamano=10)
+    assert obtener(cache, "a", contar=False) is None
+    resumen = resumen_cache(cache)
+    assert (resumen["entradas"], resumen["bytes"], resumen["aciertos"], resumen["fallos"]) == (0, 0, 0, 0)
+
+
+def test_admision():
+    control = nuevo_control(max_filas=100, max_memoria_mb=1)
+    # Sin solicitudes activas siempre cabe, aunque supere los límites
+    grande = intentar_admitir(control, 500, 0)
+    assert grande is not None
+    assert intentar_admitir(control, 1, 0) is None
+    liberar(control, grande)
+
+    primero = intentar_admitir(control, 60, 0)
+    assert cabe(control, 40, 0) and not cabe(control, 41, 0)
+    assert not cabe(control, 1, 1024 * 1024 + 1)
+    segundo = intentar_admitir(control, 40, 0)
+    assert segundo is not None
+    liberar(control, primero)
+    liberar(control, segundo)
+    assert not control["activos"] and not control["cola"]
+
+
+# --------------------------------------------------
+# Bloques
+# --------------------------------------------------
+def test_concatenar_bloques_igual_a_concat():
+    bloques = [
+        pd.DataFrame({"id": [1, 2], "x": [1, 2], "y": [0.5, 1.5], "nombre": ["a", "b"]}),
+        pd.DataFrame({"id": [3], "x": [3.5], "y": [2.5], "nombre": [None]}),
+        pd.DataFrame({"id": ["4-A"], "x": [4], "y": [np.nan], "nombre": ["d"]}),
+    ]
+    esperado = pd.concat(bloques, ignore_index=True)
+    for total in (None, 2, 4):
+        pd.testing.assert_frame_equal(concatenar_bloques(iter(bloques), total), esperado)
+
+
+def test_ajustar_a_esquema_y_guardar_por_bloques(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    columnas = {col: [1, 2] for col in COLUMNAS_REQUERIDAS}
+    primero = pd.DataFrame({**columnas, "pred_global": [0.1, 0.2], "colegio": ["x", None]})
+    segundo = primero.copy().astype({"id": object, "edad_grado": object})
+    segundo.loc[0, "id"] = "A-7"
+    segundo.loc[1, "edad_grado"] = "sin dato"
+
+    esquema = esquema_por_bloques(primero)
+    assert esquema.field("id").type == pa.string()
+    assert esquema.field("edad_grado").type == pa.float64()
+    ajustado = ajustar_a_esquema(segundo, esquema)
+    assert np.isnan(ajustado["edad_grado"].iloc[1])
+    assert ajustado["colegio"].isna().tolist() == [False, True]
+
+    path = tmp_path / "resultados.parquet"
+    assert guardar_resultados_por_bloques([primero, segundo], path) == 4
+    leido = pd.read_parquet(path)
+    assert leido["id"].tolist() == ["1", "2", "A-7", "2"]
+    assert leido["edad_grado"].isna().tolist() == [False, False, False, True]
+
+
+# --------------------------------------------------
+# Servicio
+# --------------------------------------------------
+@pytest.fixture(scope="module")
+def servidor():
+    servidor = servicio.crear_servicio(crear_gestor(MODELOS_XLSX), "127.0.0.1", 0)
+    servicio.iniciar_en_segundo_plano(servidor)
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def solicitar(servidor, ruta: str, cuerpo: bytes = b"", encabezados: dict | None = None) -> tuple[int, dict]:
+    conexion = http.client.HTTPConnection(*servidor.server_address, timeout=30)
+    try:
+        conexion.putrequest("POST", ruta)
+        encabezados = {"Content-Length": str(len(cuerpo)), **(encabezados or {})}
+        for nombre, valor in encabezados.items():
+            conexion.putheader(nombre, valor)
+        conexion.endheaders(cuerpo)
+        respuesta = conexion.getresponse()
+        return respuesta.status, orjson.loads(respuesta.read())
+    finally:
+        conexion.close()
+
+
+def estudiante_json(cohorte: pd.DataFrame) -> dict:
+    return {col: (int(v) if isinstance(v, np.integer) else float(v)) for col, v in cohorte.iloc[0].items()}
+
+
+def test_servicio_score(servidor, registro, cohorte):
+    estudiante = estudiante_json(cohorte)
+    estado, datos = solicitar(servidor, "/score?modulo=24", orjson.dumps(estudiante))
+    assert estado == 200
+    modelo = registro["modelos"]["s11_global_mod24"]
+    assert datos["predicciones"]["global"] == pytest.approx(predecir_probit(modelo, estudiante), abs=TOLERANCIA)
+
+
+def test_servicio_score_batch(servidor, cohorte):
+    estudiantes = [estudiante_json(cohorte.iloc[[i]]) for i in range(3)]
+    estado, datos = solicitar(servidor, "/score/batch?modulo=14", orjson.dumps(estudiantes))
+    assert estado == 200
+    assert datos["filas"] == 3
+
+
+def test_servicio_errores_400(servidor):
+    assert solicitar(servidor, "/score?modulo=24", b"{no es json")[0] == 400
+    assert solicitar(servidor, "/score?modulo=24", encabezados={"Content-Length": "-5"})[0] == 400
+    assert solicitar(servidor, "/score?modulo=24", encabezados={"Content-Length": "abc"})[0] == 400
+
+
+def test_servicio_error_413(servidor, monkeypatch):
+    monkeypatch.setattr(servicio, "MAX_BYTES_SOLICITUD", 10)
+    estado, datos = solicitar(servidor, "/score/batch?modulo=24", orjson.dumps([{"id": 1}] * 5))
+    assert estado == 413
+    assert "error" in datos
+
+
+def test_servicio_errores_422(servidor, cohorte):
+    estudiante = estudiante_json(cohorte)
+    faltante = {col: v for col, v in estudiante.items() if col != "total_faltas_disc"}
+    assert solicitar(servidor, "/score?modulo=24", orjson.dumps(faltante))[0] == 422
+    assert solicitar(servidor, "/score/batch?modulo=24", orjson.dumps([faltante]))[0] == 422
+    assert solicitar(servidor, "/score?modulo=99", orjson.dumps(estudiante))[0] == 422
+    assert solicitar(servidor, "/score?modulo=24", orjson.dumps({**estudiante, "edad_grado": "18"}))[0] == 422
+    assert solicitar(servidor, "/score/batch?modulo=24", orjson.dumps({"estudiantes": 3}))[0] == 422